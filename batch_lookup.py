@@ -0,0 +1,207 @@
+"""
+Batch grading lookups from the command line, for lists too long for the app
+(e.g. a congress entry list).
+
+    python batch_lookup.py entries.txt -o grades.csv
+    python batch_lookup.py entries.txt -o grades.ndjson --checkpoint entries.ckpt
+    cat entries.txt | python batch_lookup.py --format csv > grades.csv
+
+Input uses the app's syntax (parse_queries): names, "Name; club", sticky
+"club:" lines and [pnum]. Each input file is parsed on its own, so a sticky
+club does not leak into the next file. Lookups run concurrently and each
+line's result is written as soon as it completes (in completion order; the
+'index' field gives the input position).
+
+With --checkpoint, every written line is recorded, and re-running the same
+command skips them and appends to the output. Lines whose lookup failed are
+not recorded, so a re-run retries them.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+
+from chess_grading import GRADE_COLUMNS, MAX_IN_FLIGHT, Player, iter_player_grading, parse_queries
+from grading_cache import ResponseCache
+from roster_mirror import DEFAULT_MIRROR_PATH, RosterMirror
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('ndjson', 'csv')
+CSV_FIELDS = ('index', 'query', 'status', 'match_type', 'pnum', 'name', 'club', 'age') + GRADE_COLUMNS
+
+
+class CheckpointMismatch(Exception):
+    """The checkpoint was written for a different input."""
+
+
+def read_queries(paths, stdin=None):
+    """Parses each input (a path, or '-' for stdin) separately. Returns one list of query dicts."""
+    queries = []
+    for path in paths or ['-']:
+        if path == '-':
+            text = (stdin or sys.stdin).read()
+        else:
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+        queries += parse_queries(text)[0]
+    return queries
+
+
+def match_status(matches):
+    """Summarises a line's matches the way the app's Match Status column does."""
+    if matches is None:
+        return 'failed'
+    if matches and isinstance(matches[0], dict) and matches[0].get('invalid_query'):
+        return 'invalid'
+    if not matches:
+        return 'not_found'
+    if matches[0].match_type == 'fuzzy':
+        return 'suggested'
+    if matches[0].match_type == 'pnum':
+        return 'pnum'
+    return 'multiple' if len(matches) > 1 else 'found'
+
+
+def _players(matches):
+    return [m for m in matches if isinstance(m, Player)]
+
+
+def to_record(index, raw, matches):
+    """The NDJSON record for one input line."""
+    return {
+        'index': index,
+        'query': raw,
+        'status': match_status(matches),
+        'matches': [p.to_dict() for p in _players(matches)],
+    }
+
+
+def to_csv_rows(index, raw, matches):
+    """One CSV row per match, or a single row without player fields if there were none."""
+    status = match_status(matches)
+    players = _players(matches)
+    if not players:
+        return [{'index': index, 'query': raw, 'status': status}]
+    return [dict(p.to_dict(), index=index, query=raw, status=status) for p in players]
+
+
+def load_checkpoint(path, queries):
+    """Indexes recorded in the checkpoint at path. Raises CheckpointMismatch if they do not fit queries."""
+    done = set()
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            index = entry['index']
+            if index >= len(queries) or queries[index]['raw'] != entry['query']:
+                raise CheckpointMismatch(f"{path} line {entry} does not match the input")
+            done.add(index)
+    return done
+
+
+class _Writer:
+    """Writes NDJSON or CSV results, flushing after every input line."""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == 'csv':
+            self._csv = csv.DictWriter(stream, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            if not stream.seekable() or stream.tell() == 0:
+                self._csv.writeheader()
+
+    def write(self, index, raw, matches):
+        if self.fmt == 'csv':
+            self._csv.writerows(to_csv_rows(index, raw, matches))
+        else:
+            self.stream.write(json.dumps(to_record(index, raw, matches), ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+
+def run(queries, out, fmt='ndjson', jobs=MAX_IN_FLIGHT, checkpoint=None, done=(), **lookup_kwargs):
+    """
+    Looks up every query not in done, writing results to the out stream as they
+    complete and recording them in the checkpoint stream (if given).
+    Returns {status: count} for this run.
+    """
+    writer = _Writer(out, fmt)
+    todo = [i for i in range(len(queries)) if i not in done]
+    totals = {}
+    for n, (position, raw, matches) in enumerate(
+            iter_player_grading([queries[i] for i in todo], max_in_flight=jobs, **lookup_kwargs), 1):
+        index = todo[position]
+        status = match_status(matches)
+        totals[status] = totals.get(status, 0) + 1
+        if matches is None:
+            logger.warning("Lookup failed for line %d (%s); re-run to retry it.", index, raw)
+        else:
+            writer.write(index, raw, matches)
+            if checkpoint is not None:
+                checkpoint.write(json.dumps({'index': index, 'query': raw}, ensure_ascii=False) + '\n')
+                checkpoint.flush()
+        if n % 100 == 0:
+            logger.info("%d / %d lines done", n, len(todo))
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look up Chess Scotland grades for a list of players.")
+    parser.add_argument('inputs', nargs='*', help="Input files in the app's syntax ('-' or none for stdin).")
+    parser.add_argument('-o', '--output', help="Output file (default: stdout).")
+    parser.add_argument('--format', choices=FORMATS,
+                        help="ndjson (one object per line) or csv (one row per match). "
+                             "Default: from the output file's extension, else ndjson.")
+    parser.add_argument('-j', '--jobs', type=int, default=MAX_IN_FLIGHT, help="Lines looked up at once.")
+    parser.add_argument('--checkpoint', help="Progress file; re-running with it resumes where the last run stopped.")
+    parser.add_argument('--planner', action='store_true', help="Fewer requests for multi-word names.")
+    parser.add_argument('--cache', action='store_true', help="Use (and fill) the on-disk lookup cache.")
+    parser.add_argument('--mirror', action='store_true', help="Use the local roster mirror, if it has been synced.")
+    parser.add_argument('--published', action='store_true',
+                        help="Only published grades are needed, so older cache entries will do.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    fmt = args.format or ('csv' if (args.output or '').lower().endswith('.csv') else 'ndjson')
+
+    queries = read_queries(args.inputs)
+    try:
+        done = load_checkpoint(args.checkpoint, queries)
+    except CheckpointMismatch as e:
+        logger.error("%s. Delete it to start again.", e)
+        return 2
+    if done:
+        logger.info("Resuming: %d of %d lines already done.", len(done), len(queries))
+
+    lookup_kwargs = {'planner': args.planner, 'need_live': not args.published}
+    if args.cache:
+        lookup_kwargs['cache'] = ResponseCache()
+    if args.mirror:
+        if os.path.exists(DEFAULT_MIRROR_PATH):
+            lookup_kwargs['mirror'] = RosterMirror()
+        else:
+            logger.warning("No roster mirror at %s; run `python roster_mirror.py sync` first.", DEFAULT_MIRROR_PATH)
+
+    # Append when resuming, so earlier results are kept
+    out = open(args.output, 'a' if done else 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    checkpoint = open(args.checkpoint, 'a', encoding='utf-8') if args.checkpoint else None
+    try:
+        totals = run(queries, out, fmt, args.jobs, checkpoint, done, **lookup_kwargs)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if checkpoint is not None:
+            checkpoint.close()
+
+    logger.info("Done: %s", ", ".join(f"{count} {status}" for status, count in sorted(totals.items())) or "nothing to do")
+    return 1 if totals.get('failed') else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
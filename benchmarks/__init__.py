@@ -0,0 +1 @@
+"""Micro-benchmarks for the parsing and query hot paths. Run with: python -m benchmarks"""
@@ -0,0 +1,45 @@
+"""
+Runs the micro-benchmarks and compares them with benchmarks/baseline.json.
+
+    python -m benchmarks                  # run everything, report against the baseline
+    python -m benchmarks -k parse         # only cases whose name contains "parse"
+    python -m benchmarks --save           # record the results as the new baseline
+    python -m benchmarks --threshold 0.1  # flag anything 10% slower
+
+Exits with status 1 if any case regressed beyond the threshold.
+"""
+
+import argparse
+import sys
+
+from benchmarks import suite
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Parsing and query micro-benchmarks.")
+    parser.add_argument('-k', dest='pattern', default="", help="Only run cases whose name contains this.")
+    parser.add_argument('--save', action='store_true', help="Store the results as the baseline.")
+    parser.add_argument('--baseline', default=suite.BASELINE_PATH, help="Baseline file to compare with or save to.")
+    parser.add_argument('--threshold', type=float, default=suite.DEFAULT_THRESHOLD,
+                        help="Relative slowdown flagged as a regression (default %(default)s).")
+    parser.add_argument('--quick', action='store_true', help="Shorter timing runs (noisier).")
+    args = parser.parse_args(argv)
+
+    results = suite.run(
+        args.pattern,
+        min_time=0.05 if args.quick else 0.2,
+        repeats=3 if args.quick else 5,
+        progress=lambda name, seconds: print(f"  {name}", file=sys.stderr),
+    )
+    if args.save:
+        suite.save_baseline(results, args.baseline)
+        print(f"Saved {len(results)} results to {args.baseline}")
+        return 0
+
+    rows = suite.compare(results, suite.load_baseline(args.baseline), args.threshold)
+    print(suite.format_report(rows, args.threshold))
+    return 1 if any(r[4] == 'REGRESSION' for r in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Deterministic synthetic inputs for the benchmarks: handle-form result tables,
+pasted team sheets, and results maps shaped like get_player_grading's output.
+"""
+
+import random
+
+import chess_grading
+from chess_grading import GRADE_COLUMNS, Player
+
+FORENAMES = [
+    "Nathanael", "Anna", "Robert", "Iain", "Fiona", "Calum", "Eilidh", "Hamish", "Morag", "Alasdair",
+    "Kirsty", "Ewan", "Catriona", "Lachlan", "Isla", "Ruaridh", "Mhairi", "Angus", "Skye", "Fraser",
+]
+SURNAMES = [
+    "Loch", "Smith", "Brown", "MacDonald", "Campbell", "Stewart", "Robertson", "Thomson", "Anderson",
+    "Scott", "O'Neill", "Fraser-Grant", "McLeod", "Murray", "Paterson", "Ross", "Young", "Watson",
+    "Mitchell", "Morrison",
+]
+STATUSES = ["A", "A", "A", "NEW", "J?", "J12", "J16"]
+
+
+def club_codes():
+    chess_grading.load_club_data()
+    return sorted({v['code'] for v in chess_grading.CLUB_DATA.values()})
+
+
+def club_names():
+    chess_grading.load_club_data()
+    return [v['display'] for v in chess_grading.CLUB_DATA.values()]
+
+
+def _grade(rng):
+    return "—" if rng.random() < 0.3 else str(rng.randint(800, 2300))
+
+
+def results_html(rows, seed=0):
+    """A handle-form results table with rows players, in the site's markup."""
+    rng = random.Random(seed)
+    codes = club_codes()
+    parts = ['<div class="results"><table class="table"><thead><tr>'
+             '<th>PNUM</th><th>Name</th><th>Club</th><th>Status</th>'
+             + ''.join(f'<th>{c}</th>' for c in GRADE_COLUMNS)
+             + '</tr></thead><tbody>']
+    for n in range(rows):
+        club = rng.choice(codes)
+        if rng.random() < 0.1:
+            club += ", " + rng.choice(codes)
+        parts.append(
+            '<tr>'
+            f'<td data-column="pnum">{10000 + n}</td>'
+            f'<td data-column="name"><a href="#">{rng.choice(SURNAMES)}, {rng.choice(FORENAMES)}</a></td>'
+            f'<td>{club}</td>'
+            f'<td data-column="status">{rng.choice(STATUSES)}</td>'
+            + ''.join(f'<td data-column="{c}">{_grade(rng)}</td>' for c in GRADE_COLUMNS)
+            + '</tr>'
+        )
+    parts.append('</tbody></table></div>')
+    return ''.join(parts)
+
+
+def pasted_input(lines, seed=0):
+    """A pasted team sheet mixing every input style parse_queries accepts."""
+    rng = random.Random(seed)
+    codes = club_codes()
+    names = club_names()
+    out = []
+    for n in range(lines):
+        forename, surname = rng.choice(FORENAMES), rng.choice(SURNAMES)
+        style = rng.randrange(8)
+        if style == 0:
+            out.append(f"{forename} {surname}")
+        elif style == 1:
+            out.append(f"{surname}, {forename}")
+        elif style == 2:
+            out.append(f"{n + 1}. {forename} {surname} ({rng.randint(900, 2200)})")
+        elif style == 3:
+            out.append(f"[{rng.randint(10000, 99999)}]")
+        elif style == 4:
+            out.append(f"{forename} {surname}; {rng.choice(codes)}")
+        elif style == 5:
+            out.append(f"{surname}; {rng.choice(names)}")
+        elif style == 6:
+            out.append(f"{rng.choice(codes).lower()}:")
+        else:
+            out.append(f"{rng.choice(codes).lower()}: {forename} {surname}")
+    return '\n'.join(out)
+
+
+def raw_names(count, seed=0):
+    """Messy name strings of the kind _clean_name receives."""
+    rng = random.Random(seed)
+    out = []
+    for n in range(count):
+        name = f"{rng.choice(SURNAMES)}, {rng.choice(FORENAMES)}" if n % 2 else f"{rng.choice(FORENAMES)} {rng.choice(SURNAMES)}"
+        out.append(f"{n}. {name} ({rng.randint(900, 2200)})*")
+    return out
+
+
+def club_queries(seed=0):
+    """Every club as a code, a full name, a lower-cased name and a name fragment."""
+    rng = random.Random(seed)
+    chess_grading.load_club_data()
+    queries = []
+    for name, info in chess_grading.CLUB_DATA.items():
+        start = rng.randrange(max(1, len(name) - 3))
+        queries += [info['code'], info['display'], name, name[start:start + 4]]
+    return queries
+
+
+def results_map(lines, seed=0):
+    """A raw -> [Player] map like get_player_grading returns, with a mix of outcomes."""
+    rng = random.Random(seed)
+    players = [
+        Player(str(10000 + n), f"{rng.choice(SURNAMES)}, {rng.choice(FORENAMES)}", rng.choice(club_codes()),
+               "Adult", *(_grade(rng).replace("—", "") for _ in GRADE_COLUMNS))
+        for n in range(max(lines, 1) * 2)
+    ]
+    out = {}
+    for n in range(lines):
+        kind = rng.randrange(10)
+        if kind == 0:
+            out[f"line{n}"] = []
+        elif kind == 1:
+            out[f"x{n}"] = [{'invalid_query': True}]
+        elif kind == 2:
+            out[f"line{n}"] = [p.with_match_type('name') for p in rng.sample(players, 3)]
+        elif kind == 3:
+            out[f"[{n}]"] = [rng.choice(players).with_match_type('pnum')]
+        else:
+            out[f"line{n}"] = [rng.choice(players).with_match_type('name')]
+    return out
@@ -0,0 +1,210 @@
+"""
+Benchmark cases, timing, and comparison against stored baselines.
+
+Every case is a name plus a setup function returning a zero-argument callable;
+setup (generating the synthetic input) is never timed. Timings are the best
+per-call time over several repeats, which is the least noisy figure on a shared
+machine.
+"""
+
+import json
+import os
+import platform
+import time
+
+import chess_grading
+from chess_grading import clean_input_text, get_club_code, iter_results, parse_queries, parse_results
+from results_table import ResultsOptions, ResultsTableMemo, build_results_table
+
+from benchmarks import generators
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# A case is flagged when it is this much slower (0.25 = 25%) than its baseline
+DEFAULT_THRESHOLD = 0.25
+
+CASES = []
+
+
+def case(name):
+    def register(setup):
+        CASES.append((name, setup))
+        return setup
+    return register
+
+
+# --- Parsing ---
+
+for _rows in (10, 100, 1000, 10000):
+    @case(f"parse_results[lxml, {_rows} rows]")
+    def _(rows=_rows):
+        html = generators.results_html(rows)
+        return lambda: parse_results(html)
+
+for _rows in (10, 100, 1000):
+    @case(f"parse_results[bs4, {_rows} rows]")
+    def _(rows=_rows):
+        html = generators.results_html(rows)
+        return lambda: parse_results(html, fast=False)
+
+for _rows in (1000, 10000):
+    @case(f"iter_results[{_rows} rows]")
+    def _(rows=_rows):
+        html = generators.results_html(rows)
+        return lambda: sum(1 for _ in iter_results(html))
+
+
+# --- Input handling ---
+
+for _lines in (10, 100, 1000, 5000):
+    @case(f"parse_queries[{_lines} lines]")
+    def _(lines=_lines):
+        text = generators.pasted_input(lines)
+        return lambda: parse_queries(text)
+
+    @case(f"clean_input_text[{_lines} lines]")
+    def _(lines=_lines):
+        text = generators.pasted_input(lines)
+        return lambda: clean_input_text(text)
+
+
+@case("_clean_name[1000 names]")
+def _():
+    names = generators.raw_names(1000)
+    clean = chess_grading._clean_name
+    return lambda: [clean(n) for n in names]
+
+
+@case("get_club_code[all clubs, cold]")
+def _():
+    queries = generators.club_queries()
+
+    def run():
+        chess_grading.CLUB_DATA = {}  # forces the club file and index to be rebuilt
+        for q in queries:
+            get_club_code(q)
+    return run
+
+
+@case("get_club_code[all clubs, warm]")
+def _():
+    queries = generators.club_queries()
+    for q in queries:
+        get_club_code(q)
+    return lambda: [get_club_code(q) for q in queries]
+
+
+# --- App results stage ---
+
+for _lines in (10, 100, 1000):
+    @case(f"app results stage[{_lines} lines]")
+    def _(lines=_lines):
+        results = generators.results_map(lines)
+        club_map = {c['code']: c['name'] for c in chess_grading.get_clubs_list()}
+        options = ResultsOptions(show_age=True, grades=(True,) * 6)
+        return lambda: build_results_table(results, club_map, options)
+
+
+@case("app results stage[1000 lines, memoised rerun]")
+def _():
+    results = generators.results_map(1000)
+    club_map = {c['code']: c['name'] for c in chess_grading.get_clubs_list()}
+    lines = list(results)
+    memo = ResultsTableMemo()
+    return lambda: memo.get(lines, 0, lambda _: results, club_map)
+
+
+def measure(fn, min_time=0.2, repeats=5):
+    """Best per-call seconds over repeats, each running fn enough times to last min_time."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeats or loops >= 1 << 20:
+            break
+        loops *= 2
+    best = elapsed / loops
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def run(pattern="", min_time=0.2, repeats=5, progress=None):
+    """Runs every case whose name contains pattern. Returns {name: seconds per call}."""
+    results = {}
+    for name, setup in CASES:
+        if pattern.lower() not in name.lower():
+            continue
+        results[name] = measure(setup(), min_time=min_time, repeats=repeats)
+        if progress:
+            progress(name, results[name])
+    chess_grading.CLUB_DATA = {}
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)['results']
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """Stores results (merged over any existing baseline) along with the machine they came from."""
+    merged = dict(load_baseline(path), **results)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'python': platform.python_version(),
+            'machine': f"{platform.system()} {platform.machine()}",
+            'results': dict(sorted(merged.items())),
+        }, f, indent=1)
+        f.write('\n')
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns a list of (name, seconds, baseline_seconds or None, ratio or None, verdict),
+    where verdict is 'REGRESSION', 'faster', 'ok' or 'new'.
+    """
+    rows = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        if not base:
+            rows.append((name, seconds, None, None, 'new'))
+            continue
+        ratio = seconds / base
+        if ratio > 1 + threshold:
+            verdict = 'REGRESSION'
+        elif ratio < 1 / (1 + threshold):
+            verdict = 'faster'
+        else:
+            verdict = 'ok'
+        rows.append((name, seconds, base, ratio, verdict))
+    return rows
+
+
+def _fmt(seconds):
+    if seconds is None:
+        return "-"
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def format_report(rows, threshold=DEFAULT_THRESHOLD):
+    width = max([len(r[0]) for r in rows] + [4])
+    lines = [f"{'case':<{width}}  {'time':>10}  {'baseline':>10}  {'ratio':>6}  verdict",
+             "-" * (width + 44)]
+    for name, seconds, base, ratio, verdict in rows:
+        ratio_text = f"{ratio:.2f}x" if ratio is not None else "-"
+        lines.append(f"{name:<{width}}  {_fmt(seconds):>10}  {_fmt(base):>10}  {ratio_text:>6}  {verdict}")
+    regressions = sum(1 for r in rows if r[4] == 'REGRESSION')
+    lines.append("")
+    lines.append(f"{regressions} regression(s) beyond {threshold:.0%} of baseline.")
+    return "\n".join(lines)
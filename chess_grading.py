@@ -1,16 +1,90 @@
+import asyncio
 import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple
 
 import requests
 from bs4 import BeautifulSoup
+from lxml import etree
 import json
 import logging
 import os
 
+from metrics import REGISTRY
+from profiling import profiled
+from throttle import AdaptiveLimiter, RetryPolicy
+from transport import transport_from_env
+
+try:
+    import aiohttp
+except ImportError:  # Only needed by the *_async API
+    aiohttp = None
+
 logger = logging.getLogger(__name__)
 
 # Configuration
-BASE_URL = "https://www.chessscotland.com/grading"
-API_URL = "https://www.chessscotland.com/handle-form"
+# CHESS_GRADING_SITE_URL points the client at another host, e.g. a local fake_server.py
+SITE_URL = os.environ.get('CHESS_GRADING_SITE_URL', 'https://www.chessscotland.com').rstrip('/')
+BASE_URL = f"{SITE_URL}/grading"
+API_URL = f"{SITE_URL}/handle-form"
+
+# Upper bound on concurrent handle-form requests per batch; keep this small
+# so a long team sheet does not hammer chessscotland.com.
+MAX_IN_FLIGHT = 4
+
+# Shared by the sync and async clients
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+XHR_HEADERS = {
+    'X-Requested-With': 'XMLHttpRequest',
+    'Accept': 'application/json, text/javascript, */*; q=0.01',
+    'Origin': SITE_URL,
+}
+REQUEST_TIMEOUT = 10
+
+# handle-form answers these when the CSRF token has expired
+STALE_TOKEN_STATUSES = {400, 403, 419}
+# ...or a 200 whose JSON 'error' says so, e.g. {"error": "Invalid CSRF token"}
+STALE_TOKEN_ERROR = re.compile(r"\b(?:csrf|invalid|expired)\b.*\btoken\b", re.IGNORECASE)
+# Re-scrape the CSRF token before the site is likely to have expired it
+SESSION_MAX_AGE = 15 * 60
+
+# One limiter for every session and thread in the process, so concurrent
+# lookups share one request budget (rate, in-flight requests, 429 pauses).
+RATE_LIMITER = AdaptiveLimiter(initial=MAX_IN_FLIGHT, maximum=2 * MAX_IN_FLIGHT)
+# Transient handle-form failures (429/5xx, connection errors, timeouts) are retried
+RETRY_POLICY = RetryPolicy()
+
+# Where sessions come from: live by default, or recording / replaying fixtures
+# (see transport.py and CHESS_GRADING_TRANSPORT)
+TRANSPORT = transport_from_env()
+
+# Instrumentation, exposed in Prometheus format by metrics.py
+SESSION_SECONDS = REGISTRY.histogram(
+    'chess_grading_session_bootstrap_seconds', "Time to load the grading page and scrape a CSRF token.",
+    labels=('outcome',))
+SEARCH_SECONDS = REGISTRY.histogram(
+    'chess_grading_search_seconds', "Time per handle-form POST, by HTTP status ('error' if none came back).",
+    labels=('status',))
+SEARCH_RETRIES = REGISTRY.counter(
+    'chess_grading_search_retries_total', "handle-form requests retried after a transient failure.",
+    labels=('reason',))
+RESPONSE_BYTES = REGISTRY.counter(
+    'chess_grading_response_bytes_total', "Response bytes received from the site.", labels=('endpoint',))
+PARSE_SECONDS = REGISTRY.histogram('chess_grading_parse_seconds', "Time spent in parse_results.")
+ROWS_PARSED = REGISTRY.counter('chess_grading_rows_parsed_total', "Player rows parsed from result tables.")
+LOOKUPS = REGISTRY.counter(
+    'chess_grading_lookups_total', "Mirror and cache lookups made before going to the network.",
+    labels=('layer', 'result'))
+BATCH_SECONDS = REGISTRY.histogram(
+    'chess_grading_batch_seconds', "Time per get_player_grading call.", labels=('outcome',),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+QUERY_LINES = REGISTRY.counter('chess_grading_query_lines_total', "Query lines passed to get_player_grading.")
+REQUESTS_PER_LINE = REGISTRY.histogram(
+    'chess_grading_requests_per_line', "handle-form requests sent per query line, per batch.",
+    buckets=(0, 0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0))
 
 # Path to club data file, relative to this script regardless of working directory
 _DIR = os.path.dirname(os.path.abspath(__file__))
@@ -20,92 +94,379 @@ CLUB_FILE = os.path.join(_DIR, 'club_names.txt')
 def get_session_and_token():
     """
     Visits the main page to initialise cookies and scrape the dynamic CSRF token.
+    The session comes from TRANSPORT.
     """
-    session = requests.Session()
+    start = time.perf_counter()
+    session = TRANSPORT.session()
     session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'User-Agent': USER_AGENT,
         'Referer': BASE_URL
     })
 
     try:
-        response = session.get(BASE_URL, timeout=10)
+        response = session.get(BASE_URL, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.RequestException as e:
         logger.error("Error connecting to main page: %s", e)
+        SESSION_SECONDS.observe(time.perf_counter() - start, outcome='error')
+        return None, None
+
+    RESPONSE_BYTES.inc(len(response.content), endpoint='grading')
+    csrf_token = _extract_csrf_token(response.text)
+    SESSION_SECONDS.observe(time.perf_counter() - start, outcome='ok' if csrf_token else 'no_token')
+    if not csrf_token:
         return None, None
 
-    soup = BeautifulSoup(response.text, 'lxml')
+    return session, csrf_token
+
+
+def _extract_csrf_token(page_html):
+    """Scrapes the _csrf_token hidden input from the grading page, or None."""
+    soup = BeautifulSoup(page_html, 'lxml')
     token_input = soup.find('input', {'name': '_csrf_token'})
     if not token_input:
         logger.error("Could not find CSRF token on main page.")
-        return None, None
+        return None
+    return token_input['value']
 
-    return session, token_input['value']
 
+def _search_fields(csrf_token, forename, surname, club, pnum):
+    """Returns the handle-form search_players fields, in the order the site sends them."""
+    return [
+        ('_csrf_token', csrf_token),
+        ('action', 'search_players'),
+        ('forename', forename),
+        ('surname', surname),
+        ('pnum', pnum),
+        ('gender', ''),
+        ('club', club),
+        ('fide_fed', ''),
+        ('min_age', ''),
+        ('max_age', ''),
+    ]
 
-def search_player(session, csrf_token, forename, surname, club="", pnum=""):
+
+class StaleTokenError(requests.HTTPError):
+    """The handle-form endpoint rejected the CSRF token (expired or session reset)."""
+
+
+def _post_search(session, csrf_token, forename, surname, club="", pnum=""):
     """
-    Sends the XHR request to the handle-form endpoint.
+    Sends the XHR request to the handle-form endpoint and returns the results HTML.
+    Raises StaleTokenError if the token was rejected, or requests.RequestException
+    on any other failure.
     """
-    headers = {
-        'X-Requested-With': 'XMLHttpRequest',
-        'Accept': 'application/json, text/javascript, */*; q=0.01',
-        'Origin': 'https://www.chessscotland.com',
-    }
-
     # 'files' parameter forces multipart/form-data encoding
     payload = {
-        '_csrf_token': (None, csrf_token),
-        'action': (None, 'search_players'),
-        'forename': (None, forename),
-        'surname': (None, surname),
-        'pnum': (None, pnum),
-        'gender': (None, ''),
-        'club': (None, club),
-        'fide_fed': (None, ''),
-        'min_age': (None, ''),
-        'max_age': (None, ''),
+        name: (None, value)
+        for name, value in _search_fields(csrf_token, forename, surname, club, pnum)
     }
 
+    start = time.perf_counter()
     try:
-        response = session.post(API_URL, headers=headers, files=payload, timeout=10)
-        response.raise_for_status()
+        response = session.post(API_URL, headers=XHR_HEADERS, files=payload, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException:
+        SEARCH_SECONDS.observe(time.perf_counter() - start, status='error')
+        raise
+    SEARCH_SECONDS.observe(time.perf_counter() - start, status=response.status_code)
+    RESPONSE_BYTES.inc(len(response.content), endpoint='handle-form')
 
-        try:
-            data = response.json()
-            if isinstance(data, dict) and 'html' in data:
-                return data['html']
-            elif isinstance(data, str):
-                return data
-        except json.JSONDecodeError:
-            return response.text
+    if response.status_code in STALE_TOKEN_STATUSES:
+        raise StaleTokenError(f"CSRF token rejected (HTTP {response.status_code})", response=response)
+    response.raise_for_status()
 
+    try:
+        data = response.json()
+    except json.JSONDecodeError:
+        return response.text
+
+    if isinstance(data, dict) and 'html' in data:
+        return data['html']
+    elif isinstance(data, str):
+        return data
+    elif isinstance(data, dict) and STALE_TOKEN_ERROR.search(str(data.get('error', ''))):
+        raise StaleTokenError(f"CSRF token rejected: {data['error']}", response=response)
+    return None
+
+
+def _send_search(session, csrf_token, forename, surname, club="", pnum=""):
+    """
+    _post_search under the shared RATE_LIMITER. Retryable failures (statuses in
+    RETRY_POLICY, connection errors and timeouts) are retried with jittered
+    exponential backoff, and a 429's Retry-After pauses every caller. Raises
+    the last error once RETRY_POLICY.attempts are used up.
+    """
+    retry = 0
+    while True:
+        status = retry_after = None
+        with RATE_LIMITER.slot() as outcome:
+            try:
+                return _post_search(session, csrf_token, forename, surname, club=club, pnum=pnum)
+            except StaleTokenError:
+                raise
+            except requests.HTTPError as e:
+                status = getattr(e.response, 'status_code', None)
+                if status not in RETRY_POLICY.statuses:
+                    raise
+                outcome.ok = False
+                retry_after = e.response.headers.get('Retry-After')
+                error = e
+            except (requests.ConnectionError, requests.Timeout) as e:
+                outcome.ok = False
+                error = e
+
+        retry += 1
+        if retry >= RETRY_POLICY.attempts:
+            raise error
+        SEARCH_RETRIES.inc(reason=status or type(error).__name__)
+        delay = RETRY_POLICY.delay(retry - 1, retry_after)
+        if status == 429:
+            RATE_LIMITER.pause(delay)
+        logger.warning("Search request failed (%s); retry %d in %.1fs.", error, retry, delay)
+        time.sleep(delay)
+
+
+def search_player(session, csrf_token, forename, surname, club="", pnum=""):
+    """
+    Sends the XHR request to the handle-form endpoint, retrying transient failures.
+    Returns the results HTML, or None on failure.
+    """
+    try:
+        return _send_search(session, csrf_token, forename, surname, club=club, pnum=pnum)
     except requests.RequestException as e:
         logger.error("Search request failed: %s", e)
         return None
 
-    return None
+
+class SessionManager:
+    """
+    Keeps one requests.Session and CSRF token alive across get_player_grading
+    calls, so each batch does not pay for a fresh grading-page bootstrap.
+
+    The pair is refreshed proactively once it is older than max_age seconds,
+    and on demand when the backend rejects the token. Safe to share between threads.
+    """
+
+    def __init__(self, max_age=SESSION_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._session = None
+        self._token = None
+        self._created_at = 0.0
+
+    def get(self):
+        """Returns (session, csrf_token), bootstrapping if needed. (None, None) on failure."""
+        with self._lock:
+            if self._token is None or time.monotonic() - self._created_at > self.max_age:
+                self._bootstrap()
+            return self._session, self._token
+
+    def refresh(self, stale_token=None):
+        """
+        Replaces the session and token. If stale_token is given and another
+        thread has already replaced it, the newer pair is returned instead.
+        """
+        with self._lock:
+            if stale_token is None or stale_token == self._token:
+                self._bootstrap()
+            return self._session, self._token
+
+    def _bootstrap(self):
+        if self._session is not None:
+            self._session.close()
+        self._session, self._token = get_session_and_token()
+        self._created_at = time.monotonic()
+
+    def search(self, forename, surname, club="", pnum=""):
+        """
+        search_player using the managed session. If the token is rejected, the
+        session is refreshed and the search retried once.
+        """
+        session, csrf_token = self.get()
+        if not session:
+            return None
+        try:
+            return _send_search(session, csrf_token, forename, surname, club=club, pnum=pnum)
+        except StaleTokenError as e:
+            logger.warning("%s; refreshing session and retrying.", e)
+        except requests.RequestException as e:
+            logger.error("Search request failed: %s", e)
+            return None
+
+        session, csrf_token = self.refresh(stale_token=csrf_token)
+        if not session:
+            return None
+        return search_player(session, csrf_token, forename, surname, club=club, pnum=pnum)
 
 
 def get_text_safe(tag):
     """Returns clean text from a BeautifulSoup tag, or empty string for dash/empty values."""
     if not tag:
         return ""
-    txt = tag.get_text(strip=True)
+    return _blank_dash(tag.get_text(strip=True))
+
+
+def _blank_dash(txt):
+    """Grade cells use a dash for 'no grade'; normalise those to an empty string."""
     if txt in ['&mdash;', '—', '', '-']:
         return ""
     return txt
 
 
-def parse_results(html_content):
+def _age_category(raw_status):
+    """Maps the status column (which encodes age category) to its display value."""
+    if raw_status == 'A':
+        return "Adult"
+    elif raw_status == 'NEW':
+        return "New"
+    elif raw_status == 'J?':
+        return "Junior"
+    elif raw_status.startswith('J') and raw_status[1:].isdigit():
+        return raw_status[1:]
+    return raw_status
+
+
+GRADE_COLUMNS = (
+    'standard_published', 'standard_live',
+    'allegro_published', 'allegro_live',
+    'blitz_published', 'blitz_live',
+)
+PLAYER_FIELDS = ('pnum', 'name', 'club', 'age') + GRADE_COLUMNS + ('match_type',)
+_GRADE_INDEX = {column: i for i, column in enumerate(GRADE_COLUMNS)}
+
+
+# Grades fall in a narrow range, so one shared int object per value is kept
+_GRADE_INTS = {}
+
+
+def _grade_value(text):
+    if not text.isdigit():
+        return None
+    value = int(text)
+    return _GRADE_INTS.setdefault(value, value)
+
+
+class Player:
+    """
+    Compact record for one player row; treat it as immutable.
+
+    Uses __slots__ instead of a per-row dict, interns the club code, age
+    category and grade strings (heavily repeated across a roster), and keeps
+    integer grades alongside the display strings. Supports read-only dict-style
+    access (player['pnum'], player.get('club'), dict(player)) and to_dict() for
+    code written against the old player dicts. match_type is None for
+    club-only results, which then behave as if the key were absent.
+    """
+
+    __slots__ = PLAYER_FIELDS + ('_grade_values',)
+
+    def __init__(self, pnum, name, club="", age="",
+                 standard_published="", standard_live="",
+                 allegro_published="", allegro_live="",
+                 blitz_published="", blitz_live="", match_type=None):
+        grades = (standard_published, standard_live, allegro_published,
+                  allegro_live, blitz_published, blitz_live)
+        self.pnum = pnum
+        self.name = name
+        self.club = sys.intern(club)
+        self.age = sys.intern(age)
+        for column, text in zip(GRADE_COLUMNS, grades):
+            setattr(self, column, sys.intern(text))
+        self.match_type = match_type
+        self._grade_values = tuple(_grade_value(text) for text in grades)
+
+    @classmethod
+    def from_dict(cls, row):
+        """Builds a Player from an old-style player dict (extra keys are ignored)."""
+        return cls(**{field: row[field] for field in PLAYER_FIELDS if field in row})
+
+    def to_dict(self):
+        """Returns the old-style player dict."""
+        return {field: getattr(self, field) for field in self.keys()}
+
+    def grade_value(self, column):
+        """Integer value of a grade column (e.g. 'standard_published'), or None if ungraded."""
+        return self._grade_values[_GRADE_INDEX[column]]
+
+    def with_match_type(self, match_type):
+        """Returns a copy of this player tagged with match_type."""
+        player = object.__new__(Player)
+        for field in self.__slots__:
+            setattr(player, field, getattr(self, field))
+        player.match_type = match_type
+        return player
+
+    def copy(self):
+        return self.with_match_type(self.match_type)
+
+    # --- read-only mapping interface ---
+
+    def keys(self):
+        if self.match_type is None:
+            return PLAYER_FIELDS[:-1]
+        return PLAYER_FIELDS
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __getitem__(self, key):
+        if key not in self.keys():
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.keys() else default
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.keys()]
+
+    def _astuple(self):
+        return tuple(getattr(self, field) for field in PLAYER_FIELDS)
+
+    def __eq__(self, other):
+        if isinstance(other, Player):
+            return self._astuple() == other._astuple()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self._astuple())
+
+    def __repr__(self):
+        return "Player(" + ", ".join(f"{field}={getattr(self, field)!r}" for field in self.keys()) + ")"
+
+
+def parse_results(html_content, fast=True):
     """
     Parses the returned HTML snippet.
-    Returns a list of player dicts. The backend handles all partial matching;
+    Returns a list of Player records. The backend handles all partial matching;
     no client-side name filtering is applied here.
+
+    By default a single-pass lxml parser is used, falling back to BeautifulSoup
+    if the markup is not the plain table it expects. Both produce identical
+    output; fast=False forces the BeautifulSoup path.
     """
     if not html_content:
         return []
 
+    start = time.perf_counter()
+    results = _parse_results_lxml(html_content) if fast else None
+    if results is None:
+        results = _parse_results_bs4(html_content)
+    PARSE_SECONDS.observe(time.perf_counter() - start)
+    ROWS_PARSED.inc(len(results))
+    return results
+
+
+def _parse_results_bs4(html_content):
+    """Reference parser: BeautifulSoup tree with per-column lookups."""
     soup = BeautifulSoup(html_content, 'lxml')
     rows = soup.find_all('tr')
     results = []
@@ -133,42 +494,217 @@ def parse_results(html_content):
                 if not potential_club.has_attr('data-column'):
                     club = potential_club.get_text(strip=True)
 
-            # Status field encodes age category
             raw_status = status_tag.get_text(strip=True) if status_tag else ""
-            if raw_status == 'A':
-                age = "Adult"
-            elif raw_status == 'NEW':
-                age = "New"
-            elif raw_status == 'J?':
-                age = "Junior"
-            elif raw_status.startswith('J') and raw_status[1:].isdigit():
-                age = raw_status[1:]
-            else:
-                age = raw_status
-
-            results.append({
-                "pnum": pnum,
-                "name": name,
-                "club": club,
-                "age": age,
-                "standard_published": get_text_safe(std_pub_tag),
-                "standard_live": get_text_safe(std_live_tag),
-                "allegro_published": get_text_safe(alg_pub_tag),
-                "allegro_live": get_text_safe(alg_live_tag),
-                "blitz_published": get_text_safe(blitz_pub_tag),
-                "blitz_live": get_text_safe(blitz_live_tag),
-            })
+
+            results.append(Player(
+                pnum,
+                name,
+                club,
+                _age_category(raw_status),
+                get_text_safe(std_pub_tag),
+                get_text_safe(std_live_tag),
+                get_text_safe(alg_pub_tag),
+                get_text_safe(alg_live_tag),
+                get_text_safe(blitz_pub_tag),
+                get_text_safe(blitz_live_tag),
+            ))
 
     return results
 
 
+# BeautifulSoup's get_text() leaves out strings inside these elements
+_NON_TEXT_TAGS = frozenset(('script', 'style', 'template'))
+
+
+def _lxml_text(el):
+    """Text of an lxml element exactly as BeautifulSoup's get_text(strip=True) returns it."""
+    if len(el) == 0:
+        return el.text.strip() if el.text else ""
+    parts = []
+    _collect_text(el, parts)
+    return "".join(parts)
+
+
+def _collect_text(el, parts):
+    if el.tag in _NON_TEXT_TAGS:
+        return
+    if el.text:
+        parts.append(el.text.strip())
+    for child in el:
+        # Comments and processing instructions have non-str tags; only their tail is text
+        if isinstance(child.tag, str):
+            _collect_text(child, parts)
+        if child.tail:
+            parts.append(child.tail.strip())
+
+
+def _parse_results_lxml(html_content):
+    """
+    Fast parser: one lxml pass per row, mapping each cell's data-column once.
+    Returns None when the input needs BeautifulSoup's handling (non-str input
+    or unparseable documents).
+    """
+    if not isinstance(html_content, str):
+        return None
+    try:
+        root = etree.HTML(html_content)
+    except (ValueError, etree.ParserError):
+        return None
+    if root is None:
+        return []
+
+    results = []
+    for row in root.iter('tr'):
+        player = _lxml_row_to_player(row)
+        if player is not None:
+            results.append(player)
+    return results
+
+
+def _iter_chunks(source, chunk_size):
+    if isinstance(source, (str, bytes)):
+        for i in range(0, len(source), chunk_size):
+            yield source[i:i + chunk_size]
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        yield from source
+
+
+def iter_results(source, chunk_size=64 * 1024, encoding='utf-8'):
+    """
+    Streaming counterpart of parse_results: yields the same Player records one at
+    a time while the HTML is still being parsed, so callers can start writing
+    rows immediately.
+
+    source may be a str or bytes, a (text or binary) file object, or an iterable
+    of chunks such as response.iter_content(). Bytes are decoded as encoding.
+    Each finished row is discarded from the tree, so memory stays flat however
+    many rows there are.
+    """
+    parser = None
+    for chunk in _iter_chunks(source, chunk_size):
+        if not chunk:
+            continue
+        if parser is None:
+            parser = etree.HTMLPullParser(
+                events=('end',), tag='tr',
+                encoding=encoding if isinstance(chunk, bytes) else None,
+            )
+        parser.feed(chunk)
+        yield from _drain_rows(parser)
+
+    if parser is not None:
+        try:
+            parser.close()
+        except etree.XMLSyntaxError:
+            pass
+        yield from _drain_rows(parser)
+
+
+def _drain_rows(parser):
+    for _, row in parser.read_events():
+        # Rows nested inside another row are handled, in document order, when
+        # the outermost row closes; until then they must stay in the tree.
+        if next(row.iterancestors('tr'), None) is not None:
+            continue
+        for tr in row.iter('tr'):
+            player = _lxml_row_to_player(tr)
+            if player is not None:
+                yield player
+        row.clear()
+        parent = row.getparent()
+        if parent is not None:
+            while row.getprevious() is not None:
+                del parent[0]
+
+
+def _lxml_row_to_player(row):
+    """Builds a Player from one lxml <tr>, or None if it is not a player row."""
+    cells = {}
+    tds = []
+    for td in row.iter('td'):
+        tds.append(td)
+        column = td.get('data-column')
+        if column is not None and column not in cells:
+            cells[column] = td
+
+    pnum_td = cells.get('pnum')
+    name_td = cells.get('name')
+    if pnum_td is None or name_td is None:
+        return None
+
+    # Club column has no data-column attribute; locate by position
+    club = ""
+    if len(tds) > 2 and tds[2].get('data-column') is None:
+        club = _lxml_text(tds[2])
+
+    status_td = cells.get('status')
+    grades = []
+    for column in GRADE_COLUMNS:
+        td = cells.get(column)
+        grades.append(_blank_dash(_lxml_text(td)) if td is not None else "")
+    return Player(
+        _lxml_text(pnum_td),
+        _lxml_text(name_td),
+        club,
+        _age_category(_lxml_text(status_td) if status_td is not None else ""),
+        *grades,
+    )
+
+
 # --- Club Lookup Logic ---
 # CLUB_DATA: {name_lower: {'code': str, 'display': str}}
 CLUB_DATA = {}
+_CLUB_INDEX = None
+# Resolved get_club_code queries kept per index; cleared rather than evicted when full
+CLUB_MEMO_SIZE = 4096
+
+
+class _ClubIndex(NamedTuple):
+    """Precomputed answers for get_club_code, built from one CLUB_DATA dict."""
+    source: dict        # the CLUB_DATA dict this was built from
+    size: int           # len(source) at build time
+    codes: frozenset    # every known 2-letter code, upper-case
+    names: dict         # every substring of every club name -> code of the shortest name containing it
+    memo: dict          # raw query -> resolved code
+
+
+def _build_club_index():
+    """
+    Indexes CLUB_DATA for get_club_code. Names are visited shortest first, in
+    CLUB_DATA order among equal lengths, and each substring keeps the first code
+    seen, which is exactly the "shortest club name wins" tie-break. A full name
+    can only be contained in itself or a longer name, so exact matches need no
+    separate map.
+    """
+    global _CLUB_INDEX
+    names = {}
+    for name in sorted(CLUB_DATA, key=len):
+        code = CLUB_DATA[name]['code']
+        names.setdefault("", code)  # a blank query is "contained" in every name
+        for i in range(len(name)):
+            for j in range(i + 1, len(name) + 1):
+                names.setdefault(name[i:j], code)
+    codes = frozenset(v['code'] for v in CLUB_DATA.values())
+    _CLUB_INDEX = _ClubIndex(CLUB_DATA, len(CLUB_DATA), codes, names, {})
+    return _CLUB_INDEX
+
+
+def _club_index():
+    """Returns the club index, rebuilding it if CLUB_DATA was replaced or changed size."""
+    index = _CLUB_INDEX
+    if index is None or index.source is not CLUB_DATA or index.size != len(CLUB_DATA):
+        index = _build_club_index()
+    return index
 
 
 def load_club_data():
-    """Loads club names and codes from CLUB_FILE into CLUB_DATA (idempotent)."""
+    """Loads club names and codes from CLUB_FILE into CLUB_DATA (idempotent) and indexes them."""
     global CLUB_DATA
     if CLUB_DATA:
         return
@@ -182,6 +718,7 @@ def load_club_data():
                     CLUB_DATA[fullname.lower()] = {'code': abbrev, 'display': fullname}
     except FileNotFoundError:
         logger.warning("club_names.txt not found at %s. Club lookup will be limited.", CLUB_FILE)
+    _build_club_index()
 
 
 def get_clubs_list():
@@ -197,34 +734,32 @@ def get_club_code(query):
     1. If 2 chars and a known code, return it.
     2. Exact name match.
     3. Substring match — shortest club name wins.
+
+    All three are answered from the precomputed club index, and resolved
+    queries are memoised.
     """
     if not query:
         return ""
-    query = query.strip()
 
     load_club_data()
+    index = _club_index()
+    code = index.memo.get(query)
+    if code is not None:
+        return code
 
+    stripped = query.strip()
+    code = ""
     # 1. 2-char shortcut: only treat as code if it matches a known code
-    if len(query) == 2:
-        q_upper = query.upper()
-        known_codes = {v['code'] for v in CLUB_DATA.values()}
-        if q_upper in known_codes:
-            return q_upper
-        # Fall through to name matching
-
-    q_lower = query.lower()
-
-    # 2. Exact name match
-    if q_lower in CLUB_DATA:
-        return CLUB_DATA[q_lower]['code']
-
-    # 3. Substring match — prioritise shortest club name
-    matches = [k for k in CLUB_DATA if q_lower in k]
-    if matches:
-        matches.sort(key=len)
-        return CLUB_DATA[matches[0]]['code']
+    if len(stripped) == 2 and stripped.upper() in index.codes:
+        code = stripped.upper()
+    # 2 + 3. Exact or substring name match, shortest name first
+    else:
+        code = index.names.get(stripped.lower(), "")
 
-    return ""
+    if len(index.memo) >= CLUB_MEMO_SIZE:
+        index.memo.clear()
+    index.memo[query] = code
+    return code
 
 
 def _clean_name(text):
@@ -389,7 +924,218 @@ def clean_input_text(raw_text):
     return '\n'.join(cleaned_lines)
 
 
-def get_player_grading(queries):
+class _QueryPlan(NamedTuple):
+    """The backend searches needed to answer one query line, and how to merge them."""
+    raw: str
+    searches: list      # [(forename, surname, club, pnum), ...] in merge order
+    match_type: str     # 'pnum', 'name', or None for club-only searches
+    dedup: bool         # drop repeated pnums across the merged searches
+    invalid: bool       # query too short to search
+    staged: bool = False  # planner: try searches[0] alone before the rest
+    name: str = ""        # cleaned name, for the planner's exact-match check and fuzzy suggestions
+
+
+def _plan_query(query, planner=False):
+    """
+    Works out which handle-form searches a query dict needs, without doing any I/O.
+
+    With planner=True, multi-word names are ordered most-likely-first (last word
+    as surname, then first word, then the middle words) and marked as staged.
+    """
+    raw_key = query['raw']
+    name_part = query['name']
+    club_raw = query.get('club', '')
+    is_single = query.get('is_single', False)
+
+    if query.get('pnum'):
+        # PNUM search: backend does a direct lookup by player number
+        return _QueryPlan(raw_key, [("", "", "", query['pnum'])], 'pnum', False, False)
+
+    # Resolve club code from the explicit club part
+    club_code = ""
+    if club_raw:
+        club_code = get_club_code(club_raw)
+
+    # Implicit club code: single 2-char token with no explicit club (e.g. "ST")
+    if not club_code and is_single and len(name_part) == 2:
+        resolved = get_club_code(name_part)
+        if resolved:
+            club_code = resolved
+            name_part = ""
+
+    if name_part and len(name_part) < 3:
+        return _QueryPlan(raw_key, [], None, False, True)
+
+    if not name_part:
+        if club_code:
+            # Club-only search
+            return _QueryPlan(raw_key, [("", "", club_code, "")], None, False, False)
+        return _QueryPlan(raw_key, [], None, False, False)
+
+    if is_single:
+        # Ambiguous single token: try as forename and as surname, merge results
+        searches = [(name_part, "", club_code, ""), ("", name_part, club_code, "")]
+    else:
+        # Multi-word: try each word as surname with the rest as forename.
+        # This catches both "John Smith" and "Smith John" style entries.
+        words = name_part.strip().split()
+        order = range(len(words))
+        if planner and len(words) > 1:
+            order = [len(words) - 1, 0] + list(range(1, len(words) - 1))
+        searches = [
+            (" ".join(words[:i] + words[i+1:]), words[i], club_code, "")
+            for i in order
+        ]
+        if planner and len(searches) > 1:
+            return _QueryPlan(raw_key, searches, 'name', True, False, True, name_part)
+    return _QueryPlan(raw_key, searches, 'name', True, False, name=name_part)
+
+
+def _is_exact_name_match(player_name, query_name):
+    """True if the backend's "Surname, Forename" has exactly the query's words, in any order."""
+    return sorted(_clean_name(player_name).lower().split()) == sorted(query_name.lower().split())
+
+
+def _settle_staged_plan(plan, first_rows, budget):
+    """
+    Decides how many of a staged plan's searches to run after its first one:
+    none if that returned a single exact full-name match, otherwise the rest,
+    up to budget searches in total. Returns (plan, searches_saved).
+    """
+    if len(first_rows) == 1 and _is_exact_name_match(first_rows[0]['name'], plan.name):
+        keep = 1
+    else:
+        keep = len(plan.searches) if budget is None else max(1, budget)
+    keep = min(keep, len(plan.searches))
+    return plan._replace(searches=plan.searches[:keep]), len(plan.searches) - keep
+
+
+def search_key(forename, surname, club="", pnum=""):
+    """
+    Normalised identity of one handle-form search, used as the cache key.
+    Name fields are case- and whitespace-insensitive; club codes are upper-cased.
+    """
+    return (
+        ' '.join(forename.lower().split()),
+        ' '.join(surname.lower().split()),
+        club.strip().upper(),
+        pnum.strip(),
+    )
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the
+    function, and any caller arriving while it is still running waits for and
+    receives the same result (or exception) instead of repeating the work.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> [done Event, result, exception]
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = [threading.Event(), None, None]
+                self._calls[key] = call
+
+        if not leader:
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+
+        try:
+            call[1] = fn()
+        except Exception as e:
+            call[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call[0].set()
+        return call[1]
+
+
+# Identical searches in flight anywhere in this process share one request
+_IN_FLIGHT = SingleFlight()
+
+
+def _pending_searches(plans):
+    """Returns {search_key: search} for every distinct search the plans need."""
+    pending = {}
+    for plan in plans:
+        for search in plan.searches:
+            pending.setdefault(search_key(*search), search)
+    return pending
+
+
+def _run_searches(sessions, pending, max_in_flight, cache=None):
+    """
+    Fetches and parses each search in pending ({search_key: search}), returning
+    {search_key: rows}. Up to max_in_flight requests share the managed session
+    concurrently; 1 runs them serially. A search already in flight from another
+    caller is joined rather than repeated. Successful responses are stored in
+    cache, if given; failures are not.
+    """
+    def fetch(search):
+        forename, surname, club, pnum = search
+        html = sessions.search(forename, surname, club=club, pnum=pnum)
+        rows = parse_results(html)
+        if cache is not None and html is not None:
+            cache.put(search_key(*search), rows)
+        return rows
+
+    def fetch_shared(item):
+        key, search = item
+        return key, _IN_FLIGHT.do(key, lambda: fetch(search))
+
+    items = list(pending.items())
+    if max_in_flight <= 1 or len(items) <= 1:
+        return dict(fetch_shared(item) for item in items)
+
+    with ThreadPoolExecutor(max_workers=min(max_in_flight, len(items))) as pool:
+        return dict(pool.map(fetch_shared, items))
+
+
+def _merge_plan(plan, parsed):
+    """Combines the parsed rows of a plan's searches into its final match list."""
+    if plan.invalid:
+        return [{'invalid_query': True}]
+
+    matches = []
+    seen_pnums = set()
+    for rows in parsed:
+        for p in rows:
+            if plan.dedup:
+                if p.pnum in seen_pnums:
+                    continue
+                seen_pnums.add(p.pnum)
+            matches.append(p)
+
+    if plan.match_type:
+        matches = [m.with_match_type(plan.match_type) for m in matches]
+    return matches
+
+
+def _build_results_map(plans, rows_by_key):
+    """
+    Merges each plan's search results into a map keyed by 'raw'. Players are
+    immutable, so several query lines can safely share one fetched search.
+    """
+    results_map = {}
+    for plan in plans:
+        parsed = [rows_by_key[search_key(*search)] for search in plan.searches]
+        results_map[plan.raw] = _merge_plan(plan, parsed)
+    return results_map
+
+
+@profiled('get_player_grading')
+def get_player_grading(queries, max_in_flight=MAX_IN_FLIGHT, cache=None, need_live=True, sessions=None,
+                       planner=False, max_requests_per_query=None, stats=None, mirror=None, fresh=False):
     """
     Main API function. Fetches grading for a list of query dicts.
 
@@ -402,117 +1148,353 @@ def get_player_grading(queries):
     Optionally:
         'pnum'     : str  — player number for direct lookup
 
-    Returns a dict mapping 'raw' -> list of player dicts.
-    Each player dict includes a 'match_type' key: 'pnum' or 'name'.
+    All backend searches for the batch are dispatched together, with at most
+    max_in_flight requests outstanding at once (1 = strictly sequential).
+
+    cache     : optional grading_cache-style object (get/put by search_key) consulted
+                before the network. If every search hits, no session is opened.
+    need_live : False lets the cache serve entries that are only fresh enough
+                for published grades.
+    sessions  : optional SessionManager to reuse the session and CSRF token across
+                calls. Without one, a fresh session is bootstrapped for this call.
+    planner   : True minimises requests for multi-word names. The most likely
+                permutation is searched first (in one wave for the whole batch);
+                the others are only searched if it did not return a single exact
+                full-name match, and then at most max_requests_per_query in total.
+    stats     : optional dict, filled with 'requests' (backend searches sent),
+                'cache_hits', 'mirror_hits', 'requests_saved' (permutations
+                the planner skipped) and 'suggested' (lines given fuzzy matches).
+    mirror    : optional roster_mirror.RosterMirror, consulted before the cache.
+                Searches it cannot answer go to the network, and the results
+                are written back into it. Name queries that still find nobody
+                are given the mirror's closest spellings, tagged match_type 'fuzzy'.
+    fresh     : True skips the mirror and cache lookups so every search is sent
+                to the backend (results are still stored in both).
+
+    Returns a dict mapping 'raw' -> list of Player records (or the
+    [{'invalid_query': True}] marker for queries too short to search).
+    Name and PNUM results carry match_type 'name' or 'pnum'.
     """
-    session, csrf_token = get_session_and_token()
-    if not session or not csrf_token:
-        logger.error("Failed to initialise session.")
+    start = time.perf_counter()
+    load_club_data()
+    plans = [_plan_query(query, planner=planner) for query in queries]
+    QUERY_LINES.inc(len(plans))
+
+    counts = {'requests': 0, 'cache_hits': 0, 'mirror_hits': 0, 'requests_saved': 0, 'suggested': 0}
+    rows_by_key = {}
+    lookups = [] if fresh else [
+        (layer, store, counter)
+        for layer, store, counter in (('mirror', mirror, 'mirror_hits'), ('cache', cache, 'cache_hits'))
+        if store is not None
+    ]
+
+    def fetch_all(wave):
+        nonlocal sessions
+        # Identical searches from different lines are only fetched once
+        pending = {k: s for k, s in _pending_searches(wave).items() if k not in rows_by_key}
+        for layer, store, counter in lookups:
+            for key in list(pending):
+                rows = store.get(key, need_live)
+                LOOKUPS.inc(layer=layer, result='miss' if rows is None else 'hit')
+                if rows is not None:
+                    rows_by_key[key] = rows
+                    del pending[key]
+                    counts[counter] += 1
+
+        if pending:
+            if sessions is None:
+                sessions = SessionManager()
+            session, csrf_token = sessions.get()
+            if not session or not csrf_token:
+                logger.error("Failed to initialise session.")
+                return False
+            counts['requests'] += len(pending)
+            fetched = _run_searches(sessions, pending, max_in_flight, cache)
+            if mirror is not None:
+                for key, rows in fetched.items():
+                    mirror.put(key, rows)
+            rows_by_key.update(fetched)
+        return True
+
+    if planner:
+        first_wave = [p._replace(searches=p.searches[:1]) if p.staged else p for p in plans]
+        if not fetch_all(first_wave):
+            BATCH_SECONDS.observe(time.perf_counter() - start, outcome='failed')
+            return {}
+        settled = []
+        for plan in plans:
+            if plan.staged:
+                first_rows = rows_by_key[search_key(*plan.searches[0])]
+                plan, saved = _settle_staged_plan(plan, first_rows, max_requests_per_query)
+                counts['requests_saved'] += saved
+            settled.append(plan)
+        plans = settled
+
+    if not fetch_all(plans):
+        BATCH_SECONDS.observe(time.perf_counter() - start, outcome='failed')
         return {}
 
-    load_club_data()
-    results_map = {}
+    results_map = _build_results_map(plans, rows_by_key)
+    if mirror is not None:
+        for plan in plans:
+            if plan.match_type == 'name' and not results_map[plan.raw]:
+                suggestions = mirror.suggest(plan.name, club=plan.searches[0][2])
+                results_map[plan.raw] = [p.with_match_type('fuzzy') for p in suggestions]
+                counts['suggested'] += bool(suggestions)
+
+    BATCH_SECONDS.observe(time.perf_counter() - start, outcome='ok')
+    if plans:
+        REQUESTS_PER_LINE.observe(counts['requests'] / len(plans))
+    if stats is not None:
+        stats.update(counts)
+    return results_map
 
-    for query in queries:
-        raw_key = query['raw']
-        name_part = query['name']
-        club_raw = query.get('club', '')
-        is_single = query.get('is_single', False)
-
-        matches = []
-        is_invalid = False
-
-        if query.get('pnum'):
-            # PNUM search: backend does a direct lookup by player number
-            html = search_player(session, csrf_token, forename="", surname="", club="", pnum=query['pnum'])
-            matches = parse_results(html)
-            for m in matches:
-                m['match_type'] = 'pnum'
-
-        else:
-            # Resolve club code from the explicit club part
-            club_code = ""
-            if club_raw:
-                club_code = get_club_code(club_raw)
-
-            # Implicit club code: single 2-char token with no explicit club (e.g. "ST")
-            if not club_code and is_single and len(name_part) == 2:
-                resolved = get_club_code(name_part)
-                if resolved:
-                    club_code = resolved
-                    name_part = ""
-
-            if name_part and len(name_part) < 3:
-                is_invalid = True
-            else:
-                if not name_part and club_code:
-                    # Club-only search
-                    html = search_player(session, csrf_token, forename="", surname="", club=club_code)
-                    matches = parse_results(html)
-
-                elif name_part:
-                    if is_single:
-                        # Ambiguous single token: try as forename and as surname, merge results
-                        html_1 = search_player(session, csrf_token, forename=name_part, surname="", club=club_code)
-                        res_1 = parse_results(html_1)
-                        html_2 = search_player(session, csrf_token, forename="", surname=name_part, club=club_code)
-                        res_2 = parse_results(html_2)
-
-                        seen_pnums = set()
-                        for p in res_1 + res_2:
-                            if p['pnum'] not in seen_pnums:
-                                matches.append(p)
-                                seen_pnums.add(p['pnum'])
-                    else:
-                        # Multi-word: try each word as surname with the rest as forename.
-                        # This catches both "John Smith" and "Smith John" style entries.
-                        words = name_part.strip().split()
-                        seen_pnums = set()
-                        for i in range(len(words)):
-                            surname = words[i]
-                            forename = " ".join(words[:i] + words[i+1:])
-                            html_response = search_player(session, csrf_token, forename, surname, club=club_code)
-                            for p in parse_results(html_response):
-                                if p['pnum'] not in seen_pnums:
-                                    matches.append(p)
-                                    seen_pnums.add(p['pnum'])
-
-                    for m in matches:
-                        m['match_type'] = 'name'
-
-        if is_invalid:
-            matches = [{'invalid_query': True}]
-
-        results_map[raw_key] = matches
 
-    return results_map
+def iter_player_grading(queries, max_in_flight=MAX_IN_FLIGHT, sessions=None, **kwargs):
+    """
+    Streaming counterpart of get_player_grading for long lists: each query is
+    looked up on its own, up to max_in_flight at once, and (index, raw, matches)
+    is yielded as soon as it completes — in completion order, not input order.
+    matches is None if the lookup failed (no session could be opened).
+
+    All lookups share one SessionManager (sessions, or a new one) along with
+    RATE_LIMITER and the in-flight deduplication. kwargs go to get_player_grading
+    (cache, mirror, need_live, planner, max_requests_per_query, fresh).
+    """
+    if sessions is None:
+        sessions = SessionManager()
 
+    def lookup(index):
+        query = queries[index]
+        results = get_player_grading([query], max_in_flight=1, sessions=sessions, **kwargs)
+        return index, query['raw'], results.get(query['raw']) if results else None
+
+    pool = ThreadPoolExecutor(max_workers=max(1, max_in_flight))
+    try:
+        for future in as_completed([pool.submit(lookup, i) for i in range(len(queries))]):
+            yield future.result()
+    finally:
+        # Closing the generator early abandons the lookups not yet started
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# --- Async API ---
+
+def _html_from_body(body):
+    """
+    Extracts the results HTML from a handle-form response body (JSON or raw
+    HTML). Raises StaleTokenError if the JSON error says the token was rejected.
+    """
+    try:
+        data = json.loads(body)
+    except json.JSONDecodeError:
+        return body
+    if isinstance(data, dict) and 'html' in data:
+        return data['html']
+    elif isinstance(data, str):
+        return data
+    elif isinstance(data, dict) and STALE_TOKEN_ERROR.search(str(data.get('error', ''))):
+        raise StaleTokenError(f"CSRF token rejected: {data['error']}")
+    return None
 
-if __name__ == "__main__":
-    print("--- Chess Scotland Grading Lookup ---")
 
+def _require_aiohttp():
+    if aiohttp is None:
+        raise ImportError("The async API requires aiohttp: pip install aiohttp")
+
+
+def new_async_session():
+    """Creates an aiohttp.ClientSession with the same headers and timeout as the sync client."""
+    _require_aiohttp()
+    return aiohttp.ClientSession(
+        headers={'User-Agent': USER_AGENT, 'Referer': BASE_URL},
+        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+    )
+
+
+async def get_csrf_token_async(http):
+    """
+    Async counterpart of get_session_and_token: loads the grading page on an
+    existing aiohttp session (which keeps the cookies) and returns the CSRF token.
+    """
+    try:
+        async with http.get(BASE_URL) as response:
+            response.raise_for_status()
+            page_html = await response.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error("Error connecting to main page: %s", e)
+        return None
+
+    # Parsing the whole grading page is CPU-bound; keep it off the event loop
+    return await asyncio.to_thread(_extract_csrf_token, page_html)
+
+
+async def _post_search_async(http, csrf_token, forename, surname, club="", pnum=""):
+    """
+    Async counterpart of _post_search: sends the multipart handle-form request
+    and returns the results HTML. Raises StaleTokenError if the token was
+    rejected, or aiohttp.ClientError / asyncio.TimeoutError on any other failure.
+    """
+    form = aiohttp.MultipartWriter('form-data')
+    for name, value in _search_fields(csrf_token, forename, surname, club, pnum):
+        part = form.append(value)
+        part.set_content_disposition('form-data', name=name)
+
+    start = time.perf_counter()
+    status = 'error'
+    try:
+        async with http.post(API_URL, headers=XHR_HEADERS, data=form) as response:
+            status = response.status
+            if status in STALE_TOKEN_STATUSES:
+                raise StaleTokenError(f"CSRF token rejected (HTTP {status})")
+            response.raise_for_status()
+            body = await response.text()
+    finally:
+        SEARCH_SECONDS.observe(time.perf_counter() - start, status=status)
+    RESPONSE_BYTES.inc(len(body.encode('utf-8')), endpoint='handle-form')
+    return _html_from_body(body)
+
+
+async def _send_search_async(http, csrf_token, forename, surname, club="", pnum=""):
+    """
+    Async counterpart of _send_search: _post_search_async under the same
+    process-wide RATE_LIMITER and RETRY_POLICY as the sync client.
+    """
+    retry = 0
     while True:
-        try:
-            raw_input = input("\nEnter names (comma separated) or 'q' to quit > ").strip()
-        except EOFError:
-            break
+        status = retry_after = None
+        async with RATE_LIMITER.slot_async() as outcome:
+            try:
+                return await _post_search_async(http, csrf_token, forename, surname, club=club, pnum=pnum)
+            except aiohttp.ClientResponseError as e:
+                status = e.status
+                if status not in RETRY_POLICY.statuses:
+                    raise
+                outcome.ok = False
+                retry_after = e.headers.get('Retry-After') if e.headers else None
+                error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                outcome.ok = False
+                error = e
+
+        retry += 1
+        if retry >= RETRY_POLICY.attempts:
+            raise error
+        SEARCH_RETRIES.inc(reason=status or type(error).__name__)
+        delay = RETRY_POLICY.delay(retry - 1, retry_after)
+        if status == 429:
+            RATE_LIMITER.pause(delay)
+        logger.warning("Search request failed (%s); retry %d in %.1fs.", error, retry, delay)
+        await asyncio.sleep(delay)
+
+
+async def search_player_async(http, csrf_token, forename, surname, club="", pnum=""):
+    """
+    Async counterpart of search_player: sends the multipart handle-form request
+    through RATE_LIMITER, retrying transient failures. Returns the results
+    HTML, or None on failure. Requests go straight to aiohttp, not through
+    TRANSPORT, so they are never recorded or replayed.
+    """
+    _require_aiohttp()
+    try:
+        return await _send_search_async(http, csrf_token, forename, surname, club=club, pnum=pnum)
+    except (aiohttp.ClientError, asyncio.TimeoutError, StaleTokenError) as e:
+        logger.error("Search request failed: %s", e)
+        return None
 
-        if raw_input.lower() in ['q', 'quit', 'exit']:
-            break
-        if not raw_input:
-            continue
 
-        names = [n.strip() for n in raw_input.split(',') if n.strip()]
-        queries = [
-            {
-                'raw': n,
-                'name': n,
-                'club': '',
-                'is_single': len(n.split()) == 1,
-            }
-            for n in names
-        ]
+# (aiohttp session, search_key) -> Task, so concurrent lookups on one session
+# share requests. Joiners only ever depend on a session they hold themselves.
+_ASYNC_IN_FLIGHT = {}
 
-        print(f"Searching for: {names}...")
-        results = get_player_grading(queries)
-        print(json.dumps(results, indent=2))
+
+async def _join_in_flight_async(http, key, make_coro):
+    """Awaits the in-flight task for key on this session, starting one if there is none."""
+    flight_key = (http, key)
+    task = _ASYNC_IN_FLIGHT.get(flight_key)
+    if task is None:
+        task = asyncio.ensure_future(make_coro())
+        _ASYNC_IN_FLIGHT[flight_key] = task
+        task.add_done_callback(lambda _: _ASYNC_IN_FLIGHT.pop(flight_key, None))
+    # shield: one caller being cancelled must not cancel the shared request
+    return await asyncio.shield(task)
+
+
+async def get_player_grading_async(queries, max_in_flight=MAX_IN_FLIGHT, http=None, semaphore=None):
+    """
+    Async counterpart of get_player_grading, returning the same raw -> [Player] map.
+
+    http      : optional aiohttp.ClientSession to reuse; one is created (and closed) if omitted.
+                Concurrent calls passing the same session share identical searches.
+    semaphore : optional asyncio.Semaphore bounding in-flight requests. Pass one
+                semaphore to many concurrent calls to share a single limit across
+                them; otherwise each call gets its own limit of max_in_flight.
+
+    Searches also go through the process-wide RATE_LIMITER and RETRY_POLICY, and
+    a rejected CSRF token is refreshed once and the search retried. They do not
+    go through TRANSPORT.
+    """
+    _require_aiohttp()
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max(1, max_in_flight))
+
+    owns_http = http is None
+    if owns_http:
+        http = new_async_session()
+
+    try:
+        async with semaphore:
+            tokens = [await get_csrf_token_async(http)]
+        if not tokens[0]:
+            logger.error("Failed to initialise session.")
+            return {}
+        refreshing = asyncio.Lock()
+
+        async def refresh(stale_token):
+            # Only the first search to see the stale token fetches a new one
+            async with refreshing:
+                if tokens[0] == stale_token:
+                    tokens[0] = await get_csrf_token_async(http)
+                return tokens[0]
+
+        load_club_data()
+        plans = [_plan_query(query) for query in queries]
+
+        async def search(forename, surname, club, pnum):
+            csrf_token = tokens[0]
+            try:
+                return await _send_search_async(http, csrf_token, forename, surname, club=club, pnum=pnum)
+            except StaleTokenError as e:
+                logger.warning("%s; refreshing token and retrying.", e)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error("Search request failed: %s", e)
+                return None
+            csrf_token = await refresh(csrf_token)
+            if not csrf_token:
+                return None
+            return await search_player_async(http, csrf_token, forename, surname, club=club, pnum=pnum)
+
+        async def fetch(search_fields):
+            forename, surname, club, pnum = search_fields
+            async with semaphore:
+                html = await search(forename, surname, club, pnum)
+            if not html:
+                return []
+            return await asyncio.to_thread(parse_results, html)
+
+        pending = _pending_searches(plans)
+        fetched = await asyncio.gather(
+            *(_join_in_flight_async(http, key, lambda s=fields: fetch(s)) for key, fields in pending.items())
+        )
+        rows_by_key = dict(zip(pending, fetched))
+    finally:
+        if owns_http:
+            await http.close()
+
+    return _build_results_map(plans, rows_by_key)
+
+
+if __name__ == "__main__":
+    # `python chess_grading.py lines.txt` runs the batch command in batch_lookup.py
+    import batch_lookup
+    sys.exit(batch_lookup.main())
@@ -0,0 +1,329 @@
+"""
+Local stand-in for the Chess Scotland grading site, for end-to-end and load
+testing without touching production.
+
+It serves:
+    GET  /grading      — a page carrying a fresh _csrf_token hidden input
+    POST /handle-form  — action=search_players over a seeded synthetic
+                         federation, answering {"html": "<table>...</table>"}
+                         in the site's markup
+
+Searches match like the real form: PNUM exactly, club by code, and
+forename/surname as case-insensitive substrings. Latency and failures are
+tunable, so retries, rate limiting and token refresh can all be exercised.
+
+Start it, then point the client at it:
+    python fake_server.py --port 8765 --latency lognormal:0.15,0.5 --error-rate 0.02
+    CHESS_GRADING_SITE_URL=http://127.0.0.1:8765 streamlit run app.py
+"""
+
+import argparse
+import email.parser
+import email.policy
+import html
+import json
+import logging
+import random
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+import chess_grading
+from chess_grading import GRADE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+FORENAMES = [
+    "Nathanael", "Anna", "Robert", "Iain", "Fiona", "Calum", "Eilidh", "Hamish", "Morag", "Alasdair",
+    "Kirsty", "Ewan", "Catriona", "Lachlan", "Isla", "Ruaridh", "Mhairi", "Angus", "Skye", "Fraser",
+    "David", "John", "James", "Andrew", "Sarah", "Emma", "Michael", "Peter", "Karen", "Graham",
+    "Stuart", "Craig", "Gordon", "Alan", "Kenneth", "Douglas", "Moira", "Shona", "Rory", "Finlay",
+]
+SURNAMES = [
+    "Loch", "Smith", "Brown", "MacDonald", "Campbell", "Stewart", "Robertson", "Thomson", "Anderson",
+    "Scott", "O'Neill", "Fraser-Grant", "McLeod", "Murray", "Paterson", "Ross", "Young", "Watson",
+    "Mitchell", "Morrison", "Reid", "Clark", "Taylor", "Walker", "Wilson", "Kerr", "Hamilton", "Graham",
+    "Johnston", "Gray", "Ferguson", "Hunter", "Henderson", "Kennedy", "McKenzie", "Cameron", "Duncan",
+    "Sinclair", "Forbes", "Munro",
+]
+STATUSES = ["A", "A", "A", "A", "NEW", "J?", "J10", "J12", "J14", "J16"]
+
+# Issued tokens stop being accepted after this many seconds
+TOKEN_TTL = 30 * 60
+
+
+def build_federation(players=20000, seed=0):
+    """A deterministic list of player dicts spread over every club in club_names.txt."""
+    rng = random.Random(seed)
+    chess_grading.load_club_data()
+    codes = sorted({v['code'] for v in chess_grading.CLUB_DATA.values()}) or ["ST"]
+    federation = []
+    for n in range(players):
+        club = rng.choice(codes)
+        if rng.random() < 0.05:
+            club += ", " + rng.choice(codes)
+        grades = {}
+        for column in GRADE_COLUMNS:
+            grades[column] = "" if rng.random() < 0.35 else str(rng.randint(600, 2400))
+        federation.append(dict(
+            pnum=str(100000 + n),
+            name=f"{rng.choice(SURNAMES)}, {rng.choice(FORENAMES)}",
+            club=club,
+            status=rng.choice(STATUSES),
+            **grades,
+        ))
+    return federation
+
+
+def parse_latency(spec):
+    """
+    Turns a latency spec into a function returning seconds:
+        "0.1" or "fixed:0.1"       — always 0.1 s
+        "uniform:0.05-0.3"         — uniformly between the bounds
+        "lognormal:0.15,0.5"       — log-normal with median 0.15 s and sigma 0.5
+    """
+    kind, _, args = spec.partition(':') if ':' in spec else ('fixed', '', spec)
+    if kind == 'fixed':
+        seconds = float(args or 0)
+        return lambda rng: seconds
+    if kind == 'uniform':
+        low, high = (float(x) for x in args.split('-'))
+        return lambda rng: rng.uniform(low, high)
+    if kind == 'lognormal':
+        median, sigma = (float(x) for x in args.split(','))
+        return lambda rng: median * rng.lognormvariate(0, sigma)
+    raise ValueError(f"Unknown latency distribution {kind!r} (expected fixed, uniform or lognormal)")
+
+
+def _parse_form(content_type, body):
+    """Reads multipart/form-data or urlencoded fields into a dict."""
+    if content_type.startswith('multipart/form-data'):
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            b"Content-Type: " + content_type.encode('latin-1') + b"\r\n\r\n" + body
+        )
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name:
+                fields[name] = part.get_payload(decode=True).decode('utf-8')
+        return fields
+    return dict(parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+
+
+def _grade_cell(column, value):
+    return f'<td data-column="{column}">{html.escape(value) if value else "&mdash;"}</td>'
+
+
+def render_results(rows):
+    """The results table in the markup handle-form returns."""
+    if not rows:
+        return '<p class="no-results">No players found.</p>'
+    out = ['<table class="table table-striped"><thead><tr><th>PNUM</th><th>Name</th><th>Club</th><th>Status</th>'
+           + ''.join(f'<th>{column}</th>' for column in GRADE_COLUMNS) + '</tr></thead><tbody>']
+    for row in rows:
+        out.append(
+            '<tr>'
+            f'<td data-column="pnum">{row["pnum"]}</td>'
+            f'<td data-column="name"><a href="/player/{row["pnum"]}">{html.escape(row["name"])}</a></td>'
+            f'<td>{html.escape(row["club"])}</td>'
+            f'<td data-column="status">{html.escape(row["status"])}</td>'
+            + ''.join(_grade_cell(column, row[column]) for column in GRADE_COLUMNS)
+            + '</tr>'
+        )
+    out.append('</tbody></table>')
+    return ''.join(out)
+
+
+class FakeChessScotland:
+    """
+    The fake site's state: federation, issued tokens, fault settings and counters.
+
+    latency      : spec for parse_latency, applied to every handle-form request
+    error_rate   : probability (0-1) that a search fails with one of error_statuses
+                   (429s carry Retry-After: 1)
+    token_ttl    : seconds an issued CSRF token stays valid; older ones get HTTP 419
+    """
+
+    def __init__(self, players=20000, seed=0, latency="fixed:0", error_rate=0.0,
+                 error_statuses=(500, 502, 503, 429), token_ttl=TOKEN_TTL):
+        self.federation = build_federation(players, seed)
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.token_ttl = token_ttl
+        self.stats = {'pages': 0, 'searches': 0, 'errors': 0, 'token_rejections': 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = {}
+
+        self._by_pnum = {row['pnum']: row for row in self.federation}
+        self._by_club = {}
+        self._names = []
+        for row in self.federation:
+            for code in (c.strip() for c in row['club'].split(',')):
+                self._by_club.setdefault(code, []).append(row)
+            surname, _, forename = row['name'].lower().partition(',')
+            self._names.append((forename.strip(), surname.strip(), row))
+        self._server = None
+
+    # --- behaviour ---
+
+    def issue_token(self):
+        token = secrets.token_hex(16)
+        with self._lock:
+            self._tokens[token] = time.monotonic()
+            self.stats['pages'] += 1
+        return token
+
+    def token_valid(self, token):
+        with self._lock:
+            issued = self._tokens.get(token)
+        return issued is not None and time.monotonic() - issued <= self.token_ttl
+
+    def search(self, forename="", surname="", club="", pnum=""):
+        """Matching rows for one search_players request."""
+        forename, surname = forename.strip().lower(), surname.strip().lower()
+        club, pnum = club.strip().upper(), pnum.strip()
+        if pnum:
+            row = self._by_pnum.get(pnum)
+            return [row] if row and (not club or club in row['club']) else []
+        if not forename and not surname:
+            return list(self._by_club.get(club, [])) if club else []
+        return [
+            row for f, s, row in self._names
+            if forename in f and surname in s and (not club or club in row['club'])
+        ]
+
+    def _draw(self):
+        """Picks this request's (delay, injected error status or None)."""
+        with self._lock:
+            delay = self.latency(self._rng)
+            status = self._rng.choice(self.error_statuses) if self._rng.random() < self.error_rate else None
+        return delay, status
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    # --- server lifecycle ---
+
+    def start(self, host="127.0.0.1", port=0):
+        """Serves on a background thread (port 0 picks a free port). Returns the base URL."""
+        site = self
+
+        class Handler(_Handler):
+            fake = site
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.1}, daemon=True).start()
+        return self.url
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real site
+    fake = None
+
+    def log_message(self, fmt, *args):
+        logger.debug("%s - %s", self.address_string(), fmt % args)
+
+    def _send(self, status, body, content_type, headers=None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status, payload, headers=None):
+        self._send(status, json.dumps(payload), 'application/json', headers)
+
+    def do_GET(self):
+        if self.path.split('?')[0].rstrip('/') != '/grading':
+            self._send(404, 'Not found', 'text/plain')
+            return
+        token = self.fake.issue_token()
+        self._send(200, (
+            '<!doctype html><html><body><form id="grading-search">'
+            f'<input type="hidden" name="_csrf_token" value="{token}">'
+            '</form></body></html>'
+        ), 'text/html; charset=UTF-8')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        if self.path.split('?')[0].rstrip('/') != '/handle-form':
+            self._send(404, 'Not found', 'text/plain')
+            return
+
+        delay, error = self.fake._draw()
+        if delay > 0:
+            time.sleep(delay)
+        if error is not None:
+            self.fake._count('errors')
+            headers = {'Retry-After': '1'} if error == 429 else None
+            self._send_json(error, {'error': 'Injected failure'}, headers)
+            return
+
+        fields = _parse_form(self.headers.get('Content-Type', ''), body)
+        if not self.fake.token_valid(fields.get('_csrf_token', '')):
+            self.fake._count('token_rejections')
+            self._send_json(419, {'error': 'Invalid CSRF token'})
+            return
+        if fields.get('action') != 'search_players':
+            self._send_json(400, {'error': 'Unknown action'})
+            return
+
+        self.fake._count('searches')
+        rows = self.fake.search(
+            fields.get('forename', ''), fields.get('surname', ''), fields.get('club', ''), fields.get('pnum', ''),
+        )
+        self._send_json(200, {'html': render_results(rows)})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local fake of the Chess Scotland grading site.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--players', type=int, default=20000, help="Size of the synthetic federation.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', default="fixed:0",
+                        help="fixed:S, uniform:LOW-HIGH or lognormal:MEDIAN,SIGMA (seconds).")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of searches that fail (0-1).")
+    parser.add_argument('--error-statuses', default="500,502,503,429", help="Statuses to inject, comma-separated.")
+    parser.add_argument('--token-ttl', type=float, default=TOKEN_TTL, help="Seconds a CSRF token stays valid.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    fake = FakeChessScotland(
+        players=args.players, seed=args.seed, latency=args.latency, error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.error_statuses.split(',') if s.strip()], token_ttl=args.token_ttl,
+    )
+    url = fake.start(args.host, args.port)
+    logger.info("Fake Chess Scotland serving %d players at %s", len(fake.federation), url)
+    logger.info("Point the client at it with CHESS_GRADING_SITE_URL=%s", url)
+    try:
+        while True:
+            time.sleep(60)
+            logger.info("Stats: %s", fake.stats)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
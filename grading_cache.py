@@ -0,0 +1,187 @@
+"""
+Caches of parsed handle-form search results, keyed by chess_grading.search_key().
+
+Every cache implements the same two methods used by get_player_grading:
+    get(key, need_live=True) -> list of Player records, or None on a miss
+    put(key, rows)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from chess_grading import Player
+
+logger = logging.getLogger(__name__)
+
+_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.environ.get(
+    'CHESS_GRADING_CACHE_DB', os.path.join(_DIR, 'lookup_cache.sqlite3')
+)
+
+# Published grades are re-issued monthly; live grades move after every rated game.
+PUBLISHED_TTL = 30 * 24 * 3600
+LIVE_TTL = 24 * 3600
+
+
+def _as_player(row):
+    return row if isinstance(row, Player) else Player.from_dict(row)
+
+
+def _encode_key(key):
+    return '\x1f'.join(key)
+
+
+class ResponseCache:
+    """
+    SQLite-backed (WAL mode) cache of parsed search results that survives restarts.
+
+    Entries are stored with their fetch time. A lookup that needs live grades
+    accepts entries up to live_ttl old; one that only needs published grades
+    accepts entries up to published_ttl old.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, published_ttl=PUBLISHED_TTL, live_ttl=LIVE_TTL):
+        self.path = path
+        self.published_ttl = published_ttl
+        self.live_ttl = live_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS searches ("
+            " key TEXT PRIMARY KEY,"
+            " rows TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL)"
+        )
+
+    def get(self, key, need_live=True):
+        """Returns the cached rows for key if fresh enough, else None."""
+        entry = self.get_entry(key, need_live)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, key, need_live=True):
+        """Like get, but returns (rows, fetched_at) so callers can keep the fetch time."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT rows, fetched_at FROM searches WHERE key = ?", (_encode_key(key),)
+            ).fetchone()
+        if row is None:
+            return None
+        rows_json, fetched_at = row
+        ttl = self.live_ttl if need_live else self.published_ttl
+        if time.time() - fetched_at > ttl:
+            return None
+        return [Player.from_dict(r) for r in json.loads(rows_json)], fetched_at
+
+    def put(self, key, rows):
+        """Stores rows (Players or player dicts) for key, replacing any previous entry."""
+        rows_json = json.dumps([dict(r) for r in rows], separators=(',', ':'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches (key, rows, fetched_at) VALUES (?, ?, ?)",
+                (_encode_key(key), rows_json, time.time()),
+            )
+
+    def purge(self):
+        """Deletes entries too old to satisfy any lookup. Returns the number removed."""
+        cutoff = time.time() - max(self.published_ttl, self.live_ttl)
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM searches WHERE fetched_at < ?", (cutoff,))
+        return cur.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM searches")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LookupCache:
+    """
+    Thread-safe in-memory LRU cache of search results, meant to be shared by
+    every session in the process. Entries are evicted when there are more than
+    max_entries or once they are older than max_age seconds.
+
+    Like ResponseCache, each entry keeps the time its rows were fetched, and a
+    lookup that needs live grades only accepts entries up to live_ttl old
+    (published_ttl otherwise), however recently they were stored here.
+
+    If backing is given (e.g. a ResponseCache), misses fall through to its
+    get_entry() and puts are written through to it. Rows promoted from the
+    backing keep their original fetch time.
+
+    hits / misses count lookups answered from memory or not.
+    """
+
+    def __init__(self, max_entries=5000, max_age=3600, backing=None,
+                 published_ttl=PUBLISHED_TTL, live_ttl=LIVE_TTL):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.backing = backing
+        self.published_ttl = published_ttl
+        self.live_ttl = live_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (stored_at, fetched_at, rows)
+
+    def get(self, key, need_live=True):
+        now = time.monotonic()
+        ttl = self.live_ttl if need_live else self.published_ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] > self.max_age:
+                del self._entries[key]
+                entry = None
+            # Kept, but too old for this lookup: a live one may follow a published one
+            if entry is not None and time.time() - entry[1] <= ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[2])
+            self.misses += 1
+
+        if self.backing is None:
+            return None
+        entry = self.backing.get_entry(key, need_live)
+        if entry is None:
+            return None
+        rows, fetched_at = entry
+        self._store(key, rows, fetched_at)
+        return rows
+
+    def put(self, key, rows):
+        self._store(key, rows, time.time())
+        if self.backing is not None:
+            self.backing.put(key, rows)
+
+    def _store(self, key, rows, fetched_at):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), fetched_at, [_as_player(r) for r in rows])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Returns a snapshot of the hit/miss counters and current size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,250 @@
+"""
+Headless JSON lookup server, for tournament software and bots that want
+grades without a Streamlit session each.
+
+    python grading_server.py --port 8080 --workers 16
+
+Endpoints (all answer JSON):
+    GET  /lookup?q=Nathanael+Loch&q=[12345]   one query line per q, app syntax
+    POST /lookup     {"text": "st:\\nNathanael Loch"} or {"lines": ["...", ...]}
+    GET  /player/<pnum>                        one player by PNUM
+    GET  /club/<code or name>                  a club's whole roster
+    GET  /health                               liveness and cache statistics
+    GET  /metrics                              Prometheus metrics (metrics.py)
+
+Lookup answers are {"results": [record, ...]} with the records batch_lookup
+writes (index, query, status, matches). Add live=0 when only published
+grades are needed, so older cached entries will do.
+
+Every request shares one SessionManager, one in-memory LookupCache (in front
+of the on-disk ResponseCache) and, if it has been synced, the roster mirror.
+Identical lookups arriving together are answered by one get_player_grading
+call, and identical searches within them by one handle-form request.
+Connections are kept alive (HTTP/1.1) and served by a fixed pool of worker
+threads, so a burst of clients queues instead of spawning a thread each.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import metrics
+from batch_lookup import to_record
+from chess_grading import SessionManager, SingleFlight, get_player_grading, parse_queries
+from grading_cache import LookupCache, ResponseCache
+from roster_mirror import DEFAULT_MIRROR_PATH, RosterMirror
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 16
+# Query lines accepted in one lookup request
+MAX_LINES = 200
+# Largest request body read, in bytes
+MAX_BODY = 256 * 1024
+# Idle keep-alive connections are closed after this many seconds, freeing their worker
+IDLE_TIMEOUT = 15
+
+
+class RequestError(Exception):
+    """Raised with an HTTP status for requests that cannot be answered."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _wants_live(value):
+    """The live option from a query string or JSON body: off for 0 / false / no, else on."""
+    return str(value).strip().lower() not in ('0', 'false', 'no')
+
+
+class GradingService:
+    """
+    The lookups behind the HTTP endpoints, holding the state every request shares.
+    Usable on its own (e.g. from a bot running in the same process).
+    """
+
+    def __init__(self, cache=None, sessions=None, mirror=None):
+        self.cache = cache if cache is not None else LookupCache(backing=ResponseCache())
+        self.sessions = sessions or SessionManager()
+        self.mirror = mirror
+        self._flights = SingleFlight()
+
+    def lookup_queries(self, queries, need_live=True):
+        """Looks up parsed query dicts. Returns their records, in input order."""
+        if not queries:
+            raise RequestError(400, "No searches given")
+        if len(queries) > MAX_LINES:
+            raise RequestError(413, f"At most {MAX_LINES} lines per request")
+
+        key = (need_live,) + tuple((q['raw'], q['name'], q['club'], q.get('pnum', '')) for q in queries)
+        results = self._flights.do(key, lambda: get_player_grading(
+            queries, cache=self.cache, sessions=self.sessions, mirror=self.mirror, need_live=need_live,
+        ))
+        if not results:
+            raise RequestError(502, "Could not reach Chess Scotland")
+        return [to_record(index, q['raw'], results.get(q['raw'], [])) for index, q in enumerate(queries)]
+
+    def lookup_text(self, text, need_live=True):
+        """Looks up lines in the app's syntax (see parse_queries)."""
+        return self.lookup_queries(parse_queries(text)[0], need_live)
+
+    def player(self, pnum, need_live=True):
+        if not pnum.isdigit():
+            raise RequestError(400, "PNUM must be a number")
+        query = {'raw': f"[{pnum}]", 'pnum': pnum, 'name': '', 'club': '', 'is_single': False}
+        return self.lookup_queries([query], need_live)[0]
+
+    def club(self, club, need_live=True):
+        query = {'raw': f"; {club}", 'name': '', 'club': club, 'is_single': False}
+        return self.lookup_queries([query], need_live)[0]
+
+    def health(self):
+        return {
+            'status': 'ok',
+            'cache': self.cache.stats() if hasattr(self.cache, 'stats') else None,
+            'mirror_players': len(self.mirror) if self.mirror is not None else None,
+        }
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer handling connections on a fixed-size thread pool."""
+
+    def __init__(self, address, handler, workers=DEFAULT_WORKERS):
+        super().__init__(address, handler)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='grading-server')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class GradingRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = IDLE_TIMEOUT
+    service = None
+
+    def log_message(self, fmt, *args):
+        logger.debug("%s - %s", self.address_string(), fmt % args)
+
+    def _send(self, status, text, content_type):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload, ensure_ascii=False), 'application/json; charset=utf-8')
+
+    def _dispatch(self, handler):
+        try:
+            status, payload = 200, handler()
+        except RequestError as e:
+            status, payload = e.status, {'error': str(e)}
+        except Exception:
+            logger.exception("Lookup failed")
+            status, payload = 500, {'error': "Internal error"}
+        self._send_json(status, payload)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        need_live = _wants_live(params.get('live', ['1'])[-1])
+        parts = [unquote(p) for p in url.path.strip('/').split('/')]
+        route = parts[0]
+
+        if route == 'lookup' and len(parts) == 1:
+            self._dispatch(lambda: {'results': self.service.lookup_text('\n'.join(params.get('q', [])), need_live)})
+        elif route == 'player' and len(parts) == 2:
+            self._dispatch(lambda: self.service.player(parts[1], need_live))
+        elif route == 'club' and len(parts) == 2:
+            self._dispatch(lambda: self.service.club(parts[1], need_live))
+        elif route == 'health' and len(parts) == 1:
+            self._dispatch(self.service.health)
+        elif route == 'metrics' and len(parts) == 1:
+            self._send(200, metrics.REGISTRY.render(), metrics.CONTENT_TYPE)
+        else:
+            self._send_json(404, {'error': "Not found"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # The body cannot be skipped without its length
+            self.close_connection = True
+            self._send_json(400, {'error': "Invalid Content-Length"})
+            return
+        if length > MAX_BODY:
+            self.close_connection = True
+            self._send_json(413, {'error': "Request body too large"})
+            return
+        body = self.rfile.read(length)
+        url = urlsplit(self.path)
+        if url.path.rstrip('/') != '/lookup':
+            self._send_json(404, {'error': "Not found"})
+            return
+        self._dispatch(lambda: self._post_lookup(body))
+
+    def _post_lookup(self, body):
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            raise RequestError(400, "Body must be JSON")
+        if not isinstance(data, dict):
+            raise RequestError(400, "Body must be a JSON object")
+        lines = data.get('lines')
+        text = '\n'.join(str(line) for line in lines) if isinstance(lines, list) else data.get('text', '')
+        return {'results': self.service.lookup_text(str(text), _wants_live(data.get('live', True)))}
+
+
+def make_server(host="127.0.0.1", port=8080, service=None, workers=DEFAULT_WORKERS):
+    """Builds (but does not start) a server for service; call serve_forever() on it."""
+    handler = type('Handler', (GradingRequestHandler,), {'service': service or GradingService()})
+    return PooledHTTPServer((host, port), handler, workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Chess Scotland grading lookups as JSON.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Connections served at once.")
+    parser.add_argument('--no-mirror', action='store_true', help="Do not use the roster mirror even if synced.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    mirror = None
+    if not args.no_mirror and os.path.exists(DEFAULT_MIRROR_PATH):
+        mirror = RosterMirror()
+    server = make_server(args.host, args.port, GradingService(mirror=mirror), args.workers)
+    logger.info("Serving grading lookups on http://%s:%d", *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
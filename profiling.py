@@ -0,0 +1,208 @@
+"""
+Opt-in CPU and memory profiling for lookups and app reruns.
+
+Off unless CHESS_GRADING_PROFILE is set to one of:
+    cpu      — cProfile: writes <label>-<timestamp>.prof (open with pstats or
+               snakeviz) and a <label>-<timestamp>-cpu.txt top-N summary
+    memory   — tracemalloc: writes <label>-<timestamp>-memory.txt with the
+               top-N allocation sites and the peak traced memory
+    all      — both (also "cpu,memory")
+
+Reports go to CHESS_GRADING_PROFILE_DIR (default: profiles/ next to this
+file). When the directory is configured, the app also honours a
+?profile=cpu|memory|all query parameter for a single rerun.
+
+Disabled, a profiled call costs one environment lookup.
+"""
+
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV = 'CHESS_GRADING_PROFILE'
+PROFILE_DIR_ENV = 'CHESS_GRADING_PROFILE_DIR'
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+# Functions / allocation sites listed in the text reports
+TOP_N = 30
+
+_MODES = {'cpu': {'cpu'}, '1': {'cpu'}, 'true': {'cpu'}, 'memory': {'memory'}, 'all': {'cpu', 'memory'}}
+
+# Only one profile runs per thread; profiling a lookup inside a profiled app
+# rerun just adds to the rerun's report
+_local = threading.local()
+
+# tracemalloc is process-wide, so memory profiles in different threads share
+# it: the first to start turns it on and the last to stop turns it off (unless
+# it was already tracing). Their peaks overlap.
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_owned = False
+
+
+def _acquire_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_owned = True
+        _tracing_users += 1
+        tracemalloc.reset_peak()
+
+
+def _release_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+
+
+def parse_mode(value):
+    """'cpu', 'memory', 'all' or 'cpu,memory' -> set of modes; empty set for off / unknown."""
+    modes = set()
+    for part in (value or '').lower().replace('+', ',').split(','):
+        modes |= _MODES.get(part.strip(), set())
+    return frozenset(modes)
+
+
+def env_mode(environ=None):
+    return parse_mode((os.environ if environ is None else environ).get(PROFILE_ENV))
+
+
+def profile_dir(environ=None):
+    return (os.environ if environ is None else environ).get(PROFILE_DIR_ENV) or DEFAULT_PROFILE_DIR
+
+
+class Profile:
+    """
+    One profiling run. start() begins collecting, stop() writes the reports
+    and returns their paths. A Profile whose modes are empty does nothing.
+    """
+
+    def __init__(self, label, modes, directory=None, top_n=TOP_N):
+        self.label = label
+        self.modes = frozenset(modes)
+        self.directory = directory or profile_dir()
+        self.top_n = top_n
+        self._cpu = None
+        self._running = False
+        self._tracing = False
+        self._snapshot = None
+        self.paths = []
+
+    def start(self):
+        if not self.modes:
+            return self
+        previous = _active()
+        if previous is not None:
+            # e.g. an app rerun interrupted by st.rerun() before it reached stop()
+            previous.stop()
+        _local.active = self
+        self._running = True
+        if 'memory' in self.modes:
+            _acquire_tracing()
+            self._tracing = True
+            self._snapshot = tracemalloc.take_snapshot()
+        if 'cpu' in self.modes:
+            cpu = cProfile.Profile()
+            try:
+                cpu.enable()
+            except ValueError:
+                # Python 3.12+ allows one active profiler per process
+                logger.warning("CPU profile of %s skipped: another profiler is running", self.label)
+            else:
+                self._cpu = cpu
+        return self
+
+    def stop(self):
+        """
+        Writes the reports. Failures are logged, never raised into the profiled
+        code. May be called from another thread, e.g. by the app for a rerun
+        that st.stop() ended before it reached its own stop().
+        """
+        if not self._running:
+            return self.paths
+        self._running = False
+        if getattr(_local, 'active', None) is self:
+            _local.active = None
+        if self._cpu is not None:
+            self._cpu.disable()
+        try:
+            self._write_reports()
+        except Exception:
+            logger.exception("Could not write the profile of %s", self.label)
+        finally:
+            if self._tracing:
+                self._tracing = False
+                _release_tracing()
+        return self.paths
+
+    def _write_reports(self):
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        base = os.path.join(self.directory, f"{self.label}-{stamp}")
+        os.makedirs(self.directory, exist_ok=True)
+
+        if self._cpu is not None:
+            self._cpu.dump_stats(base + '.prof')
+            summary = io.StringIO()
+            pstats.Stats(self._cpu, stream=summary).sort_stats('cumulative').print_stats(self.top_n)
+            with open(base + '-cpu.txt', 'w', encoding='utf-8') as f:
+                f.write(summary.getvalue())
+            self.paths += [base + '.prof', base + '-cpu.txt']
+
+        if self._snapshot is not None:
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            with open(base + '-memory.txt', 'w', encoding='utf-8') as f:
+                f.write(f"{self.label}: peak {peak / 1024:.1f} KiB, current {current / 1024:.1f} KiB traced\n")
+                f.write(f"Top {self.top_n} allocation sites by growth during the run:\n")
+                for stat in after.compare_to(self._snapshot, 'lineno')[:self.top_n]:
+                    f.write(f"  {stat}\n")
+            self.paths.append(base + '-memory.txt')
+
+        logger.info("Profile of %s written to %s", self.label, ", ".join(self.paths))
+
+
+def _active():
+    """The profile running in this thread, if any."""
+    active = getattr(_local, 'active', None)
+    return active if active is not None and active._running else None
+
+
+def start(label, modes=None, directory=None):
+    """Starts and returns a Profile (modes default to CHESS_GRADING_PROFILE)."""
+    return Profile(label, env_mode() if modes is None else modes, directory).start()
+
+
+@contextmanager
+def profile(label, modes=None, directory=None):
+    """Profiles the with-block; does nothing when profiling is off."""
+    run = start(label, modes, directory)
+    try:
+        yield run
+    finally:
+        run.stop()
+
+
+def profiled(label):
+    """Decorator profiling each call while CHESS_GRADING_PROFILE is set."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            modes = env_mode()
+            if not modes or _active() is not None:
+                return fn(*args, **kwargs)
+            with profile(label, modes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,265 @@
+"""
+The results stage of the app: flattens a raw -> [Player] results map into
+display rows, dedupes players found by several lines, builds the results
+DataFrame, the two copy-to-clipboard lists and the scoresheet player labels.
+
+build_results_table is a pure function of its inputs. ResultsTableMemo
+remembers recent tables by (query lines, results version, option flags), so
+Streamlit reruns that change none of those (a captain star, a board move)
+reuse the previous table instead of rebuilding it.
+"""
+
+from collections import OrderedDict
+from typing import NamedTuple
+
+import pandas as pd
+
+# Grade column -> display label, in table and copy-list priority order
+GRADE_LABELS = {
+    'standard_published': "Published (Std)",
+    'standard_live': "Live (Std)",
+    'allegro_published': "Published (Alg)",
+    'allegro_live': "Live (Alg)",
+    'blitz_published': "Published (Blitz)",
+    'blitz_live': "Live (Blitz)",
+}
+
+CONFIDENT_STATUSES = ("✅", "⚠️ PNUM Only")
+
+
+class ResultsOptions(NamedTuple):
+    """The display checkboxes. grades holds one flag per GRADE_LABELS key, in order."""
+    show_pnum: bool = True
+    show_club: bool = True
+    show_age: bool = False
+    grades: tuple = (True, False, False, False, False, False)
+
+    def visible_grades(self):
+        return [key for key, shown in zip(GRADE_LABELS, self.grades) if shown]
+
+
+class ResultsTable(NamedTuple):
+    rows: list            # deduplicated display rows, placeholders last
+    table: object         # DataFrame of the visible columns, grades numeric
+    confident: int        # players matched by a single result or PNUM
+    total: int            # distinct players found
+    not_found: int        # lines that found nobody or were too short
+    multiline_text: str   # copy list, highest grade first
+    singleline_text: str  # copy list, alphabetical by name
+    player_ids: list      # scoresheet ids (PNUM, else name), in row order
+    player_data: dict     # scoresheet id -> label, rating and name parts
+
+
+def _placeholder(status, name):
+    return {
+        "Match Status": status, "Name": name,
+        "Pnum": "", "Club": "", "Age": "",
+        "Live (Std)": "", "Published (Std)": "",
+        "Live (Alg)": "", "Published (Alg)": "",
+        "Live (Blitz)": "", "Published (Blitz)": "",
+    }
+
+
+def _is_placeholder(row):
+    return "⚠️ Ignored" in row['Match Status'] or "❌" in row['Match Status']
+
+
+def flatten_results(results_map, club_map):
+    """One display row per match (or a placeholder per line that found nobody)."""
+    flat_data = []
+    for input_name, matches in results_map.items():
+        if matches and isinstance(matches[0], dict) and matches[0].get('invalid_query'):
+            flat_data.append(_placeholder("⚠️ Ignored", f"{input_name} (Min 3 chars required)"))
+        elif not matches:
+            flat_data.append(_placeholder("❌", f"{input_name} (Not Found)"))
+        else:
+            for match in matches:
+                if match.match_type == 'pnum':
+                    status_icon = "⚠️ PNUM Only"
+                elif match.match_type == 'fuzzy':
+                    status_icon = "⚠️ Suggested"
+                elif len(matches) > 1:
+                    status_icon = "⚠️ Multiple"
+                else:
+                    status_icon = "✅"
+
+                # Format club codes: "ST" -> "ST (Stirling)"
+                c_parts = [c.strip() for c in match.club.split(',') if c.strip()]
+                c_display = ", ".join(f"{code} ({club_map[code]})" if code in club_map else code for code in c_parts)
+
+                flat_data.append({
+                    "Match Status": status_icon,
+                    "Name": match.name,
+                    "Pnum": match.pnum,
+                    "Club": c_display,
+                    "Age": match.age,
+                    "Live (Std)": match.standard_live,
+                    "Published (Std)": match.standard_published,
+                    "Live (Alg)": match.allegro_live,
+                    "Published (Alg)": match.allegro_published,
+                    "Live (Blitz)": match.blitz_live,
+                    "Published (Blitz)": match.blitz_published,
+                })
+    return flat_data
+
+
+def dedupe_rows(flat_data):
+    """
+    Keeps one row per player (by PNUM, else name), preferring a confident match
+    over a ⚠️ Multiple one. Returns (player rows, placeholder rows).
+    """
+    unique_data = {}
+    placeholders = []
+    for row in flat_data:
+        if _is_placeholder(row):
+            placeholders.append(row)
+            continue
+        key = str(row['Pnum']) if row['Pnum'] else row['Name']
+        if key in unique_data:
+            current_is_confident = row['Match Status'] in CONFIDENT_STATUSES
+            existing_is_confident = unique_data[key]['Match Status'] in CONFIDENT_STATUSES
+            if current_is_confident and not existing_is_confident:
+                unique_data[key] = row
+        else:
+            unique_data[key] = row
+    return list(unique_data.values()), placeholders
+
+
+def display_name(raw_name):
+    """'Surname, Forename' -> 'Forename Surname'."""
+    if ',' in raw_name:
+        surname, forename = raw_name.split(',', 1)
+        return f"{forename.strip()} {surname.strip()}"
+    return raw_name
+
+
+def _abbreviate(full_name):
+    parts = full_name.strip().split()
+    if len(parts) < 2:
+        return full_name
+    return f"{parts[0][0]}. {parts[-1]}"
+
+
+def _split_name(full_name):
+    parts = full_name.strip().split()
+    if not parts:
+        return "", ""
+    if len(parts) == 1:
+        return "", parts[0]
+    return " ".join(parts[:-1]), parts[-1]
+
+
+def _first_grade(row, visible_grades):
+    """The highest-priority visible grade: (text, int value or -1)."""
+    for key in visible_grades:
+        raw_val = row.get(GRADE_LABELS[key], '')
+        if raw_val and str(raw_val).strip():
+            grade = str(raw_val).strip()
+            try:
+                return grade, int(grade)
+            except ValueError:
+                return grade, -1
+    return "", -1
+
+
+def build_results_table(results_map, club_map, options=ResultsOptions()):
+    """Builds the ResultsTable for results_map (raw line -> matches) and the display options."""
+    players, placeholders = dedupe_rows(flatten_results(results_map, club_map))
+    rows = players + placeholders
+    visible_grades = options.visible_grades()
+
+    columns = ["Match Status", "Name"]
+    if options.show_pnum:
+        columns.append("Pnum")
+    if options.show_club:
+        columns.append("Club")
+    if options.show_age:
+        columns.append("Age")
+    columns += [GRADE_LABELS[key] for key in visible_grades]
+
+    df = pd.DataFrame(rows, columns=list(_placeholder("", "")))
+    for col in GRADE_LABELS.values():
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    table = df[columns]
+
+    copy_items = []
+    player_ids = []
+    player_data = {}
+    for row in players:
+        pnum = str(row.get('Pnum', '') or '')
+        name = display_name(row.get('Name', '') or '')
+        grade, rating = _first_grade(row, visible_grades)
+
+        parts = [name]
+        if options.show_pnum and pnum:
+            parts.append(f"[{pnum}]")
+        if grade:
+            parts.append(f"({grade})")
+        copy_items.append((" ".join(parts), name, rating))
+
+        label_parts = [_abbreviate(name)]
+        if pnum:
+            label_parts.append(f"[{pnum}]")
+        if grade:
+            label_parts.append(f"({grade})")
+        forename, surname = _split_name(name)
+        player_id = pnum or name
+        player_data[player_id] = {
+            'display': " ".join(label_parts),
+            'rating': rating,
+            'rating_str': grade,
+            'forename': forename,
+            'surname': surname,
+            'full_name': name,
+            'pnum': pnum,
+        }
+        player_ids.append(player_id)
+
+    by_grade = sorted(copy_items, key=lambda item: item[2], reverse=True)
+    # Players sharing a name stay in grade order, as in the multi-line list
+    by_name = sorted(by_grade, key=lambda item: item[1].lower())
+    return ResultsTable(
+        rows=rows,
+        table=table,
+        confident=sum(1 for row in players if row['Match Status'] in CONFIDENT_STATUSES),
+        total=len(players),
+        not_found=len(placeholders),
+        multiline_text="\n".join(item[0] for item in by_grade),
+        singleline_text=", ".join(item[0] for item in by_name),
+        player_ids=player_ids,
+        player_data=player_data,
+    )
+
+
+class ResultsTableMemo:
+    """
+    Remembers the last few ResultsTables by (query lines, results version,
+    options). version must change whenever the results behind the lines do;
+    the app bumps it each time it stores new lookup results. club_map is
+    assumed not to change (it comes from the club file).
+    Treat returned tables as read-only: they are shared between reruns.
+    """
+
+    def __init__(self, size=4):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._tables = OrderedDict()
+
+    def get(self, lines, version, results_for, club_map, options=ResultsOptions()):
+        """
+        The table for lines. results_for(lines) returns the results map and is
+        only called when the table has to be built.
+        """
+        key = (tuple(lines), version, options)
+        table = self._tables.get(key)
+        if table is not None:
+            self._tables.move_to_end(key)
+            self.hits += 1
+            return table
+        self.misses += 1
+        table = build_results_table(results_for(lines), club_map, options)
+        self._tables[key] = table
+        while len(self._tables) > self.size:
+            self._tables.popitem(last=False)
+        return table
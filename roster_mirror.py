@@ -0,0 +1,679 @@
+"""
+Local mirror of the Chess Scotland federation roster.
+
+sync() sweeps a club-only search for every club in club_names.txt into a
+SQLite file. RosterMirror then answers the same searches get_player_grading
+would send to handle-form (by search_key) from memory, so it can be passed as
+get_player_grading(..., mirror=mirror) and only misses go to the network.
+
+sync_changes() keeps the mirror current more cheaply: it only revisits clubs
+whose adaptive interval has passed, and applies row-level diffs.
+
+Run a full sweep, or an incremental one, from the command line with:
+    python roster_mirror.py sync
+    python roster_mirror.py sync --changes
+"""
+
+import argparse
+import hashlib
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import chess_grading
+from chess_grading import PLAYER_FIELDS, Player, SessionManager, iter_results
+
+logger = logging.getLogger(__name__)
+
+_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MIRROR_PATH = os.environ.get(
+    'CHESS_GRADING_MIRROR_DB', os.path.join(_DIR, 'roster_mirror.sqlite3')
+)
+
+# Mirror rows are trusted for live grades for this long after they were fetched,
+# and for published grades (re-issued monthly) for this long
+LIVE_TTL = 24 * 3600
+PUBLISHED_TTL = 30 * 24 * 3600
+# Pause between club requests during a sweep, to stay polite to chessscotland.com
+SYNC_DELAY = 1.0
+# How often get() checks the database for a sweep run by another process
+RELOAD_INTERVAL = 60
+# Incremental sync: each club is revisited after its own interval, halved when its
+# roster has changed since the last visit and doubled when it has not. Intervals
+# never exceed the mirror's live_ttl, so a dormant club's players stay fresh
+# enough for live lookups.
+CLUB_INTERVAL = 24 * 3600
+MIN_CLUB_INTERVAL = 6 * 3600
+MAX_CLUB_INTERVAL = 14 * 24 * 3600
+
+# Fuzzy suggestions: how many to offer, and the minimum trigram similarity (0-1)
+SUGGESTION_LIMIT = 5
+SUGGESTION_MIN_SCORE = 0.6
+
+_COLUMNS = PLAYER_FIELDS[:-1]  # match_type is per-query, never stored
+_CLUB = _COLUMNS.index('club')
+_NON_LETTERS = re.compile(r"[^a-z0-9 ]+")
+
+
+def _split_name(name):
+    """Splits the backend's "Surname, Forename" into lower-cased (forename, surname)."""
+    surname, _, forename = name.partition(',')
+    return ' '.join(forename.lower().split()), ' '.join(surname.lower().split())
+
+
+def _club_codes(club):
+    return frozenset(c.strip().upper() for c in club.split(',') if c.strip())
+
+
+def _trigrams(text):
+    """
+    Set of padded character trigrams of each word in text, ignoring case,
+    punctuation and word order ("O'Brien-Smith, Jo" ~ "jo obrien smith").
+    """
+    grams = set()
+    for word in _NON_LETTERS.sub('', text.lower().replace('-', ' ')).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _word_grams(text, n):
+    """Unpadded n-grams of each word in text, normalised as by _trigrams."""
+    return {
+        word[i:i + n]
+        for word in _NON_LETTERS.sub('', text.lower().replace('-', ' ')).split()
+        for i in range(len(word) - n + 1)
+    }
+
+
+class TrigramIndex:
+    """
+    In-memory inverted index from name trigrams to entry keys, for
+    typo-tolerant lookups. search() ranks entries by Dice similarity of their
+    trigram sets, so "Nathaneal Loch" finds "Loch, Nathanael". candidates()
+    narrows a substring search to the entries that could match.
+
+    Built from a list of names, entries are keyed by position; add() and
+    remove() maintain it under any other key (the mirror uses PNUMs).
+    """
+
+    def __init__(self, names=()):
+        self._sizes = {}
+        self._postings = {}
+        self._pairs = {}  # word bigram -> keys, for substring searches on two-letter words
+        for position, name in enumerate(names):
+            self.add(position, name)
+
+    def add(self, key, name):
+        grams = _trigrams(name)
+        self._sizes[key] = len(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+        for pair in _word_grams(name, 2):
+            self._pairs.setdefault(pair, set()).add(key)
+
+    def remove(self, key, name):
+        """Drops key, which must have been added with name."""
+        self._sizes.pop(key, None)
+        for postings, grams in ((self._postings, _trigrams(name)), (self._pairs, _word_grams(name, 2))):
+            for gram in grams:
+                posting = postings.get(gram)
+                if posting is not None:
+                    posting.discard(key)
+                    if not posting:
+                        del postings[gram]
+
+    def candidates(self, text):
+        """
+        Keys of the entries whose name could contain each word of text as a
+        substring (a superset: callers check the match), or None when every
+        word is a single letter.
+        """
+        words = _NON_LETTERS.sub('', text.lower().replace('-', ' ')).split()
+        postings = [self._postings.get(gram, ()) for gram in _word_grams(text, 3)]
+        postings += [self._pairs.get(word, ()) for word in words if len(word) == 2]
+        if not postings:
+            return None
+        postings.sort(key=len)
+        return set(postings[0]).intersection(*postings[1:])
+
+    def search(self, text, min_score=SUGGESTION_MIN_SCORE):
+        """Returns [(score, key), ...] for entries scoring at least min_score, best first."""
+        grams = _trigrams(text)
+        if not grams:
+            return []
+        postings = self._postings
+        total = len(grams)
+        # An entry scoring min_score shares at least `needed` query trigrams, so it
+        # must appear under one of the rarest total - needed + 1 of them. Only those
+        # posting lists are walked; the common ones (" ma", "son") are just probed.
+        needed = max(1, math.ceil(min_score * total / (2 - min_score) - 1e-9))
+        ordered = sorted(grams, key=lambda gram: len(postings.get(gram, ())))
+        cut = total - needed + 1
+
+        shared = {}
+        for gram in ordered[:cut]:
+            for key in postings.get(gram, ()):
+                shared[key] = shared.get(key, 0) + 1
+        for gram in ordered[cut:]:
+            posting = postings.get(gram)
+            if posting:
+                for key in shared:
+                    if key in posting:
+                        shared[key] += 1
+
+        sizes = self._sizes
+        scored = [(2 * n / (total + sizes[key]), key) for key, n in shared.items()]
+        return sorted((item for item in scored if item[0] >= min_score), key=lambda item: (-item[0], item[1]))
+
+
+class _RosterIndex:
+    """
+    The mirror's in-memory lookup structures, keyed by PNUM. RosterMirror
+    builds one from the database and then keeps it in step with its own
+    writes through add(), so a write-back never forces a rebuild.
+    """
+
+    def __init__(self, clubs, memberships, swept_at):
+        self.clubs = clubs                # swept club code -> synced_at
+        self.memberships = memberships    # pnum -> set of swept club codes
+        self.swept_at = swept_at
+        self.players = {}
+        self.synced = {}
+        self.names = {}                   # pnum -> (forename, surname), lower-cased
+        self.codes = {}                   # pnum -> club codes searched by
+        self.by_club = {}                 # club code -> set of pnums
+        self.fuzzy = TrigramIndex()
+
+    def add(self, player, synced_at):
+        """Adds player, replacing any entry with the same PNUM."""
+        pnum = player.pnum
+        self.discard(pnum)
+        forename, surname = _split_name(player.name)
+        # Swept rosters are authoritative; players only written back by put() use their club field
+        codes = frozenset(self.memberships[pnum]) if pnum in self.memberships else _club_codes(player.club)
+        self.players[pnum] = player
+        self.synced[pnum] = synced_at
+        self.names[pnum] = (forename, surname)
+        self.codes[pnum] = codes
+        for code in codes:
+            self.by_club.setdefault(code, set()).add(pnum)
+        self.fuzzy.add(pnum, f"{forename} {surname}")
+
+    def discard(self, pnum):
+        if pnum not in self.players:
+            return
+        forename, surname = self.names.pop(pnum)
+        self.fuzzy.remove(pnum, f"{forename} {surname}")
+        for code in self.codes.pop(pnum):
+            self.by_club[code].discard(pnum)
+        del self.players[pnum], self.synced[pnum]
+
+    def match_names(self, forename, surname, club):
+        """PNUMs whose forename and surname contain the given (lower-cased) substrings."""
+        candidates = self.fuzzy.candidates(f"{forename} {surname}")
+        if candidates is None:
+            # Every word is a single letter: check the club, or everyone
+            candidates = self.by_club.get(club, ()) if club else self.names
+        names, codes = self.names, self.codes
+        return [
+            p for p in candidates
+            if forename in names[p][0] and surname in names[p][1] and (not club or club in codes[p])
+        ]
+
+    def ordered(self, pnums):
+        """pnums in roster order (by name, then PNUM)."""
+        players = self.players
+        return sorted(pnums, key=lambda p: (players[p].name, p))
+
+
+class RosterMirror:
+    """
+    SQLite-backed copy of every club roster, indexed in memory for lookups.
+
+    Implements the grading_cache get/put protocol. get() matches the way the
+    backend does: PNUM exactly, club by code, and forename/surname as
+    case-insensitive substrings. Matching rows are returned if they are all
+    younger than live_ttl (or published_ttl when live grades are not needed).
+    "No match" is only trusted if the club searched, or for other searches
+    the last complete sweep, is that fresh; otherwise get() returns None so the
+    search goes to the network. put() writes network results back in.
+
+    suggest() returns the closest spellings of a name from a trigram index.
+    """
+
+    def __init__(self, path=DEFAULT_MIRROR_PATH, live_ttl=LIVE_TTL, published_ttl=PUBLISHED_TTL):
+        self.path = path
+        self.live_ttl = live_ttl
+        self.published_ttl = published_ttl
+        self._lock = threading.Lock()
+        # Guards the in-memory index, which upsert() updates in place
+        self._index_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS players ("
+            " pnum TEXT PRIMARY KEY,"
+            + "".join(f" {column} TEXT NOT NULL DEFAULT ''," for column in _COLUMNS[1:])
+            + " synced_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS clubs ("
+            " code TEXT PRIMARY KEY,"
+            " synced_at REAL NOT NULL,"
+            " player_count INTEGER NOT NULL,"
+            " fingerprint TEXT NOT NULL DEFAULT '',"
+            " changed_at REAL NOT NULL DEFAULT 0,"
+            f" interval REAL NOT NULL DEFAULT {CLUB_INTERVAL})"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS memberships ("
+            " code TEXT NOT NULL,"
+            " pnum TEXT NOT NULL,"
+            " PRIMARY KEY (code, pnum))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS memberships_pnum ON memberships (pnum)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sweeps ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " started_at REAL NOT NULL,"
+            " finished_at REAL)"
+        )
+        self._loaded_marker = None
+        self._checked_at = 0.0
+        self._load()
+
+    # --- in-memory index ---
+
+    def _marker(self):
+        return tuple(
+            value
+            for query in (
+                "SELECT COUNT(*), MAX(synced_at) FROM players",
+                "SELECT COUNT(*), MAX(synced_at) FROM clubs",
+                "SELECT MAX(finished_at) FROM sweeps",
+            )
+            for value in self._conn.execute(query).fetchone()
+        )
+
+    def _load(self):
+        """(Re)builds the in-memory index from the database."""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(_COLUMNS)}, synced_at FROM players").fetchall()
+            clubs = dict(self._conn.execute("SELECT code, synced_at FROM clubs").fetchall())
+            memberships = {}
+            for code, pnum in self._conn.execute("SELECT code, pnum FROM memberships"):
+                memberships.setdefault(pnum, set()).add(code)
+            # Once a full sweep has completed, the roster is complete as of the
+            # club that was confirmed longest ago
+            (swept_at,) = self._conn.execute(
+                "SELECT MIN(synced_at) FROM clubs"
+                " WHERE EXISTS (SELECT 1 FROM sweeps WHERE finished_at IS NOT NULL)"
+            ).fetchone()
+            marker = self._marker()
+
+        index = _RosterIndex(clubs, memberships, swept_at or 0.0)
+        for row in rows:
+            index.add(Player(*row[:-1]), row[-1])
+
+        # Swap the whole index at once so readers never see a half-built one
+        with self._index_lock:
+            self._index = index
+        self._loaded_marker = marker
+        self._checked_at = time.monotonic()
+
+    def _reload_if_changed(self):
+        if time.monotonic() - self._checked_at < RELOAD_INTERVAL:
+            return
+        with self._lock:
+            marker = self._marker()
+        self._checked_at = time.monotonic()
+        if marker != self._loaded_marker:
+            self._load()
+
+    def __len__(self):
+        return len(self._index.players)
+
+    # --- grading_cache protocol ---
+
+    def get(self, key, need_live=True):
+        """Answers a search_key from the mirror, or returns None to send it to the network."""
+        self._reload_if_changed()
+        forename, surname, club, pnum = key
+        cutoff = time.time() - (self.live_ttl if need_live else self.published_ttl)
+        with self._index_lock:
+            index = self._index
+            # Rows written back by put() alone never make a club, or the roster, complete
+            if (club and club not in index.clubs) or (not club and not pnum and not index.swept_at):
+                return None
+
+            if pnum:
+                pnums = [pnum] if pnum in index.players else []
+            elif not forename and not surname:
+                pnums = index.by_club.get(club, ())
+            else:
+                pnums = index.match_names(forename, surname, club)
+
+            if not pnums:
+                scope_synced_at = index.clubs.get(club, 0.0) if club else index.swept_at
+                return [] if scope_synced_at >= cutoff else None
+            if any(index.synced[p] < cutoff for p in pnums):
+                return None
+            return [index.players[p] for p in index.ordered(pnums)]
+
+    def suggest(self, name, club="", limit=SUGGESTION_LIMIT, min_score=SUGGESTION_MIN_SCORE):
+        """
+        Returns up to limit Players whose names are closest to name (in any word
+        order), best first, optionally restricted to a club code. Never touches
+        the network.
+        """
+        self._reload_if_changed()
+        with self._index_lock:
+            index = self._index
+            # Equal scores are ranked in roster order
+            ranked = sorted(
+                index.fuzzy.search(name, min_score),
+                key=lambda item: (-item[0], index.players[item[1]].name, item[1]),
+            )
+            suggestions = []
+            for _, pnum in ranked:
+                if club and club not in index.codes[pnum]:
+                    continue
+                suggestions.append(index.players[pnum])
+                if len(suggestions) == limit:
+                    break
+        return suggestions
+
+    def put(self, key, rows):
+        """Stores players fetched from the network so the mirror stays current."""
+        self.upsert(rows)
+
+    # --- writes ---
+
+    def upsert(self, rows, synced_at=None):
+        """Inserts or replaces players (Players or player dicts)."""
+        synced_at = time.time() if synced_at is None else synced_at
+        values = [tuple(row[column] for column in _COLUMNS) + (synced_at,) for row in rows]
+        if not values:
+            return
+        with self._lock:
+            # Only our own write separates the database from the index if the
+            # marker still matches; otherwise leave the reload check to notice
+            in_step = self._marker() == self._loaded_marker
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO players ({', '.join(_COLUMNS)}, synced_at)"
+                f" VALUES ({', '.join('?' * (len(_COLUMNS) + 1))})",
+                values,
+            )
+            if in_step:
+                self._loaded_marker = self._marker()
+        with self._index_lock:
+            for value in values:
+                self._index.add(Player(*value[:-1]), synced_at)
+
+    def sync(self, sessions=None, clubs=None, delay=SYNC_DELAY, resume=True, on_club=None):
+        """
+        Sweeps each club's full roster into the mirror, one club-only search at
+        a time with delay seconds between requests.
+
+        clubs   : codes to sweep (default: every code in club_names.txt).
+        resume  : continue the last unfinished sweep, skipping clubs it already
+                  stored, instead of starting again from the first club.
+        on_club : optional callback(code, changes) after each club, where
+                  changes is the dict returned by _store_club.
+
+        A sweep that completes removes players who were not on any roster.
+        Returns the number of clubs fetched by this call.
+        """
+        clubs = self._club_codes(clubs)
+        sessions = sessions or SessionManager()
+
+        with self._lock:
+            sweep = self._conn.execute(
+                "SELECT id, started_at FROM sweeps WHERE finished_at IS NULL ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+            if sweep is None or not resume:
+                started_at = time.time()
+                self._conn.execute("UPDATE sweeps SET finished_at = ? WHERE finished_at IS NULL", (started_at,))
+                sweep_id = self._conn.execute(
+                    "INSERT INTO sweeps (started_at) VALUES (?)", (started_at,)
+                ).lastrowid
+            else:
+                sweep_id, started_at = sweep
+            done = {code for (code,) in self._conn.execute(
+                "SELECT code FROM clubs WHERE synced_at >= ?", (started_at,)
+            )}
+
+        fetched = self._fetch_clubs(sessions, [c for c in clubs if c not in done], delay, on_club)
+
+        with self._lock:
+            remaining = {c for c in clubs} - {code for (code,) in self._conn.execute(
+                "SELECT code FROM clubs WHERE synced_at >= ?", (started_at,)
+            )}
+            if not remaining:
+                self._conn.execute("BEGIN")
+                self._conn.execute("DELETE FROM memberships WHERE code IN"
+                                   " (SELECT code FROM clubs WHERE synced_at < ?)", (started_at,))
+                self._conn.execute("DELETE FROM clubs WHERE synced_at < ?", (started_at,))
+                self._conn.execute("DELETE FROM players WHERE synced_at < ?", (started_at,))
+                self._conn.execute("UPDATE sweeps SET finished_at = ? WHERE id = ?", (time.time(), sweep_id))
+                self._conn.execute("COMMIT")
+        self._load()
+        return fetched
+
+    def _max_interval(self):
+        return min(MAX_CLUB_INTERVAL, self.live_ttl)
+
+    def sync_changes(self, sessions=None, clubs=None, delay=SYNC_DELAY, on_club=None, now=None):
+        """
+        Incremental sync: fetches only the clubs that are due, and applies just
+        the rows that changed.
+
+        Each club is due once its interval has passed since it was last fetched
+        (clubs never fetched are due at once). A club whose roster has changed
+        since the previous fetch has its interval halved, down to
+        MIN_CLUB_INTERVAL; an unchanged one has it doubled, up to
+        MAX_CLUB_INTERVAL or live_ttl, whichever is shorter. Busy clubs are
+        therefore revisited more often than dormant ones, and every club is
+        revisited before its players are too old for live lookups.
+
+        Returns totals of the _store_club changes plus 'fetched' (clubs requested).
+        """
+        clubs = self._club_codes(clubs)
+        sessions = sessions or SessionManager()
+        now = time.time() if now is None else now
+
+        with self._lock:
+            next_due = dict(self._conn.execute(
+                "SELECT code, synced_at + MIN(interval, ?) FROM clubs", (self._max_interval(),)
+            ).fetchall())
+        due = [code for code in clubs if next_due.get(code, 0.0) <= now]
+
+        totals = {'fetched': 0, 'changed': 0, 'added': 0, 'updated': 0, 'removed': 0}
+
+        def tally(code, changes):
+            totals['changed'] += changes['changed']
+            for field in ('added', 'updated', 'removed'):
+                totals[field] += changes[field]
+            if on_club:
+                on_club(code, changes)
+
+        totals['fetched'] = self._fetch_clubs(sessions, due, delay, tally)
+        self._load()
+        return totals
+
+    def _club_codes(self, clubs):
+        if clubs is not None:
+            return clubs
+        chess_grading.load_club_data()
+        return sorted({v['code'] for v in chess_grading.CLUB_DATA.values()})
+
+    def _fetch_clubs(self, sessions, clubs, delay, on_club):
+        """Fetches and stores each club's roster in turn. Returns the number stored."""
+        fetched = 0
+        for code in clubs:
+            if fetched:
+                time.sleep(delay)
+            html = sessions.search("", "", club=code)
+            if html is None:
+                logger.warning("Sync of club %s failed; it will be retried next time.", code)
+                continue
+            changes = self._store_club(code, html)
+            fetched += 1
+            if on_club:
+                on_club(code, changes)
+        return fetched
+
+    def _store_club(self, code, html):
+        """
+        Applies one club's roster to the mirror as a row-level diff.
+
+        If the response is byte-for-byte what was stored last time, only the
+        freshness of the club and its players is updated. Otherwise new players
+        are inserted, changed rows (grades, club moves) are rewritten, and
+        players no longer on the roster lose their membership of the club
+        (and are deleted if they belong to no other swept club). Players
+        whose club field no longer lists another club they were swept under
+        lose that membership too.
+
+        Returns {'changed', 'players', 'added', 'updated', 'removed'}.
+        """
+        now = time.time()
+        fingerprint = hashlib.sha256(html.encode('utf-8')).hexdigest()
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT fingerprint, interval, player_count FROM clubs WHERE code = ?", (code,)
+            ).fetchone()
+
+        changes = {'changed': False, 'players': 0, 'added': 0, 'updated': 0, 'removed': 0}
+        if previous is not None and previous[0] == fingerprint:
+            interval = min(previous[1] * 2, self._max_interval())
+            changes['players'] = previous[2]
+            with self._lock:
+                self._conn.execute("BEGIN")
+                self._conn.execute(
+                    "UPDATE players SET synced_at = ?"
+                    " WHERE pnum IN (SELECT pnum FROM memberships WHERE code = ?)", (now, code)
+                )
+                self._conn.execute(
+                    "UPDATE clubs SET synced_at = ?, interval = ? WHERE code = ?", (now, interval, code)
+                )
+                self._conn.execute("COMMIT")
+            return changes
+
+        interval = CLUB_INTERVAL if previous is None else max(previous[1] / 2, MIN_CLUB_INTERVAL)
+        interval = min(interval, self._max_interval())
+        roster = {player.pnum: tuple(player[column] for column in _COLUMNS) for player in iter_results(html)}
+        columns = ', '.join(_COLUMNS)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            members = {pnum for (pnum,) in self._conn.execute(
+                "SELECT pnum FROM memberships WHERE code = ?", (code,)
+            )}
+            stored = {}
+            other_clubs = {}
+            pnums = list(roster)
+            for start in range(0, len(pnums), 500):
+                chunk = pnums[start:start + 500]
+                placeholders = ', '.join('?' * len(chunk))
+                stored.update(
+                    (row[0], row) for row in self._conn.execute(
+                        f"SELECT {columns} FROM players WHERE pnum IN ({placeholders})", chunk
+                    )
+                )
+                for other, pnum in self._conn.execute(
+                    f"SELECT code, pnum FROM memberships WHERE pnum IN ({placeholders}) AND code != ?",
+                    chunk + [code],
+                ):
+                    other_clubs.setdefault(pnum, set()).add(other)
+
+            for pnum, row in roster.items():
+                if pnum not in stored:
+                    changes['added'] += 1
+                elif stored[pnum] != row:
+                    changes['updated'] += 1
+                else:
+                    continue
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO players ({columns}, synced_at)"
+                    f" VALUES ({', '.join('?' * (len(_COLUMNS) + 1))})",
+                    row + (now,),
+                )
+            unchanged = [pnum for pnum, row in roster.items() if stored.get(pnum) == row]
+            self._conn.executemany("UPDATE players SET synced_at = ? WHERE pnum = ?", [(now, p) for p in unchanged])
+
+            # A player whose club field no longer lists a club they were swept
+            # under has moved: drop that membership now rather than waiting
+            # for the old club's own (possibly weeks-away) visit
+            moved = []
+            for pnum, clubs in other_clubs.items():
+                listed = _club_codes(roster[pnum][_CLUB])
+                if listed:
+                    moved += [(other, pnum) for other in clubs - listed]
+            self._conn.executemany("DELETE FROM memberships WHERE code = ? AND pnum = ?", moved)
+
+            departed = members - roster.keys()
+            self._conn.executemany("DELETE FROM memberships WHERE code = ? AND pnum = ?", [(code, p) for p in departed])
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO memberships (code, pnum) VALUES (?, ?)", [(code, p) for p in roster]
+            )
+            self._conn.executemany(
+                "DELETE FROM players WHERE pnum = ? AND pnum NOT IN (SELECT pnum FROM memberships)",
+                [(p,) for p in departed],
+            )
+            changes['removed'] = len(departed)
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO clubs (code, synced_at, player_count, fingerprint, changed_at, interval)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (code, now, len(roster), fingerprint, now, interval),
+            )
+            self._conn.execute("COMMIT")
+        changes['changed'] = True
+        changes['players'] = len(roster)
+        return changes
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the local Chess Scotland roster mirror.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sync_cmd = sub.add_parser('sync', help="Sweep every club's roster into the mirror.")
+    sync_cmd.add_argument('--db', default=DEFAULT_MIRROR_PATH, help="Mirror database path.")
+    sync_cmd.add_argument('--delay', type=float, default=SYNC_DELAY, help="Seconds between club requests.")
+    sync_cmd.add_argument('--restart', action='store_true', help="Start a new sweep instead of resuming.")
+    sync_cmd.add_argument('--changes', action='store_true',
+                          help="Incremental sync: only fetch clubs that are due, and apply row-level diffs.")
+    sync_cmd.add_argument('clubs', nargs='*', help="Club codes to sweep (default: all).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    def report(code, changes):
+        if changes['changed']:
+            logger.info("%s: %d players (%d new, %d changed, %d left)", code, changes['players'],
+                        changes['added'], changes['updated'], changes['removed'])
+        else:
+            logger.info("%s: unchanged", code)
+
+    mirror = RosterMirror(args.db)
+    clubs = [c.upper() for c in args.clubs] or None
+    if args.changes:
+        totals = mirror.sync_changes(clubs=clubs, delay=args.delay, on_club=report)
+        fetched = totals['fetched']
+    else:
+        fetched = mirror.sync(clubs=clubs, delay=args.delay, resume=not args.restart, on_club=report)
+    logger.info("Fetched %d clubs; mirror holds %d players.", fetched, len(mirror))
+    mirror.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+from unittest.mock import patch
+
+import pytest
+
+import chess_grading
+from fake_server import FakeChessScotland
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limiter():
+    # The limiter is process-wide; don't let one test's throttling or
+    # backoff carry over into the next
+    chess_grading.RATE_LIMITER.reset()
+
+
+@pytest.fixture
+def fake():
+    """A FakeChessScotland on a free port, with chess_grading pointed at it and fast retries."""
+    site = FakeChessScotland(players=500, seed=3)
+    url = site.start()
+    with patch('chess_grading.BASE_URL', f"{url}/grading"), \
+         patch('chess_grading.API_URL', f"{url}/handle-form"), \
+         patch('chess_grading.RETRY_POLICY', chess_grading.RetryPolicy(attempts=8, base=0.01, cap=0.05)):
+        yield site
+    site.stop()
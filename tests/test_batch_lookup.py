@@ -0,0 +1,129 @@
+"""
+Tests for batch_lookup.py and iter_player_grading
+
+Run with: pytest tests/
+"""
+
+from unittest.mock import patch
+
+import csv
+import io
+import json
+
+import pytest
+
+from batch_lookup import CheckpointMismatch, load_checkpoint, main, read_queries, run
+from chess_grading import iter_player_grading
+
+
+def _entry_list(site, count):
+    """An input file mixing PNUM lines, names with clubs and a sticky club block."""
+    rows = [r for r in site.federation if ',' not in r['club']][:count]
+    lines = []
+    for n, row in enumerate(rows):
+        surname, forename = (p.strip() for p in row['name'].split(','))
+        if n % 3 == 0:
+            lines.append(f"[{row['pnum']}]")
+        elif n % 3 == 1:
+            lines.append(f"{forename} {surname}; {row['club']}")
+        else:
+            lines += [f"{row['club'].lower()}:", f"{forename} {surname}"]
+    return "\n".join(lines) + "\nzz\n", rows
+
+
+def _ndjson(text):
+    return [json.loads(line) for line in text.splitlines()]
+
+
+# ---------------------------------------------------------------------------
+# iter_player_grading
+# ---------------------------------------------------------------------------
+
+class TestIterPlayerGrading:
+
+    def test_yields_every_query_once(self, fake):
+        text, rows = _entry_list(fake, 9)
+        queries = read_queries(['-'], stdin=io.StringIO(text))
+        results = list(iter_player_grading(queries, max_in_flight=4))
+
+        assert sorted(index for index, _, _ in results) == list(range(len(queries)))
+        by_index = {index: (raw, matches) for index, raw, matches in results}
+        assert by_index[0][0] == f"[{rows[0]['pnum']}]"
+        assert [p.pnum for p in by_index[0][1]] == [rows[0]['pnum']]
+
+    @patch('chess_grading.get_session_and_token', return_value=(None, None))
+    def test_failed_lookups_yield_none(self, _):
+        queries = [{'raw': 'Loch', 'name': 'Loch', 'club': '', 'is_single': True}]
+        assert list(iter_player_grading(queries)) == [(0, 'Loch', None)]
+
+
+# ---------------------------------------------------------------------------
+# Batch command
+# ---------------------------------------------------------------------------
+
+class TestBatch:
+
+    def test_ndjson_output(self, fake, tmp_path):
+        text, rows = _entry_list(fake, 6)
+        (tmp_path / 'entries.txt').write_text(text)
+        out = tmp_path / 'out.ndjson'
+
+        assert main([str(tmp_path / 'entries.txt'), '-o', str(out)]) == 0
+        records = sorted(_ndjson(out.read_text()), key=lambda r: r['index'])
+
+        assert len(records) == 7
+        assert records[0]['status'] == 'pnum'
+        assert records[0]['matches'][0]['pnum'] == rows[0]['pnum']
+        # the sticky club applies to the line after it
+        assert rows[2]['pnum'] in [m['pnum'] for m in records[2]['matches']]
+        assert all(rows[2]['club'] in m['club'] for m in records[2]['matches'])
+        assert records[-1]['status'] == 'invalid'
+
+    def test_csv_output(self, fake, tmp_path):
+        text, rows = _entry_list(fake, 3)
+        (tmp_path / 'entries.txt').write_text(text)
+        out = tmp_path / 'grades.csv'
+
+        assert main([str(tmp_path / 'entries.txt'), '-o', str(out)]) == 0
+        table = list(csv.DictReader(out.open(newline='')))
+        assert rows[0]['pnum'] in [r['pnum'] for r in table]
+        assert [r for r in table if r['status'] == 'invalid'][0]['pnum'] == ''
+
+    def test_resume_from_checkpoint(self, fake, tmp_path):
+        text, _ = _entry_list(fake, 6)
+        entries, out, ckpt = tmp_path / 'entries.txt', tmp_path / 'out.ndjson', tmp_path / 'run.ckpt'
+        entries.write_text(text)
+        queries = read_queries([str(entries)])
+
+        # A first run that stopped after three lines
+        with out.open('w') as o, ckpt.open('w') as c:
+            run(queries[:3], o, checkpoint=c)
+        searches = fake.stats['searches']
+
+        assert main([str(entries), '-o', str(out), '--checkpoint', str(ckpt)]) == 0
+        records = _ndjson(out.read_text())
+        assert sorted(r['index'] for r in records) == list(range(len(queries)))
+        assert load_checkpoint(str(ckpt), queries) == set(range(len(queries)))
+        assert fake.stats['searches'] > searches
+
+    def test_checkpoint_for_other_input_is_refused(self, tmp_path):
+        ckpt = tmp_path / 'run.ckpt'
+        ckpt.write_text(json.dumps({'index': 0, 'query': 'Someone Else'}) + '\n')
+        queries = [{'raw': 'Nathanael Loch', 'name': 'Nathanael Loch', 'club': '', 'is_single': False}]
+        with pytest.raises(CheckpointMismatch):
+            load_checkpoint(str(ckpt), queries)
+
+    @patch('chess_grading.get_session_and_token', return_value=(None, None))
+    def test_failures_are_not_checkpointed(self, _, tmp_path):
+        (tmp_path / 'entries.txt').write_text("Nathanael Loch\n")
+        ckpt = tmp_path / 'run.ckpt'
+        out = tmp_path / 'out.ndjson'
+        assert main([str(tmp_path / 'entries.txt'), '-o', str(out), '--checkpoint', str(ckpt)]) == 1
+        assert out.read_text() == ''
+        assert ckpt.read_text() == ''
+
+    def test_each_file_has_its_own_sticky_club(self, tmp_path):
+        (tmp_path / 'a.txt').write_text("st:\nNathanael Loch\n")
+        (tmp_path / 'b.txt').write_text("Anna Smith\n")
+        queries = read_queries([str(tmp_path / 'a.txt'), str(tmp_path / 'b.txt')])
+        assert [q['club'] for q in queries] == ['st', '']
@@ -0,0 +1,50 @@
+"""
+Tests for the benchmark suite's generators and regression report
+
+Run with: pytest tests/
+"""
+
+from chess_grading import parse_queries, parse_results
+from benchmarks import generators, suite
+
+
+class TestGenerators:
+    def test_results_html_parses_to_requested_rows(self):
+        rows = parse_results(generators.results_html(25))
+        assert len(rows) == 25
+        assert len({r.pnum for r in rows}) == 25
+
+    def test_generators_are_deterministic(self):
+        assert generators.pasted_input(50, seed=3) == generators.pasted_input(50, seed=3)
+
+    def test_pasted_input_covers_every_style(self):
+        queries, _ = parse_queries(generators.pasted_input(200))
+        assert any(q.get('pnum') for q in queries)
+        assert any(q['club'] for q in queries)
+        assert any(q['is_single'] for q in queries)
+
+    def test_results_map_covers_every_outcome(self):
+        results = generators.results_map(50)
+        assert any(not matches for matches in results.values())
+        assert any(len(matches) > 1 for matches in results.values())
+        assert any(matches and isinstance(matches[0], dict) for matches in results.values())
+
+
+class TestCompare:
+    def test_verdicts(self):
+        rows = suite.compare({'a': 1.3, 'b': 1.0, 'c': 0.5, 'd': 1.0}, {'a': 1.0, 'b': 1.0, 'c': 1.0}, threshold=0.25)
+        assert [r[4] for r in rows] == ['REGRESSION', 'ok', 'faster', 'new']
+
+    def test_report_counts_regressions(self):
+        report = suite.format_report(suite.compare({'a': 2e-3}, {'a': 1e-3}), 0.25)
+        assert "2.00 ms" in report
+        assert "1 regression(s)" in report
+
+    def test_save_merges_with_existing_baseline(self, tmp_path):
+        path = str(tmp_path / "baseline.json")
+        suite.save_baseline({'a': 1.0}, path)
+        suite.save_baseline({'b': 2.0}, path)
+        assert suite.load_baseline(path) == {'a': 1.0, 'b': 2.0}
+
+    def test_measure_returns_per_call_time(self):
+        assert 0 < suite.measure(lambda: None, min_time=0.001, repeats=2) < 1e-3
@@ -5,6 +5,10 @@ Run with: pytest tests/
 Network calls are mocked throughout; no internet connection is required.
 """
 
+import asyncio
+import threading
+import time
+
 import pytest
 from unittest.mock import patch, MagicMock
 
@@ -117,6 +121,181 @@ class TestParseResults:
         assert "Smith, John" in names
 
 
+# ---------------------------------------------------------------------------
+# parse_results — fast lxml path vs BeautifulSoup reference
+# ---------------------------------------------------------------------------
+
+ODD_MARKUP_HTML = """
+<div class="results">
+<table>
+  <thead><tr><th>PNUM</th><th>Name</th></tr></thead>
+  <tr>
+    <td data-column="pnum"> 1 </td>
+    <td data-column="name"><a href="#"> Doe, <b>Jane</b> </a><!-- note --></td>
+    <td class="club"> DN, CW </td>
+    <td data-column="status">J?</td>
+    <td data-column="standard_published">&nbsp;-&nbsp;</td>
+    <td data-column="standard_live"><span>1 2</span>34</td>
+    <td data-column="blitz_live">&#8212;</td>
+  </tr>
+  <tr><td data-column="pnum">2</td><td data-column="name">Only, Two</td></tr>
+  <tr><td data-column="pnum">3</td><td data-column="name">Club, Tagged</td><td data-column="club">ED</td>
+      <td data-column="status">NEW</td><td data-column="status">A</td></tr>
+  <tr><td data-column="name">No, Pnum</td></tr>
+  <tr><td data-column="pnum">4</td><td data-column="name">Nested, Table</td>
+      <td><table><tr><td data-column="pnum">5</td><td data-column="name">Inner, Row</td></tr></table></td>
+  </tr>
+  <tr><td data-column="pnum"></td><td data-column="name"></td><td></td><td data-column="status">J7</td></tr>
+</table>
+</div>
+"""
+
+
+class TestFastParser:
+    @pytest.mark.parametrize("html_content", [
+        SAMPLE_HTML,
+        ODD_MARKUP_HTML,
+        "<p>No players found</p>",
+        "   ",
+        "<tr><td data-column='pnum'>9</td><td data-column='name'>Bare, Row</td><td>ST</td></tr>",
+    ])
+    def test_matches_beautifulsoup_output(self, html_content):
+        fast = chess_grading._parse_results_lxml(html_content)
+        assert fast is not None
+        assert fast == chess_grading._parse_results_bs4(html_content)
+        assert [list(p) for p in fast] == [list(p) for p in chess_grading._parse_results_bs4(html_content)]
+
+    def test_default_and_forced_bs4_agree(self):
+        assert parse_results(ODD_MARKUP_HTML) == parse_results(ODD_MARKUP_HTML, fast=False)
+
+    def test_script_and_template_text_skipped_like_beautifulsoup(self):
+        html_content = SAMPLE_HTML.replace(
+            "Loch, Nathanael",
+            "Loch, <script>x()</script>Nath<template>t<b>b</b></template>anael<style>s</style>",
+        )
+        fast = chess_grading._parse_results_lxml(html_content)
+        assert fast == chess_grading._parse_results_bs4(html_content)
+        assert fast[0]['name'] == "Loch,Nathanael"
+
+    def test_bytes_input_uses_beautifulsoup(self):
+        assert chess_grading._parse_results_lxml(SAMPLE_HTML.encode()) is None
+        assert parse_results(SAMPLE_HTML.encode()) == parse_results(SAMPLE_HTML)
+
+
+# ---------------------------------------------------------------------------
+# iter_results — streaming parser
+# ---------------------------------------------------------------------------
+
+class TestIterResults:
+    @pytest.mark.parametrize("html_content", [SAMPLE_HTML, ODD_MARKUP_HTML, "<p>none</p>"])
+    def test_matches_parse_results(self, html_content):
+        assert list(chess_grading.iter_results(html_content)) == parse_results(html_content, fast=False)
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64])
+    def test_small_chunks(self, chunk_size):
+        results = list(chess_grading.iter_results(ODD_MARKUP_HTML, chunk_size=chunk_size))
+        assert results == parse_results(ODD_MARKUP_HTML)
+
+    def test_binary_file_and_chunk_iterable(self):
+        import io
+        data = SAMPLE_HTML.replace("Nathanael", "Nathanaël").encode('utf-8')
+        expected = parse_results(data.decode('utf-8'))
+        assert list(chess_grading.iter_results(io.BytesIO(data), chunk_size=5)) == expected
+        assert list(chess_grading.iter_results(data[i:i + 3] for i in range(0, len(data), 3))) == expected
+
+    def test_empty_source_yields_nothing(self):
+        assert list(chess_grading.iter_results("")) == []
+        assert list(chess_grading.iter_results(iter([]))) == []
+
+    def test_yields_before_input_is_exhausted(self):
+        consumed = []
+
+        def chunks():
+            for i in range(3):
+                consumed.append(i)
+                yield f'<tr><td data-column="pnum">{i}</td><td data-column="name">P, {i}</td></tr>'
+            consumed.append('end')
+
+        stream = chess_grading.iter_results(chunks())
+        first = next(stream)
+        assert first['pnum'] == '0'
+        assert 'end' not in consumed
+
+    def test_finished_rows_are_discarded(self):
+        from lxml import etree
+        table = '<table>' + ''.join(
+            f'<tr><td data-column="pnum">{i}</td><td data-column="name">P, {i}</td></tr>'
+            for i in range(500)
+        ) + '</table>'
+        parser = etree.HTMLPullParser(events=('end',), tag='tr')
+        parser.feed(table)
+        rows = list(chess_grading._drain_rows(parser))
+        root = parser.close()
+
+        assert len(rows) == 500
+        # Only the last (cleared) row is still attached to the table
+        assert len(root.findall('.//tr')) <= 1
+        assert root.findall('.//td') == []
+
+
+# ---------------------------------------------------------------------------
+# Player record
+# ---------------------------------------------------------------------------
+
+class TestPlayer:
+    def _player(self):
+        return parse_results(SAMPLE_HTML)[0]
+
+    def test_parse_results_returns_players(self):
+        assert all(isinstance(p, chess_grading.Player) for p in parse_results(SAMPLE_HTML))
+
+    def test_has_no_instance_dict(self):
+        assert not hasattr(self._player(), '__dict__')
+
+    def test_to_dict_matches_old_player_dict(self):
+        assert self._player().to_dict() == {
+            "pnum": "12345", "name": "Loch, Nathanael", "club": "ST", "age": "Adult",
+            "standard_published": "1650", "standard_live": "1680",
+            "allegro_published": "", "allegro_live": "",
+            "blitz_published": "", "blitz_live": "",
+        }
+
+    def test_dict_style_access(self):
+        player = self._player()
+        assert player['name'] == "Loch, Nathanael"
+        assert player.get('club') == "ST"
+        assert player.get('match_type') is None
+        assert 'match_type' not in player
+        with pytest.raises(KeyError):
+            player['match_type']
+        assert dict(player) == player.to_dict()
+
+    def test_with_match_type_returns_tagged_copy(self):
+        player = self._player()
+        tagged = player.with_match_type('name')
+        assert tagged['match_type'] == 'name'
+        assert tagged.to_dict()['match_type'] == 'name'
+        assert player.match_type is None
+
+    def test_integer_grades(self):
+        player = self._player()
+        assert player.grade_value('standard_published') == 1650
+        assert player.grade_value('blitz_published') is None
+
+    def test_interns_repeated_strings(self):
+        first, second = parse_results(SAMPLE_HTML.replace("ED", "ST"))
+        assert first.club is second.club
+
+    def test_round_trips_through_from_dict(self):
+        player = self._player().with_match_type('pnum')
+        assert chess_grading.Player.from_dict(player.to_dict()) == player
+
+    def test_equality_with_dict(self):
+        player = self._player()
+        assert player == player.to_dict()
+        assert player != dict(player.to_dict(), pnum="1")
+
+
 # ---------------------------------------------------------------------------
 # get_club_code
 # ---------------------------------------------------------------------------
@@ -158,6 +337,27 @@ class TestGetClubCode:
     def test_no_match_returns_empty(self):
         assert get_club_code("ZZZNoSuchClub") == ""
 
+    def test_equal_length_names_tie_break_in_file_order(self):
+        chess_grading.CLUB_DATA = {
+            'alpha chess': {'code': 'AC', 'display': 'Alpha Chess'},
+            'gamma chess': {'code': 'GC', 'display': 'Gamma Chess'},
+            'chess': {'code': 'CH', 'display': 'Chess'},
+        }
+        assert get_club_code("a ches") == "AC"
+        assert get_club_code("chess") == "CH"
+        assert get_club_code("ma c") == "GC"
+
+    def test_two_char_name_fragment_when_not_a_code(self):
+        chess_grading.CLUB_DATA = {'oban': {'code': 'OB', 'display': 'Oban'}}
+        assert get_club_code("ba") == "OB"
+
+    def test_index_follows_replaced_club_data(self):
+        assert get_club_code("Stirling") == "ST"
+        chess_grading.CLUB_DATA = {'stirling': {'code': 'XS', 'display': 'Stirling'}}
+        assert get_club_code("Stirling") == "XS"
+        # "ST" is no longer a known code, so it resolves as a name fragment
+        assert get_club_code("ST") == "XS"
+
 
 # ---------------------------------------------------------------------------
 # get_clubs_list
@@ -287,6 +487,506 @@ class TestGetPlayerGrading:
         assert result == {}
 
 
+# ---------------------------------------------------------------------------
+# get_player_grading — concurrent fan-out
+# ---------------------------------------------------------------------------
+
+def _row_html(pnum, name):
+    return (
+        f'<tr><td data-column="pnum">{pnum}</td><td data-column="name">{name}</td>'
+        f'<td>ST</td><td data-column="status">A</td></tr>'
+    )
+
+
+class TestConcurrentFanOut:
+    """Sub-requests run in parallel but results keep their sequential shape."""
+
+    def _make_tracking_session(self, delay=0.02):
+        state = {'active': 0, 'peak': 0}
+        lock = threading.Lock()
+
+        def post(url, headers=None, files=None, timeout=None):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(delay)
+            with lock:
+                state['active'] -= 1
+            surname = files['surname'][1]
+            pnum = files['pnum'][1]
+            response = MagicMock()
+            if pnum:
+                response.json.return_value = {'html': _row_html(pnum, "Pnum, Player")}
+            else:
+                # One row per surname, plus a shared row to exercise dedup
+                response.json.return_value = {
+                    'html': '<table>' + _row_html(f"1{len(surname)}", f"{surname}, X")
+                            + _row_html("777", "Shared, Player") + '</table>'
+                }
+            return response
+
+        session = MagicMock()
+        session.post.side_effect = post
+        return session, state
+
+    @patch('chess_grading.get_session_and_token')
+    def test_results_match_sequential_mode(self, mock_init):
+        queries = [
+            {'raw': 'nat loc', 'name': 'nat loc', 'club': '', 'is_single': False},
+            {'raw': '[12345]', 'pnum': '12345', 'name': '', 'club': '', 'is_single': False},
+            {'raw': 'Loch', 'name': 'Loch', 'club': '', 'is_single': True},
+        ]
+        session, _ = self._make_tracking_session(delay=0)
+        mock_init.return_value = (session, 'fake_token')
+        sequential = get_player_grading(queries, max_in_flight=1)
+
+        session, _ = self._make_tracking_session()
+        mock_init.return_value = (session, 'fake_token')
+        concurrent = get_player_grading(queries, max_in_flight=4)
+
+        assert concurrent == sequential
+        assert list(concurrent) == ['nat loc', '[12345]', 'Loch']
+        assert [p['pnum'] for p in concurrent['nat loc']] == ['13', '777']
+        assert all(p['match_type'] == 'name' for p in concurrent['nat loc'])
+        assert concurrent['[12345]'][0]['match_type'] == 'pnum'
+
+    @patch('chess_grading.get_session_and_token')
+    def test_max_in_flight_is_respected(self, mock_init):
+        session, state = self._make_tracking_session()
+        mock_init.return_value = (session, 'fake_token')
+
+        queries = [
+            {'raw': f'name{i}', 'name': f'first{i} last{i} other{i}', 'club': '', 'is_single': False}
+            for i in range(4)
+        ]
+        get_player_grading(queries, max_in_flight=3)
+
+        assert session.post.call_count == 12
+        assert 1 < state['peak'] <= 3
+
+    @patch('chess_grading.get_session_and_token')
+    def test_max_in_flight_one_is_sequential(self, mock_init):
+        session, state = self._make_tracking_session(delay=0.005)
+        mock_init.return_value = (session, 'fake_token')
+
+        queries = [{'raw': 'a b c', 'name': 'abc def ghi', 'club': '', 'is_single': False}]
+        get_player_grading(queries, max_in_flight=1)
+
+        assert state['peak'] == 1
+
+
+# ---------------------------------------------------------------------------
+# Request coalescing
+# ---------------------------------------------------------------------------
+
+class TestRequestCoalescing:
+    @patch('chess_grading.get_session_and_token')
+    def test_identical_searches_in_batch_fetched_once(self, mock_init):
+        session = MagicMock()
+        session.post.return_value = MagicMock(**{'json.return_value': {'html': SAMPLE_HTML}})
+        mock_init.return_value = (session, 'tok')
+
+        queries = [
+            {'raw': 'Smith', 'name': 'Smith', 'club': '', 'is_single': True},
+            {'raw': 'smith', 'name': 'smith', 'club': '', 'is_single': True},
+            {'raw': 'John Smith', 'name': 'John Smith', 'club': '', 'is_single': False},
+        ]
+        result = get_player_grading(queries)
+
+        # Smith/smith share both searches; "John Smith" adds two more
+        assert session.post.call_count == 4
+        assert result['Smith'] == result['smith']
+        # Shared rows are copied, not aliased between lines
+        assert result['Smith'][0] is not result['smith'][0]
+
+    def test_single_flight_shares_concurrent_calls(self):
+        flight = chess_grading.SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            return ['rows']
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('k', slow)))
+        leader.start()
+        started.wait(2)
+        followers = [
+            threading.Thread(target=lambda: results.append(flight.do('k', slow)))
+            for _ in range(3)
+        ]
+        for t in followers:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in [leader] + followers:
+            t.join()
+
+        assert calls == [1]
+        assert results == [['rows']] * 4
+
+    def test_single_flight_propagates_errors_and_forgets_key(self):
+        flight = chess_grading.SingleFlight()
+
+        def boom():
+            raise ValueError("nope")
+
+        with pytest.raises(ValueError):
+            flight.do('k', boom)
+        assert flight.do('k', lambda: 42) == 42
+
+    @patch('chess_grading.get_session_and_token')
+    def test_concurrent_batches_share_in_flight_search(self, mock_init):
+        gate = threading.Event()
+
+        def post(url, headers=None, files=None, timeout=None):
+            gate.wait(2)
+            return MagicMock(**{'json.return_value': {'html': SAMPLE_HTML}})
+
+        session = MagicMock()
+        session.post.side_effect = post
+        mock_init.return_value = (session, 'tok')
+
+        query = [{'raw': '[12345]', 'pnum': '12345', 'name': '', 'club': '', 'is_single': False}]
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(get_player_grading(query)))
+                   for _ in range(3)]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        gate.set()
+        for t in threads:
+            t.join()
+
+        assert session.post.call_count == 1
+        assert len(results) == 3
+        assert all(r['[12345]'][0]['pnum'] == '12345' for r in results)
+
+
+# ---------------------------------------------------------------------------
+# get_player_grading — request-minimising planner
+# ---------------------------------------------------------------------------
+
+class TestSearchPlanner:
+    """planner=True stops after the most likely permutation when it is conclusive."""
+
+    def _make_session(self, rows_by_surname):
+        def post(url, headers=None, files=None, timeout=None):
+            rows = rows_by_surname.get(files['surname'][1], [])
+            html = '<table>' + ''.join(_row_html(p, n) for p, n in rows) + '</table>'
+            return MagicMock(**{'json.return_value': {'html': html}})
+
+        session = MagicMock()
+        session.post.side_effect = post
+        return session
+
+    def _surnames(self, session):
+        return [c[1]['files']['surname'][1] for c in session.post.call_args_list]
+
+    @patch('chess_grading.get_session_and_token')
+    def test_exact_match_on_first_permutation_stops_early(self, mock_init):
+        session = self._make_session({'Loch': [('12345', 'Loch, Nathanael')]})
+        mock_init.return_value = (session, 'tok')
+        stats = {}
+
+        queries = [{'raw': 'Nathanael Loch', 'name': 'Nathanael Loch', 'club': '', 'is_single': False}]
+        result = get_player_grading(queries, planner=True, stats=stats)
+
+        assert self._surnames(session) == ['Loch']
+        assert [p['pnum'] for p in result['Nathanael Loch']] == ['12345']
+        assert result['Nathanael Loch'][0]['match_type'] == 'name'
+        assert stats == {'requests': 1, 'cache_hits': 0, 'mirror_hits': 0, 'requests_saved': 1, 'suggested': 0}
+
+    @patch('chess_grading.get_session_and_token')
+    def test_partial_match_falls_back_to_other_permutations(self, mock_init):
+        # "nat loc" only partially matches "Loch, Nathanael", so it is not conclusive
+        session = self._make_session({'loc': [('12345', 'Loch, Nathanael')],
+                                      'nat': [('555', 'Natt, Lochlan')]})
+        mock_init.return_value = (session, 'tok')
+        stats = {}
+
+        queries = [{'raw': 'nat loc', 'name': 'nat loc', 'club': '', 'is_single': False}]
+        result = get_player_grading(queries, planner=True, stats=stats)
+
+        assert self._surnames(session) == ['loc', 'nat']
+        assert [p['pnum'] for p in result['nat loc']] == ['12345', '555']
+        assert stats['requests_saved'] == 0
+
+    @patch('chess_grading.get_session_and_token')
+    def test_multiple_results_are_not_conclusive(self, mock_init):
+        session = self._make_session({'Smith': [('1', 'Smith, John'), ('2', 'Smith, Johnny')]})
+        mock_init.return_value = (session, 'tok')
+
+        queries = [{'raw': 'John Smith', 'name': 'John Smith', 'club': '', 'is_single': False}]
+        get_player_grading(queries, planner=True)
+
+        assert session.post.call_count == 2
+
+    @patch('chess_grading.get_session_and_token')
+    def test_orders_permutations_by_likelihood(self, mock_init):
+        session = self._make_session({})
+        mock_init.return_value = (session, 'tok')
+
+        queries = [{'raw': 'a b c d', 'name': 'Anna Beth Carr Dunn', 'club': '', 'is_single': False}]
+        get_player_grading(queries, planner=True, max_in_flight=1)
+
+        assert self._surnames(session) == ['Dunn', 'Anna', 'Beth', 'Carr']
+
+    @patch('chess_grading.get_session_and_token')
+    def test_request_budget_caps_fallback(self, mock_init):
+        session = self._make_session({})
+        mock_init.return_value = (session, 'tok')
+        stats = {}
+
+        queries = [{'raw': 'x', 'name': 'Anna Beth Carr', 'club': '', 'is_single': False}]
+        get_player_grading(queries, planner=True, max_requests_per_query=2, stats=stats)
+
+        assert self._surnames(session) == ['Carr', 'Anna']
+        assert stats['requests_saved'] == 1
+
+    @patch('chess_grading.get_session_and_token')
+    def test_default_mode_still_tries_every_permutation(self, mock_init):
+        session = self._make_session({'Loch': [('12345', 'Loch, Nathanael')]})
+        mock_init.return_value = (session, 'tok')
+
+        queries = [{'raw': 'Nathanael Loch', 'name': 'Nathanael Loch', 'club': '', 'is_single': False}]
+        get_player_grading(queries)
+
+        assert session.post.call_count == 2
+
+
+# ---------------------------------------------------------------------------
+# SessionManager — session/token reuse and re-authentication
+# ---------------------------------------------------------------------------
+
+def _response(status=200, payload=None):
+    response = MagicMock()
+    response.status_code = status
+    response.json.return_value = payload if payload is not None else {'html': SAMPLE_HTML}
+    return response
+
+
+class TestSessionManager:
+    @patch('chess_grading.get_session_and_token')
+    def test_reuses_session_across_calls(self, mock_init):
+        session = MagicMock()
+        session.post.return_value = _response()
+        mock_init.return_value = (session, 'tok')
+        manager = chess_grading.SessionManager()
+
+        queries = [{'raw': '[12345]', 'pnum': '12345', 'name': '', 'club': '', 'is_single': False}]
+        get_player_grading(queries, sessions=manager)
+        get_player_grading(queries, sessions=manager)
+
+        assert mock_init.call_count == 1
+        assert session.post.call_count == 2
+
+    @patch('chess_grading.get_session_and_token')
+    def test_refreshes_when_older_than_max_age(self, mock_init):
+        mock_init.return_value = (MagicMock(), 'tok')
+        manager = chess_grading.SessionManager(max_age=60)
+
+        with patch('chess_grading.time.monotonic', return_value=0):
+            manager.get()
+        with patch('chess_grading.time.monotonic', return_value=30):
+            manager.get()
+        assert mock_init.call_count == 1
+        with patch('chess_grading.time.monotonic', return_value=100):
+            manager.get()
+        assert mock_init.call_count == 2
+
+    @patch('chess_grading.get_session_and_token')
+    def test_retries_once_with_fresh_token_on_rejection(self, mock_init):
+        stale_session = MagicMock()
+        stale_session.post.return_value = _response(status=419)
+        fresh_session = MagicMock()
+        fresh_session.post.return_value = _response()
+        mock_init.side_effect = [(stale_session, 'old'), (fresh_session, 'new')]
+        manager = chess_grading.SessionManager()
+
+        html = manager.search("", "", pnum="12345")
+
+        assert html == SAMPLE_HTML
+        assert stale_session.post.call_count == 1
+        assert fresh_session.post.call_count == 1
+        assert fresh_session.post.call_args[1]['files']['_csrf_token'] == (None, 'new')
+
+    @patch('chess_grading.get_session_and_token')
+    def test_json_token_error_treated_as_stale(self, mock_init):
+        stale_session = MagicMock()
+        stale_session.post.return_value = _response(payload={'error': 'Invalid CSRF token'})
+        fresh_session = MagicMock()
+        fresh_session.post.return_value = _response()
+        mock_init.side_effect = [(stale_session, 'old'), (fresh_session, 'new')]
+
+        assert chess_grading.SessionManager().search("", "loch") == SAMPLE_HTML
+
+    @patch('chess_grading.get_session_and_token')
+    def test_token_text_elsewhere_in_json_is_not_stale(self, mock_init):
+        session = MagicMock()
+        session.post.return_value = _response(payload={'results': [], 'club': 'Token Chess Club'})
+        mock_init.return_value = (session, 'tok')
+
+        assert chess_grading.SessionManager().search("", "token") is None
+        assert session.post.call_count == 1
+        assert mock_init.call_count == 1
+
+    @patch('chess_grading.get_session_and_token')
+    def test_gives_up_after_one_retry(self, mock_init):
+        session = MagicMock()
+        session.post.return_value = _response(status=403)
+        mock_init.return_value = (session, 'tok')
+
+        assert chess_grading.SessionManager().search("", "loch") is None
+        assert session.post.call_count == 2
+        assert mock_init.call_count == 2
+
+    @patch('chess_grading.get_session_and_token')
+    def test_concurrent_rejections_refresh_once(self, mock_init):
+        mock_init.side_effect = [(MagicMock(), 'old'), (MagicMock(), 'new')]
+        manager = chess_grading.SessionManager()
+        manager.get()
+
+        assert manager.refresh(stale_token='old')[1] == 'new'
+        # A second thread that saw the same stale token reuses the new pair
+        assert manager.refresh(stale_token='old')[1] == 'new'
+        assert mock_init.call_count == 2
+
+    def test_search_player_returns_none_on_stale_token(self):
+        session = MagicMock()
+        session.post.return_value = _response(status=419)
+        assert chess_grading.search_player(session, 'tok', '', 'loch') is None
+
+
+# ---------------------------------------------------------------------------
+# get_player_grading_async — against an in-process aiohttp server
+# ---------------------------------------------------------------------------
+
+class TestGetPlayerGradingAsync:
+    """Runs the async pipeline end to end against a local aiohttp app."""
+
+    def _run(self, queries, statuses=(), tokens=('tok123',), lookups=None, **kwargs):
+        """
+        statuses: handle-form replies with these statuses first, in order.
+        tokens: the grading page hands these out in turn; only the latest is accepted.
+        lookups: coroutine function (queries) -> result, run instead of a single call.
+        """
+        from aiohttp import web
+        from aiohttp.test_utils import TestServer
+
+        received = []
+        replies = list(statuses)
+        issued = []
+
+        async def grading(request):
+            issued.append(tokens[min(len(issued), len(tokens) - 1)])
+            return web.Response(
+                text=f'<form><input type="hidden" name="_csrf_token" value="{issued[-1]}"></form>',
+                content_type='text/html',
+            )
+
+        async def handle_form(request):
+            form = await request.post()
+            received.append(dict(form))
+            if replies:
+                return web.Response(status=replies.pop(0))
+            if form['_csrf_token'] != issued[-1]:
+                return web.Response(status=419)
+            await asyncio.sleep(0.01)
+            return web.json_response({'html': SAMPLE_HTML})
+
+        async def main():
+            app = web.Application()
+            app.router.add_get('/grading', grading)
+            app.router.add_post('/handle-form', handle_form)
+            server = TestServer(app)
+            await server.start_server()
+            try:
+                with patch.object(chess_grading, 'BASE_URL', str(server.make_url('/grading'))), \
+                        patch.object(chess_grading, 'API_URL', str(server.make_url('/handle-form'))), \
+                        patch.object(chess_grading, 'RETRY_POLICY', chess_grading.RetryPolicy(attempts=3, base=0.01, cap=0.05)):
+                    if lookups is not None:
+                        return await lookups(queries)
+                    return await chess_grading.get_player_grading_async(queries, **kwargs)
+            finally:
+                await server.close()
+
+        return asyncio.run(main()), received
+
+    def test_returns_same_shape_as_sync(self):
+        queries = [
+            {'raw': 'nat loc', 'name': 'nat loc', 'club': '', 'is_single': False},
+            {'raw': '[12345]', 'pnum': '12345', 'name': '', 'club': '', 'is_single': False},
+        ]
+        result, received = self._run(queries)
+
+        assert list(result) == ['nat loc', '[12345]']
+        # Both permutations return the same two players; dedup keeps one of each
+        assert [p['pnum'] for p in result['nat loc']] == ['12345', '99999']
+        assert all(p['match_type'] == 'name' for p in result['nat loc'])
+        assert all(p['match_type'] == 'pnum' for p in result['[12345]'])
+        assert len(received) == 3
+
+    def test_sends_multipart_search_fields(self):
+        queries = [{'raw': '[12345]', 'pnum': '12345', 'name': '', 'club': '', 'is_single': False}]
+        _, received = self._run(queries)
+
+        form = received[0]
+        assert form['action'] == 'search_players'
+        assert form['pnum'] == '12345'
+        assert form['forename'] == ''
+
+    def test_short_name_returns_invalid_marker(self):
+        queries = [{'raw': 'Xq', 'name': 'Xq', 'club': '', 'is_single': True}]
+        result, received = self._run(queries)
+
+        assert result['Xq'] == [{'invalid_query': True}]
+        assert received == []
+
+    def test_retries_transient_failures(self):
+        queries = [{'raw': '[12345]', 'pnum': '12345', 'name': '', 'club': '', 'is_single': False}]
+        result, received = self._run(queries, statuses=[503, 502])
+
+        assert [p['pnum'] for p in result['[12345]']] == ['12345', '99999']
+        assert len(received) == 3
+
+    def test_stale_token_is_refreshed_once(self):
+        queries = [{'raw': '[12345]', 'pnum': '12345', 'name': '', 'club': '', 'is_single': False}]
+        result, received = self._run(queries, statuses=[419], tokens=('old', 'new'))
+
+        assert [p['pnum'] for p in result['[12345]']] == ['12345', '99999']
+        assert [form['_csrf_token'] for form in received] == ['old', 'new']
+
+    def test_searches_are_only_shared_within_a_session(self):
+        queries = [{'raw': '[12345]', 'pnum': '12345', 'name': '', 'club': '', 'is_single': False}]
+
+        async def lookups(queries):
+            async with chess_grading.new_async_session() as a, chess_grading.new_async_session() as b:
+                return await asyncio.gather(
+                    chess_grading.get_player_grading_async(queries, http=a),
+                    chess_grading.get_player_grading_async(queries, http=a),
+                    chess_grading.get_player_grading_async(queries, http=b),
+                )
+
+        results, received = self._run(queries, lookups=lookups)
+
+        assert all(list(result) == ['[12345]'] for result in results)
+        assert len(received) == 2
+
+    def test_failed_bootstrap_returns_empty_dict(self):
+        async def main():
+            with patch.object(chess_grading, 'get_csrf_token_async', return_value=None):
+                return await chess_grading.get_player_grading_async(
+                    [{'raw': 'John Smith', 'name': 'John Smith', 'club': '', 'is_single': False}]
+                )
+
+        assert asyncio.run(main()) == {}
+
+
 # ---------------------------------------------------------------------------
 # _clean_name
 # ---------------------------------------------------------------------------
@@ -0,0 +1,144 @@
+"""
+Tests for fake_server.py
+
+Run with: pytest tests/
+"""
+
+import random
+
+import pytest
+import requests
+
+import chess_grading
+from chess_grading import parse_queries, parse_results, get_player_grading
+from fake_server import FakeChessScotland, build_federation, parse_latency, render_results
+
+
+def _a_player(site):
+    return next(row for row in site.federation if ',' not in row['club'])
+
+
+# ---------------------------------------------------------------------------
+# Federation and configuration
+# ---------------------------------------------------------------------------
+
+class TestFederation:
+
+    def test_is_deterministic_for_a_seed(self):
+        assert build_federation(50, seed=1) == build_federation(50, seed=1)
+        assert build_federation(50, seed=1) != build_federation(50, seed=2)
+
+    def test_players_belong_to_known_clubs(self):
+        codes = {v['code'] for v in chess_grading.CLUB_DATA.values()}
+        for row in build_federation(100):
+            assert all(c.strip() in codes for c in row['club'].split(','))
+
+    def test_rendered_table_parses_back(self):
+        rows = build_federation(20)
+        players = parse_results(render_results(rows))
+        assert [p.pnum for p in players] == [r['pnum'] for r in rows]
+        assert players[0].standard_published == rows[0]['standard_published']
+
+    def test_empty_results_parse_as_no_players(self):
+        assert parse_results(render_results([])) == []
+
+
+class TestParseLatency:
+
+    def test_fixed(self):
+        assert parse_latency("0.25")(random.Random()) == 0.25
+        assert parse_latency("fixed:0.1")(random.Random()) == 0.1
+
+    def test_uniform_stays_in_bounds(self):
+        draw = parse_latency("uniform:0.1-0.2")
+        rng = random.Random(0)
+        assert all(0.1 <= draw(rng) <= 0.2 for _ in range(100))
+
+    def test_lognormal_is_centred_on_median(self):
+        draw = parse_latency("lognormal:0.2,0.5")
+        rng = random.Random(0)
+        samples = sorted(draw(rng) for _ in range(1001))
+        assert 0.15 < samples[500] < 0.25
+
+    def test_unknown_distribution_raises(self):
+        with pytest.raises(ValueError):
+            parse_latency("pareto:1")
+
+
+# ---------------------------------------------------------------------------
+# Search matching
+# ---------------------------------------------------------------------------
+
+class TestSearch:
+
+    @pytest.fixture
+    def site(self):
+        return FakeChessScotland(players=300, seed=5)
+
+    def test_pnum_is_exact(self, site):
+        row = site.federation[7]
+        assert site.search(pnum=row['pnum']) == [row]
+        assert site.search(pnum=row['pnum'][:-1]) == []
+
+    def test_name_parts_are_case_insensitive_substrings(self, site):
+        row = site.federation[0]
+        surname, forename = (p.strip() for p in row['name'].split(','))
+        found = site.search(forename=forename[:3].upper(), surname=surname[1:4].lower())
+        assert row in found
+        for match in found:
+            s, f = (p.strip().lower() for p in match['name'].split(','))
+            assert forename[:3].lower() in f and surname[1:4].lower() in s
+
+    def test_club_filters_and_lists_roster(self, site):
+        row = _a_player(site)
+        roster = site.search(club=row['club'])
+        assert row in roster
+        assert all(row['club'] in r['club'] for r in roster)
+        surname = row['name'].split(',')[0]
+        assert all(row['club'] in r['club'] for r in site.search(surname=surname, club=row['club']))
+
+    def test_blank_search_returns_nothing(self, site):
+        assert site.search() == []
+
+
+# ---------------------------------------------------------------------------
+# Over HTTP
+# ---------------------------------------------------------------------------
+
+class TestServer:
+
+    def test_end_to_end_lookup(self, fake):
+        row = _a_player(fake)
+        surname, forename = (p.strip() for p in row['name'].split(','))
+        queries, _ = parse_queries(f"{forename} {surname}; {row['club']}\n[{row['pnum']}]")
+        results = get_player_grading(queries)
+
+        assert row['pnum'] in [p.pnum for p in results[f"{forename} {surname}; {row['club']}"]]
+        assert [p.pnum for p in results[f"[{row['pnum']}]"]] == [row['pnum']]
+        assert fake.stats['pages'] == 1
+        assert fake.stats['searches'] >= 2
+
+    def test_unknown_token_is_rejected_with_419(self, fake):
+        response = requests.post(chess_grading.API_URL, files={
+            'action': (None, 'search_players'), '_csrf_token': (None, 'forged'), 'surname': (None, 'Loch'),
+        })
+        assert response.status_code == 419
+        assert fake.stats['token_rejections'] == 1
+
+    def test_expired_token_is_rejected(self, fake):
+        session, token = chess_grading.get_session_and_token()
+        fake.token_ttl = -1
+        with pytest.raises(chess_grading.StaleTokenError):
+            chess_grading._post_search(session, token, "", "Loch")
+
+    def test_injected_errors_are_retried(self, fake):
+        fake.error_rate = 0.5
+        fake.error_statuses = (502, 503)
+        row = _a_player(fake)
+        queries, _ = parse_queries(f"[{row['pnum']}]")
+        results = get_player_grading(queries)
+        assert [p.pnum for p in results[f"[{row['pnum']}]"]] == [row['pnum']]
+        assert fake.stats['searches'] == 1
+
+    def test_unknown_paths_are_404(self, fake):
+        assert requests.get(fake.url + "/nowhere").status_code == 404
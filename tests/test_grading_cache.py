@@ -0,0 +1,263 @@
+"""
+Tests for grading_cache.py
+
+Run with: pytest tests/
+"""
+
+from unittest.mock import patch, MagicMock
+
+import threading
+
+import pytest
+import requests
+
+from chess_grading import Player, get_player_grading, search_key
+from grading_cache import LookupCache, ResponseCache
+
+ROWS = [{'pnum': '12345', 'name': 'Loch, Nathanael', 'club': 'ST', 'age': 'Adult',
+         'standard_published': '1650', 'standard_live': '1680',
+         'allegro_published': '', 'allegro_live': '',
+         'blitz_published': '', 'blitz_live': ''}]
+
+ROW_HTML = """
+<table><tr>
+  <td data-column="pnum">12345</td><td data-column="name">Loch, Nathanael</td>
+  <td>ST</td><td data-column="status">A</td>
+  <td data-column="standard_published">1650</td><td data-column="standard_live">1680</td>
+</tr></table>
+"""
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    yield c
+    c.close()
+
+
+# ---------------------------------------------------------------------------
+# search_key
+# ---------------------------------------------------------------------------
+
+class TestSearchKey:
+    def test_normalises_case_and_whitespace(self):
+        assert search_key(" Nat ", "LOCH  ", "st", "") == ("nat", "loch", "ST", "")
+
+    def test_distinguishes_forename_and_surname(self):
+        assert search_key("loch", "") != search_key("", "loch")
+
+
+# ---------------------------------------------------------------------------
+# ResponseCache
+# ---------------------------------------------------------------------------
+
+class TestResponseCache:
+    def test_miss_returns_none(self, cache):
+        assert cache.get(search_key("", "loch")) is None
+
+    def test_round_trip(self, cache):
+        cache.put(search_key("", "loch"), ROWS)
+        assert cache.get(search_key("", "LOCH")) == ROWS
+
+    def test_empty_result_is_cached(self, cache):
+        cache.put(search_key("", "nobody"), [])
+        assert cache.get(search_key("", "nobody")) == []
+
+    def test_uses_wal_mode(self, cache):
+        mode = cache._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode.lower() == "wal"
+
+    def test_persists_across_instances(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite3")
+        first = ResponseCache(path)
+        first.put(search_key("", "loch"), ROWS)
+        first.close()
+
+        second = ResponseCache(path)
+        assert second.get(search_key("", "loch")) == ROWS
+        second.close()
+
+    def test_live_ttl_shorter_than_published_ttl(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "c.sqlite3"), published_ttl=1000, live_ttl=10)
+        with patch('grading_cache.time.time', return_value=0):
+            cache.put(search_key("", "loch"), ROWS)
+        with patch('grading_cache.time.time', return_value=100):
+            assert cache.get(search_key("", "loch"), need_live=True) is None
+            assert cache.get(search_key("", "loch"), need_live=False) == ROWS
+        with patch('grading_cache.time.time', return_value=2000):
+            assert cache.get(search_key("", "loch"), need_live=False) is None
+            assert cache.purge() == 1
+        cache.close()
+
+    def test_returns_player_records(self, cache):
+        cache.put(search_key("", "loch"), ROWS)
+        player = cache.get(search_key("", "loch"))[0]
+        assert isinstance(player, Player)
+        assert player.grade_value('standard_live') == 1680
+        assert 'match_type' not in player
+
+
+# ---------------------------------------------------------------------------
+# LookupCache
+# ---------------------------------------------------------------------------
+
+class TestLookupCache:
+    def test_counts_hits_and_misses(self):
+        cache = LookupCache()
+        assert cache.get(search_key("", "loch")) is None
+        cache.put(search_key("", "loch"), ROWS)
+        assert cache.get(search_key("", "loch")) == ROWS
+
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['entries'] == 1
+        assert stats['hit_rate'] == 0.5
+
+    def test_evicts_least_recently_used(self):
+        cache = LookupCache(max_entries=2)
+        cache.put(('a',), [])
+        cache.put(('b',), [])
+        cache.get(('a',))
+        cache.put(('c',), [])
+
+        assert cache.get(('b',)) is None
+        assert cache.get(('a',)) == []
+        assert cache.get(('c',)) == []
+
+    def test_evicts_by_age(self):
+        cache = LookupCache(max_age=10)
+        with patch('grading_cache.time.monotonic', return_value=0):
+            cache.put(('a',), ROWS)
+        with patch('grading_cache.time.monotonic', return_value=5):
+            assert cache.get(('a',)) == ROWS
+        with patch('grading_cache.time.monotonic', return_value=20):
+            assert cache.get(('a',)) is None
+        assert cache.stats()['entries'] == 0
+
+    def test_tagging_results_does_not_affect_cache(self):
+        cache = LookupCache()
+        cache.put(('a',), ROWS)
+        cache.get(('a',))[0].with_match_type('name')
+        assert 'match_type' not in cache.get(('a',))[0]
+        assert 'match_type' not in ROWS[0]
+
+    def test_falls_through_to_backing_and_promotes(self, cache):
+        lru = LookupCache(backing=cache)
+        cache.put(('a',), ROWS)
+
+        assert lru.get(('a',)) == ROWS
+        assert lru.stats()['misses'] == 1
+        assert lru.get(('a',)) == ROWS
+        assert lru.stats()['hits'] == 1
+
+    def test_published_promotion_is_not_served_as_live(self, tmp_path):
+        backing = ResponseCache(str(tmp_path / "c.sqlite3"), published_ttl=1000, live_ttl=10)
+        lru = LookupCache(backing=backing, published_ttl=1000, live_ttl=10)
+        with patch('grading_cache.time.time', return_value=0):
+            backing.put(('a',), ROWS)
+        with patch('grading_cache.time.time', return_value=100):
+            assert lru.get(('a',), need_live=False) == ROWS
+            assert lru.get(('a',), need_live=True) is None
+            assert lru.get(('a',), need_live=False) == ROWS
+        assert lru.stats()['hits'] == 1
+
+    def test_memory_entries_age_out_of_live(self):
+        cache = LookupCache(published_ttl=1000, live_ttl=10)
+        with patch('grading_cache.time.time', return_value=0):
+            cache.put(('a',), ROWS)
+        with patch('grading_cache.time.time', return_value=5):
+            assert cache.get(('a',), need_live=True) == ROWS
+        with patch('grading_cache.time.time', return_value=100):
+            assert cache.get(('a',), need_live=True) is None
+            assert cache.get(('a',), need_live=False) == ROWS
+
+    def test_writes_through_to_backing(self, cache):
+        lru = LookupCache(backing=cache)
+        lru.put(('a',), ROWS)
+        assert cache.get(('a',)) == ROWS
+
+    def test_concurrent_access(self):
+        cache = LookupCache(max_entries=50)
+
+        def worker(n):
+            for i in range(200):
+                key = (str((n * 7 + i) % 80),)
+                if cache.get(key) is None:
+                    cache.put(key, ROWS)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stats = cache.stats()
+        assert stats['hits'] + stats['misses'] == 1600
+        assert stats['entries'] <= 50
+
+
+# ---------------------------------------------------------------------------
+# get_player_grading with a cache
+# ---------------------------------------------------------------------------
+
+class TestGetPlayerGradingWithCache:
+    def _make_session_mock(self):
+        mock_session = MagicMock()
+        mock_response = MagicMock()
+        mock_response.json.return_value = {'html': ROW_HTML}
+        mock_session.post.return_value = mock_response
+        return mock_session
+
+    @patch('chess_grading.get_session_and_token')
+    def test_second_lookup_served_from_cache(self, mock_init, cache):
+        mock_session = self._make_session_mock()
+        mock_init.return_value = (mock_session, 'fake_token')
+        queries = [{'raw': 'nat loc', 'name': 'nat loc', 'club': '', 'is_single': False}]
+
+        first = get_player_grading(queries, cache=cache)
+        assert mock_session.post.call_count == 2
+
+        second = get_player_grading(queries, cache=cache)
+        assert second == first
+        assert mock_session.post.call_count == 2
+        # Fully cached batches do not even bootstrap a session
+        assert mock_init.call_count == 1
+
+    @patch('chess_grading.get_session_and_token')
+    def test_partial_hit_fetches_only_missing(self, mock_init, cache):
+        mock_session = self._make_session_mock()
+        mock_init.return_value = (mock_session, 'fake_token')
+        cache.put(search_key("nat", "loc"), ROWS)
+
+        queries = [{'raw': 'nat loc', 'name': 'nat loc', 'club': '', 'is_single': False}]
+        get_player_grading(queries, cache=cache)
+
+        assert mock_session.post.call_count == 1
+        payload = mock_session.post.call_args[1]['files']
+        assert payload['surname'] == (None, 'nat')
+
+    @patch('chess_grading.get_session_and_token')
+    def test_failed_requests_are_not_cached(self, mock_init, cache):
+        mock_session = MagicMock()
+        mock_session.post.side_effect = requests.ConnectionError("down")
+        mock_init.return_value = (mock_session, 'fake_token')
+
+        queries = [{'raw': '[12345]', 'pnum': '12345', 'name': '', 'club': '', 'is_single': False}]
+        get_player_grading(queries, cache=cache)
+
+        assert cache.get(search_key("", "", "", "12345")) is None
+
+    @patch('chess_grading.get_session_and_token')
+    def test_shared_cache_serves_other_sessions(self, mock_init):
+        mock_session = self._make_session_mock()
+        mock_init.return_value = (mock_session, 'fake_token')
+        shared = LookupCache()
+
+        get_player_grading([{'raw': 'Loch', 'name': 'Loch', 'club': '', 'is_single': True}], cache=shared)
+        # A different input line producing the same searches is served from memory
+        result = get_player_grading([{'raw': 'loch', 'name': 'loch', 'club': '', 'is_single': True}], cache=shared)
+
+        assert mock_session.post.call_count == 2
+        assert result['loch'][0]['pnum'] == '12345'
+        assert shared.stats()['hits'] == 2
@@ -0,0 +1,154 @@
+"""
+Tests for grading_server.py
+
+Run with: pytest tests/
+"""
+
+from unittest.mock import patch
+
+import http.client
+import json
+import threading
+
+import pytest
+import requests
+
+from grading_cache import LookupCache
+from grading_server import GradingService, MAX_LINES, make_server
+
+
+@pytest.fixture
+def server(fake):
+    srv = make_server(port=0, service=GradingService(cache=LookupCache()), workers=4)
+    threading.Thread(target=srv.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}", srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _a_player(site):
+    return next(row for row in site.federation if ',' not in row['club'])
+
+
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
+class TestEndpoints:
+
+    def test_get_lookup(self, fake, server):
+        url, _ = server
+        row = _a_player(fake)
+        surname, forename = (p.strip() for p in row['name'].split(','))
+        response = requests.get(url + "/lookup", params={'q': [f"{forename} {surname}; {row['club']}", "x"]})
+
+        assert response.status_code == 200
+        first, second = response.json()['results']
+        assert row['pnum'] in [m['pnum'] for m in first['matches']]
+        assert second['status'] == 'invalid'
+
+    def test_post_lookup_with_sticky_club(self, fake, server):
+        url, _ = server
+        row = _a_player(fake)
+        surname = row['name'].split(',')[0]
+        response = requests.post(url + "/lookup", json={'text': f"{row['club'].lower()}:\n{surname}"})
+
+        [record] = response.json()['results']
+        assert record['matches']
+        assert all(row['club'] in m['club'] for m in record['matches'])
+
+    def test_player(self, fake, server):
+        url, _ = server
+        row = fake.federation[5]
+        record = requests.get(f"{url}/player/{row['pnum']}").json()
+        assert record['status'] == 'pnum'
+        assert [m['pnum'] for m in record['matches']] == [row['pnum']]
+        assert requests.get(f"{url}/player/abc").status_code == 400
+
+    def test_club_roster(self, fake, server):
+        url, _ = server
+        row = _a_player(fake)
+        record = requests.get(f"{url}/club/{row['club']}").json()
+        assert row['pnum'] in [m['pnum'] for m in record['matches']]
+
+    def test_health_and_metrics(self, server):
+        url, _ = server
+        assert requests.get(url + "/health").json()['status'] == 'ok'
+        response = requests.get(url + "/metrics")
+        assert response.headers['Content-Type'].startswith('text/plain')
+
+    def test_bad_requests(self, server):
+        url, _ = server
+        assert requests.get(url + "/lookup").status_code == 400
+        assert requests.post(url + "/lookup", data=b"not json").status_code == 400
+        assert requests.post(url + "/lookup", json={'lines': ['x y'] * (MAX_LINES + 1)}).status_code == 413
+        assert requests.get(url + "/nowhere").status_code == 404
+
+    @pytest.mark.parametrize("live, expected", [
+        ("0", False), ("false", False), (False, False), (0, False), ("no", False),
+        ("1", True), (True, True), ("yes", True),
+    ])
+    def test_post_live_flag(self, server, live, expected):
+        url, srv = server
+        with patch.object(srv.RequestHandlerClass.service, 'lookup_text', return_value=[]) as lookup:
+            requests.post(url + "/lookup", json={'text': "Nathanael Loch", 'live': live})
+        lookup.assert_called_once_with("Nathanael Loch", expected)
+
+    def test_invalid_content_length_is_400(self, server):
+        _, srv = server
+        conn = http.client.HTTPConnection('127.0.0.1', srv.server_address[1])
+        conn.putrequest('POST', '/lookup')
+        conn.putheader('Content-Length', 'lots')
+        conn.endheaders()
+        response = conn.getresponse()
+        assert response.status == 400
+        assert json.loads(response.read()) == {'error': "Invalid Content-Length"}
+        conn.close()
+
+    def test_upstream_failure_is_502(self, server):
+        url, _ = server
+        with patch('chess_grading.get_session_and_token', return_value=(None, None)):
+            response = requests.get(url + "/lookup", params={'q': 'Nathanael Loch'})
+        assert response.status_code == 502
+
+
+# ---------------------------------------------------------------------------
+# Sharing
+# ---------------------------------------------------------------------------
+
+class TestSharing:
+
+    def test_keep_alive_reuses_the_connection(self, fake, server):
+        url, srv = server
+        conn = http.client.HTTPConnection('127.0.0.1', srv.server_address[1])
+        for pnum in (fake.federation[0]['pnum'], fake.federation[1]['pnum']):
+            conn.request('GET', f"/player/{pnum}")
+            response = conn.getresponse()
+            assert json.loads(response.read())['matches'][0]['pnum'] == pnum
+        conn.close()
+
+    def test_cache_is_shared_between_clients(self, fake, server):
+        url, _ = server
+        row = _a_player(fake)
+        requests.get(f"{url}/club/{row['club']}")
+        searches = fake.stats['searches']
+        requests.get(f"{url}/club/{row['club']}")
+        assert fake.stats['searches'] == searches
+
+    def test_concurrent_identical_lookups_share_one_search(self, fake, server):
+        url, _ = server
+        fake.latency = lambda rng: 0.2
+        row = _a_player(fake)
+        results = []
+
+        def client():
+            results.append(requests.get(f"{url}/player/{row['pnum']}").json())
+
+        threads = [threading.Thread(target=client) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(results) == 6
+        assert all(r['matches'][0]['pnum'] == row['pnum'] for r in results)
+        assert fake.stats['searches'] == 1
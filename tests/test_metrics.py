@@ -0,0 +1,155 @@
+"""
+Tests for metrics.py and the chess_grading instrumentation
+
+Run with: pytest tests/
+"""
+
+from unittest.mock import patch, MagicMock
+
+import pytest
+import requests
+
+import chess_grading
+import metrics
+from chess_grading import get_player_grading
+from metrics import Registry
+
+SEARCH_HTML = (
+    '<table><tr><td data-column="pnum">12345</td><td data-column="name">Loch, Nathanael</td>'
+    '<td>ST</td><td data-column="status">A</td>'
+    '<td data-column="standard_published">1650</td></tr></table>'
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    metrics.REGISTRY.reset()
+    yield
+    metrics.REGISTRY.reset()
+
+
+def _session(status=200, html=SEARCH_HTML):
+    response = MagicMock(status_code=status, content=html.encode())
+    response.json.return_value = {'html': html}
+    session = MagicMock()
+    session.post.return_value = response
+    return session
+
+
+# ---------------------------------------------------------------------------
+# Registry and exposition format
+# ---------------------------------------------------------------------------
+
+class TestRegistry:
+
+    def test_counter_with_labels(self):
+        reg = Registry()
+        c = reg.counter('x_total', "Things.", labels=('kind',))
+        c.inc(kind='a')
+        c.inc(2, kind='a')
+        c.inc(kind='b')
+        assert c.value(kind='a') == 3
+        text = reg.render()
+        assert '# TYPE x_total counter' in text
+        assert 'x_total{kind="a"} 3' in text
+        assert 'x_total{kind="b"} 1' in text
+
+    def test_histogram_buckets_are_cumulative(self):
+        reg = Registry()
+        h = reg.histogram('t_seconds', "Time.", buckets=(0.1, 1.0))
+        for v in (0.05, 0.5, 0.7, 3):
+            h.observe(v)
+        text = reg.render()
+        assert 't_seconds_bucket{le="0.1"} 1' in text
+        assert 't_seconds_bucket{le="1"} 3' in text
+        assert 't_seconds_bucket{le="+Inf"} 4' in text
+        assert 't_seconds_count 4' in text
+        assert 't_seconds_sum 4.25' in text
+
+    def test_same_name_returns_same_metric(self):
+        reg = Registry()
+        assert reg.counter('a_total', "A.") is reg.counter('a_total', "A.")
+        with pytest.raises(ValueError):
+            reg.histogram('a_total', "A.")
+
+    def test_wrong_labels_raise(self):
+        c = Registry().counter('a_total', "A.", labels=('kind',))
+        with pytest.raises(ValueError):
+            c.inc(other='x')
+
+    def test_label_values_are_escaped(self):
+        reg = Registry()
+        reg.counter('a_total', "A.", labels=('v',)).inc(v='say "hi"\n')
+        assert 'a_total{v="say \\"hi\\"\\n"} 1' in reg.render()
+
+    def test_write_textfile(self, tmp_path):
+        reg = Registry()
+        reg.counter('a_total', "A.").inc()
+        path = tmp_path / 'metrics.prom'
+        metrics.write_textfile(str(path), reg)
+        assert 'a_total 1' in path.read_text()
+
+    def test_serve(self):
+        reg = Registry()
+        reg.counter('a_total', "A.").inc(5)
+        server = metrics.serve(0, registry=reg)
+        try:
+            # Localhost only unless a host is passed
+            assert server.server_address[0] == '127.0.0.1'
+            base = f"http://127.0.0.1:{server.server_address[1]}"
+            response = requests.get(base + "/metrics")
+            assert response.status_code == 200
+            assert 'a_total 5' in response.text
+            assert requests.get(base + "/other").status_code == 404
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+# ---------------------------------------------------------------------------
+# chess_grading instrumentation
+# ---------------------------------------------------------------------------
+
+class TestInstrumentation:
+
+    def test_search_records_latency_bytes_and_rows(self):
+        chess_grading.search_player(_session(), 'tok', 'Nathanael', 'Loch')
+        assert chess_grading.SEARCH_SECONDS.count(status=200) == 1
+        assert chess_grading.RESPONSE_BYTES.value(endpoint='handle-form') == len(SEARCH_HTML)
+
+        chess_grading.parse_results(SEARCH_HTML)
+        assert chess_grading.PARSE_SECONDS.count() == 1
+        assert chess_grading.ROWS_PARSED.value() == 1
+
+    def test_connection_errors_are_timed_and_retries_counted(self):
+        session = MagicMock()
+        session.post.side_effect = requests.ConnectionError("down")
+        with patch('chess_grading.RETRY_POLICY', chess_grading.RetryPolicy(attempts=2, base=0, cap=0)):
+            assert chess_grading.search_player(session, 'tok', 'A', 'B') is None
+        assert chess_grading.SEARCH_SECONDS.count(status='error') == 2
+        assert chess_grading.SEARCH_RETRIES.value(reason='ConnectionError') == 1
+
+    @patch('chess_grading.get_session_and_token')
+    def test_batch_metrics(self, mock_get_session):
+        mock_get_session.return_value = (_session(), 'tok')
+        cache = MagicMock()
+        cache.get.return_value = None
+        queries = [
+            {'raw': 'Nathanael Loch', 'name': 'Nathanael Loch', 'club': '', 'is_single': False},
+            {'raw': '[12345]', 'name': '', 'club': '', 'is_single': False, 'pnum': '12345'},
+        ]
+        stats = {}
+        get_player_grading(queries, cache=cache, stats=stats)
+
+        assert chess_grading.QUERY_LINES.value() == 2
+        assert chess_grading.BATCH_SECONDS.count(outcome='ok') == 1
+        assert chess_grading.LOOKUPS.value(layer='cache', result='miss') == stats['requests']
+        assert chess_grading.REQUESTS_PER_LINE.total() == stats['requests'] / 2
+        assert 'chess_grading_batch_seconds_count{outcome="ok"} 1' in metrics.REGISTRY.render()
+
+    @patch('chess_grading.get_session_and_token')
+    def test_failed_batch(self, mock_get_session):
+        mock_get_session.return_value = (None, None)
+        queries = [{'raw': 'Nathanael Loch', 'name': 'Nathanael Loch', 'club': '', 'is_single': False}]
+        assert get_player_grading(queries) == {}
+        assert chess_grading.BATCH_SECONDS.count(outcome='failed') == 1
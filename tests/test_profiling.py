@@ -0,0 +1,157 @@
+"""
+Tests for profiling.py
+
+Run with: pytest tests/
+"""
+
+from unittest.mock import patch, MagicMock
+
+import os
+import pstats
+import threading
+import tracemalloc
+
+import pytest
+
+import chess_grading
+import profiling
+from profiling import Profile, parse_mode, profile, profiled
+
+
+def _work():
+    return sorted(str(n) for n in range(2000))
+
+
+# ---------------------------------------------------------------------------
+# parse_mode
+# ---------------------------------------------------------------------------
+
+class TestParseMode:
+
+    @pytest.mark.parametrize("value, expected", [
+        (None, set()), ("", set()), ("0", set()), ("nonsense", set()),
+        ("cpu", {'cpu'}), ("1", {'cpu'}), ("MEMORY", {'memory'}),
+        ("all", {'cpu', 'memory'}), ("cpu,memory", {'cpu', 'memory'}),
+    ])
+    def test_values(self, value, expected):
+        assert parse_mode(value) == expected
+
+
+# ---------------------------------------------------------------------------
+# Profile
+# ---------------------------------------------------------------------------
+
+class TestProfile:
+
+    def test_cpu_writes_loadable_prof_and_summary(self, tmp_path):
+        with profile('lookup', {'cpu'}, str(tmp_path)) as run:
+            _work()
+        prof, summary = run.paths
+        assert os.path.basename(prof).startswith('lookup-') and prof.endswith('.prof')
+        assert pstats.Stats(prof).total_calls > 0
+        assert '_work' in open(summary, encoding='utf-8').read()
+
+    def test_memory_writes_top_allocations(self, tmp_path):
+        with profile('lookup', {'memory'}, str(tmp_path)) as run:
+            data = _work()
+        assert data
+        [report] = run.paths
+        text = open(report, encoding='utf-8').read()
+        assert text.startswith('lookup: peak')
+        assert 'test_profiling.py' in text
+
+    def test_disabled_writes_nothing(self, tmp_path):
+        with profile('lookup', set(), str(tmp_path)) as run:
+            _work()
+        assert run.paths == []
+        assert list(tmp_path.iterdir()) == []
+
+    def test_unfinished_profile_is_written_when_the_next_starts(self, tmp_path):
+        first = Profile('rerun', {'cpu'}, str(tmp_path)).start()
+        second = Profile('rerun', {'cpu'}, str(tmp_path)).start()
+        assert len(first.paths) == 2
+        second.stop()
+        assert len(second.paths) == 2
+        assert first.stop() == first.paths
+
+    def test_overlapping_memory_profiles_share_tracemalloc(self, tmp_path):
+        first = Profile('a', {'memory'}, str(tmp_path))
+        second = Profile('b', {'memory'}, str(tmp_path))
+        started = threading.Barrier(2)
+        finished = threading.Event()
+
+        def run_first():
+            first.start()
+            started.wait()
+            finished.wait()
+            first.stop()
+
+        thread = threading.Thread(target=run_first)
+        thread.start()
+        second.start()
+        started.wait()
+        # The first thread's stop() used to turn tracing off under the second
+        finished.set()
+        thread.join()
+        assert tracemalloc.is_tracing()
+        second.stop()
+        assert len(first.paths) == len(second.paths) == 1
+        assert not tracemalloc.is_tracing()
+
+    def test_profile_abandoned_by_its_thread_can_be_stopped_elsewhere(self, tmp_path):
+        runs = []
+        thread = threading.Thread(target=lambda: runs.append(Profile('rerun', {'memory'}, str(tmp_path)).start()))
+        thread.start()
+        thread.join()
+        [run] = runs
+        assert tracemalloc.is_tracing()
+        assert len(run.stop()) == 1
+        assert run.stop() == run.paths
+        assert not tracemalloc.is_tracing()
+
+    def test_report_errors_are_logged_not_raised(self, tmp_path):
+        blocker = tmp_path / 'not-a-dir'
+        blocker.write_text('')
+        with profile('lookup', {'cpu', 'memory'}, str(blocker)) as run:
+            _work()
+        assert run.paths == []
+        assert not tracemalloc.is_tracing()
+
+
+# ---------------------------------------------------------------------------
+# profiled decorator
+# ---------------------------------------------------------------------------
+
+class TestProfiled:
+
+    def test_off_by_default(self, tmp_path, monkeypatch):
+        monkeypatch.delenv(profiling.PROFILE_ENV, raising=False)
+        monkeypatch.setenv(profiling.PROFILE_DIR_ENV, str(tmp_path))
+        assert profiled('work')(_work)() == _work()
+        assert list(tmp_path.iterdir()) == []
+
+    def test_env_turns_it_on(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(profiling.PROFILE_ENV, 'all')
+        monkeypatch.setenv(profiling.PROFILE_DIR_ENV, str(tmp_path))
+        profiled('work')(_work)()
+        names = sorted(p.name for p in tmp_path.iterdir())
+        assert len(names) == 3
+        assert all(n.startswith('work-') for n in names)
+
+    def test_nested_calls_fold_into_the_outer_profile(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(profiling.PROFILE_ENV, 'cpu')
+        monkeypatch.setenv(profiling.PROFILE_DIR_ENV, str(tmp_path))
+        with profile('outer'):
+            profiled('inner')(_work)()
+        assert all(p.name.startswith('outer-') for p in tmp_path.iterdir())
+
+    @patch('chess_grading.get_session_and_token')
+    def test_get_player_grading_is_profiled(self, mock_get_session, tmp_path, monkeypatch):
+        session = MagicMock()
+        session.post.return_value.json.return_value = {'html': ''}
+        mock_get_session.return_value = (session, 'tok')
+        monkeypatch.setenv(profiling.PROFILE_ENV, 'cpu')
+        monkeypatch.setenv(profiling.PROFILE_DIR_ENV, str(tmp_path))
+
+        chess_grading.get_player_grading([{'raw': 'Loch', 'name': 'Loch', 'club': '', 'is_single': True}])
+        assert any(p.name.startswith('get_player_grading-') and p.suffix == '.prof' for p in tmp_path.iterdir())
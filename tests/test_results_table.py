@@ -0,0 +1,115 @@
+"""
+Tests for results_table.py
+
+Run with: pytest tests/
+"""
+
+import pandas as pd
+
+from chess_grading import Player
+from results_table import ResultsOptions, ResultsTableMemo, build_results_table, display_name
+
+CLUB_MAP = {'ST': 'Stirling', 'GR': 'Grangemouth'}
+
+
+def _player(pnum, name, club='ST', std='1500', match_type='name', **grades):
+    return Player(pnum, name, club, 'Adult', standard_published=std, **grades).with_match_type(match_type)
+
+
+def _results():
+    return {
+        'Nathanael Loch': [_player('1', 'Loch, Nathanael', std='1650')],
+        'Smith': [_player('2', 'Smith, Anna', club='ST, GR', std='1800'), _player('3', 'Smith, John', std='')],
+        '[2]': [_player('2', 'Smith, Anna', club='ST, GR', std='1800', match_type='pnum')],
+        'Nobody': [],
+        'x': [{'invalid_query': True}],
+    }
+
+
+# ---------------------------------------------------------------------------
+# build_results_table
+# ---------------------------------------------------------------------------
+
+class TestBuildResultsTable:
+
+    def test_tallies_and_dedupe(self):
+        results = build_results_table(_results(), CLUB_MAP)
+        assert results.total == 3
+        assert results.not_found == 2
+        # Anna Smith was "Multiple" under 'Smith' but confident via her PNUM line
+        assert results.confident == 2
+        statuses = {row['Pnum']: row['Match Status'] for row in results.rows}
+        assert statuses['2'] == "⚠️ PNUM Only"
+        assert [row['Match Status'] for row in results.rows[-2:]] == ["❌", "⚠️ Ignored"]
+
+    def test_table_columns_follow_options(self):
+        options = ResultsOptions(show_pnum=False, show_club=True, show_age=True,
+                                 grades=(True, False, False, True, False, False))
+        table = build_results_table(_results(), CLUB_MAP, options).table
+        assert list(table.columns) == ["Match Status", "Name", "Club", "Age", "Published (Std)", "Live (Alg)"]
+        assert pd.api.types.is_numeric_dtype(table["Published (Std)"])
+        assert "ST (Stirling), GR (Grangemouth)" in list(table["Club"])
+
+    def test_copy_lists(self):
+        results = build_results_table(_results(), CLUB_MAP)
+        assert results.multiline_text.splitlines() == [
+            "Anna Smith [2] (1800)", "Nathanael Loch [1] (1650)", "John Smith [3]",
+        ]
+        assert results.singleline_text == "Anna Smith [2] (1800), John Smith [3], Nathanael Loch [1] (1650)"
+
+    def test_copy_lists_without_pnums_or_grades(self):
+        results = build_results_table(_results(), CLUB_MAP, ResultsOptions(show_pnum=False, grades=(False,) * 6))
+        assert results.singleline_text == "Anna Smith, John Smith, Nathanael Loch"
+
+    def test_first_visible_grade_wins(self):
+        results_map = {'Loch': [_player('1', 'Loch, Nathanael', std='', allegro_live='1400', blitz_live='1300')]}
+        options = ResultsOptions(grades=(True, False, False, True, False, True))
+        assert build_results_table(results_map, {}, options).multiline_text == "Nathanael Loch [1] (1400)"
+
+    def test_scoresheet_player_data(self):
+        results = build_results_table(_results(), CLUB_MAP)
+        assert results.player_ids == ['1', '2', '3']
+        assert results.player_data['1'] == {
+            'display': "N. Loch [1] (1650)", 'rating': 1650, 'rating_str': '1650',
+            'forename': 'Nathanael', 'surname': 'Loch', 'full_name': 'Nathanael Loch', 'pnum': '1',
+        }
+        assert results.player_data['3']['rating'] == -1
+
+    def test_display_name(self):
+        assert display_name("Loch, Nathanael") == "Nathanael Loch"
+        assert display_name("Nathanael Loch") == "Nathanael Loch"
+
+
+# ---------------------------------------------------------------------------
+# ResultsTableMemo
+# ---------------------------------------------------------------------------
+
+class TestResultsTableMemo:
+
+    def test_unchanged_inputs_reuse_the_table(self):
+        memo = ResultsTableMemo()
+        calls = []
+
+        def results_for(lines):
+            calls.append(lines)
+            return _results()
+
+        first = memo.get(list(_results()), 0, results_for, CLUB_MAP)
+        assert memo.get(list(_results()), 0, results_for, CLUB_MAP) is first
+        assert len(calls) == 1
+        assert (memo.hits, memo.misses) == (1, 1)
+
+    def test_new_version_or_options_rebuild(self):
+        memo = ResultsTableMemo()
+        lines = list(_results())
+        first = memo.get(lines, 0, lambda _: _results(), CLUB_MAP)
+        assert memo.get(lines, 1, lambda _: _results(), CLUB_MAP) is not first
+        assert memo.get(lines, 1, lambda _: _results(), CLUB_MAP, ResultsOptions(show_age=True)) is not first
+        assert memo.get(lines[:2], 1, lambda _: _results(), CLUB_MAP) is not first
+        assert memo.misses == 4
+
+    def test_is_bounded(self):
+        memo = ResultsTableMemo(size=2)
+        for version in range(5):
+            memo.get(['a'], version, lambda _: {'a': []}, {})
+        assert len(memo._tables) == 2
@@ -0,0 +1,335 @@
+"""
+Tests for roster_mirror.py
+
+Run with: pytest tests/
+"""
+
+from unittest.mock import patch, MagicMock
+
+import random
+import string
+import time
+
+import pytest
+
+from chess_grading import Player, get_player_grading, search_key
+from roster_mirror import (
+    CLUB_INTERVAL, MAX_CLUB_INTERVAL, MIN_CLUB_INTERVAL, RosterMirror, TrigramIndex,
+)
+
+
+def _row_html(pnum, name, club):
+    return (
+        f'<tr><td data-column="pnum">{pnum}</td><td data-column="name">{name}</td>'
+        f'<td>{club}</td><td data-column="status">A</td>'
+        f'<td data-column="standard_published">1650</td><td data-column="standard_live">1680</td></tr>'
+    )
+
+
+ROSTERS = {
+    'ST': '<table>' + _row_html('12345', 'Loch, Nathanael', 'ST')
+          + _row_html('22222', 'Smith, Anna', 'ST, DN') + '</table>',
+    'DN': '<table>' + _row_html('22222', 'Smith, Anna', 'ST, DN')
+          + _row_html('33333', 'Brown, Robert', 'DN') + '</table>',
+    'EK': '<table></table>',
+}
+
+
+def _sessions(fail=()):
+    """A SessionManager stand-in whose club-only searches return ROSTERS."""
+    sessions = MagicMock()
+
+    def search(forename, surname, club="", pnum=""):
+        return None if club in fail else ROSTERS[club]
+
+    sessions.search.side_effect = search
+    return sessions
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    m = RosterMirror(str(tmp_path / "mirror.sqlite3"))
+    yield m
+    m.close()
+
+
+@pytest.fixture
+def synced(mirror):
+    mirror.sync(_sessions(), clubs=['ST', 'DN', 'EK'], delay=0)
+    return mirror
+
+
+# ---------------------------------------------------------------------------
+# sync
+# ---------------------------------------------------------------------------
+
+class TestSync:
+    def test_stores_each_player_once(self, synced):
+        assert len(synced) == 3
+
+    def test_resumes_unfinished_sweep(self, mirror):
+        first = _sessions(fail={'DN'})
+        assert mirror.sync(first, clubs=['ST', 'DN', 'EK'], delay=0) == 2
+
+        second = _sessions()
+        assert mirror.sync(second, clubs=['ST', 'DN', 'EK'], delay=0) == 1
+        assert [c[1]['club'] for c in second.search.call_args_list] == ['DN']
+        assert len(mirror) == 3
+
+    def test_completed_sweep_drops_departed_players(self, synced):
+        with patch.dict(ROSTERS, {'DN': '<table>' + _row_html('22222', 'Smith, Anna', 'ST, DN') + '</table>'}):
+            synced.sync(_sessions(), clubs=['ST', 'DN', 'EK'], delay=0)
+        assert synced.get(search_key("", "", "", "33333")) == []
+        assert len(synced) == 2
+
+    def test_persists_across_instances(self, synced):
+        reopened = RosterMirror(synced.path)
+        assert len(reopened) == 3
+        reopened.close()
+
+
+# ---------------------------------------------------------------------------
+# sync_changes
+# ---------------------------------------------------------------------------
+
+class TestSyncChanges:
+    def _intervals(self, mirror):
+        return dict(mirror._conn.execute("SELECT code, interval FROM clubs").fetchall())
+
+    def test_only_due_clubs_are_fetched(self, synced):
+        sessions = _sessions()
+        assert synced.sync_changes(sessions, clubs=['ST', 'DN', 'EK'], delay=0)['fetched'] == 0
+
+        with patch.dict(ROSTERS, {'CW': '<table></table>'}):
+            # CW has never been fetched, so it is due at once
+            assert synced.sync_changes(sessions, clubs=['ST', 'CW'], delay=0)['fetched'] == 1
+            later = time.time() + CLUB_INTERVAL + 1
+            assert synced.sync_changes(sessions, clubs=['ST', 'DN', 'EK', 'CW'], delay=0, now=later)['fetched'] == 4
+
+    def test_unchanged_club_backs_off(self, tmp_path):
+        mirror = RosterMirror(str(tmp_path / "m.sqlite3"), live_ttl=MAX_CLUB_INTERVAL)
+        mirror.sync(_sessions(), clubs=['ST', 'DN', 'EK'], delay=0)
+        later = time.time() + CLUB_INTERVAL + 1
+        totals = mirror.sync_changes(_sessions(), clubs=['ST', 'DN', 'EK'], delay=0, now=later)
+        assert totals['changed'] == 0
+        assert self._intervals(mirror)['ST'] == min(CLUB_INTERVAL * 2, MAX_CLUB_INTERVAL)
+        mirror.close()
+
+    def test_intervals_never_outlast_live_grades(self, synced):
+        later = time.time() + CLUB_INTERVAL + 1
+        synced.sync_changes(_sessions(), clubs=['ST', 'DN', 'EK'], delay=0, now=later)
+        assert self._intervals(synced)['ST'] == synced.live_ttl
+        # Intervals stored before the cap are capped when deciding what is due
+        synced._conn.execute("UPDATE clubs SET interval = ?", (MAX_CLUB_INTERVAL,))
+        assert synced.sync_changes(_sessions(), clubs=['ST'], delay=0, now=later + CLUB_INTERVAL + 1)['fetched'] == 1
+
+    def test_changed_club_is_revisited_sooner(self, synced):
+        later = time.time() + CLUB_INTERVAL + 1
+        with patch.dict(ROSTERS, {'EK': '<table>' + _row_html('55555', 'Grey, Ian', 'EK') + '</table>'}):
+            totals = synced.sync_changes(_sessions(), clubs=['EK'], delay=0, now=later)
+        assert totals['changed'] == 1 and totals['added'] == 1
+        assert self._intervals(synced)['EK'] == max(CLUB_INTERVAL / 2, MIN_CLUB_INTERVAL)
+
+    def test_applies_row_level_diffs(self, synced):
+        later = time.time() + CLUB_INTERVAL + 1
+        dn = ('<table>' + _row_html('22222', 'Smith, Anna', 'ST, DN').replace('1680', '1701')
+              + _row_html('44444', 'Newman, Jo', 'DN') + '</table>')
+        with patch.dict(ROSTERS, {'DN': dn}):
+            totals = synced.sync_changes(_sessions(), clubs=['DN'], delay=0, now=later)
+
+        assert (totals['added'], totals['updated'], totals['removed']) == (1, 1, 1)
+        assert synced.get(search_key("", "", "", "22222"))[0].standard_live == '1701'
+        assert synced.get(search_key("", "", "", "44444"))[0].name == 'Newman, Jo'
+        # Brown was only in DN, so he is gone; Loch in ST is untouched
+        assert synced.get(search_key("", "", "", "33333")) == []
+        assert synced.get(search_key("", "", "", "12345"))[0].name == 'Loch, Nathanael'
+
+    def test_club_move_keeps_player_in_other_club(self, synced):
+        later = time.time() + CLUB_INTERVAL + 1
+        # Smith leaves ST but is still on the DN roster
+        with patch.dict(ROSTERS, {'ST': '<table>' + _row_html('12345', 'Loch, Nathanael', 'ST') + '</table>'}):
+            synced.sync_changes(_sessions(), clubs=['ST'], delay=0, now=later)
+        assert [p.pnum for p in synced.get(search_key("", "smith"))] == ['22222']
+        assert [p.pnum for p in synced.get(search_key("", "", "ST"))] == ['12345']
+
+    def test_club_move_leaves_old_club_before_it_is_revisited(self, synced):
+        later = time.time() + CLUB_INTERVAL + 1
+        # Brown moves from DN to ST; only ST is fetched
+        st = ROSTERS['ST'].replace('</table>', _row_html('33333', 'Brown, Robert', 'ST') + '</table>')
+        with patch.dict(ROSTERS, {'ST': st}):
+            totals = synced.sync_changes(_sessions(), clubs=['ST'], delay=0, now=later)
+        assert (totals['added'], totals['updated']) == (0, 1)
+        assert [p.pnum for p in synced.get(search_key("", "", "DN"))] == ['22222']
+        assert synced.get(search_key("", "brown", "DN")) == []
+        assert [p.pnum for p in synced.get(search_key("", "brown", "ST"))] == ['33333']
+        # Players listed under several clubs keep them all
+        assert [p.pnum for p in synced.get(search_key("", "smith", "DN"))] == ['22222']
+
+
+# ---------------------------------------------------------------------------
+# RosterMirror.get
+# ---------------------------------------------------------------------------
+
+class TestRosterMirrorGet:
+    def test_pnum_lookup(self, synced):
+        rows = synced.get(search_key("", "", "", "12345"))
+        assert [r.name for r in rows] == ['Loch, Nathanael']
+        assert isinstance(rows[0], Player)
+
+    def test_partial_name_matches_like_backend(self, synced):
+        assert [r.pnum for r in synced.get(search_key("", "LOC"))] == ['12345']
+        assert [r.pnum for r in synced.get(search_key("ann", "smi"))] == ['22222']
+
+    def test_club_filter_uses_every_listed_club(self, synced):
+        assert [r.pnum for r in synced.get(search_key("", "smith", "DN"))] == ['22222']
+        assert synced.get(search_key("", "brown", "ST")) == []
+
+    def test_club_only_search(self, synced):
+        assert [r.pnum for r in synced.get(search_key("", "", "DN"))] == ['33333', '22222']
+        # An empty club roster is a real answer, not a miss
+        assert synced.get(search_key("", "", "EK")) == []
+
+    def test_unswept_club_is_a_miss(self, synced):
+        assert synced.get(search_key("", "loch", "CW")) is None
+
+    def test_unknown_name_trusted_only_after_fresh_sweep(self, synced):
+        assert synced.get(search_key("", "nobody")) == []
+        synced.live_ttl = 0
+        time.sleep(0.01)
+        assert synced.get(search_key("", "nobody")) is None
+
+    def test_written_back_rows_need_a_sweep_for_name_searches(self, mirror):
+        mirror.put(search_key("", "loch"), [Player('12345', 'Loch, Nathanael', 'ST', 'Adult')])
+        assert mirror.get(search_key("", "loch")) is None
+        assert mirror.get(search_key("", "", "", "12345"))[0].name == 'Loch, Nathanael'
+
+    def test_stale_rows_only_serve_published_grades(self, synced):
+        synced.live_ttl = 0
+        time.sleep(0.01)
+        key = search_key("", "loch")
+        assert synced.get(key, need_live=True) is None
+        assert synced.get(key, need_live=False)[0].pnum == '12345'
+
+    def test_lookup_is_fast(self, mirror):
+        rows = [{'pnum': str(n), 'name': f'Surname{n}, Forename{n}', 'club': 'ST', 'age': 'Adult'}
+                for n in range(20000)]
+        mirror.sync(_sessions(), clubs=['EK'], delay=0)
+        mirror.upsert([Player.from_dict(r) for r in rows])
+        key = search_key("forename4321", "surname4321")
+        start = time.perf_counter()
+        for _ in range(100):
+            assert mirror.get(key)[0].pnum == '4321'
+        assert (time.perf_counter() - start) / 100 < 0.001
+
+    def test_short_name_words_are_indexed(self, synced):
+        assert [r.pnum for r in synced.get(search_key("an", "sm"))] == ['22222']
+        assert [r.pnum for r in synced.get(search_key("", "h", "ST"))] == ['12345', '22222']
+
+    def test_write_back_updates_index_in_place(self, synced):
+        with patch.object(synced, '_load') as load:
+            synced.put(search_key("", "", "", "12345"), [Player('12345', 'Loch, Nat', 'DN', 'Adult')])
+            synced.upsert([Player('44444', 'Newman, Jo', 'ST', 'Adult')])
+            synced._checked_at = 0.0
+            assert [r.pnum for r in synced.get(search_key("nat", "loch", "ST"))] == ['12345']
+            assert [r.pnum for r in synced.get(search_key("jo", "newman"))] == ['44444']
+            assert synced.get(search_key("nathanael", "loch")) == []
+            assert [p.pnum for p in synced.suggest("Jo Neuman")] == ['44444']
+        load.assert_not_called()
+
+
+# ---------------------------------------------------------------------------
+# Fuzzy suggestions
+# ---------------------------------------------------------------------------
+
+class TestTrigramIndex:
+    def test_ranks_closest_spelling_first(self):
+        index = TrigramIndex(["nathanael loch", "anna smith", "robert brown"])
+        assert [pos for _, pos in index.search("Nathaneal Loch")] == [0]
+
+    def test_ignores_word_order_and_punctuation(self):
+        index = TrigramIndex(["sean o'brien-smith"])
+        score, _ = index.search("Smith Sean OBrien")[0]
+        assert score == 1.0
+
+    def test_unrelated_names_score_below_threshold(self):
+        index = TrigramIndex(["nathanael loch"])
+        assert index.search("Robert Brown") == []
+        assert index.search("") == []
+
+
+class TestSuggest:
+    def test_suggests_misspelt_name(self, synced):
+        assert [p.pnum for p in synced.suggest("Nathaneal Loch")] == ['12345']
+
+    def test_club_restricts_suggestions(self, synced):
+        assert [p.pnum for p in synced.suggest("Anna Smyth", club="DN")] == ['22222']
+        assert synced.suggest("Anna Smyth", club="EK") == []
+
+    def test_suggest_is_fast(self, mirror):
+        rng = random.Random(7)
+        word = lambda: ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+        mirror.upsert([Player(str(n), f'{word().title()}, {word().title()}', 'ST') for n in range(5000)])
+        mirror.upsert([Player('99999', 'Macdonald, Nathanael', 'ST')])
+        start = time.perf_counter()
+        for _ in range(100):
+            assert mirror.suggest("Nathaneal McDonald")[0].pnum == '99999'
+        assert (time.perf_counter() - start) / 100 < 0.005
+
+
+# ---------------------------------------------------------------------------
+# get_player_grading with a mirror
+# ---------------------------------------------------------------------------
+
+class TestGetPlayerGradingWithMirror:
+    @patch('chess_grading.get_session_and_token')
+    def test_mirror_hits_need_no_network(self, mock_init, synced):
+        stats = {}
+        queries = [{'raw': 'Loch', 'name': 'Loch', 'club': '', 'is_single': True},
+                   {'raw': '[33333]', 'pnum': '33333', 'name': '', 'club': '', 'is_single': False}]
+        result = get_player_grading(queries, mirror=synced, stats=stats)
+
+        mock_init.assert_not_called()
+        assert result['Loch'][0].pnum == '12345'
+        assert result['[33333]'][0].match_type == 'pnum'
+        assert stats['mirror_hits'] == 3 and stats['requests'] == 0
+
+    @patch('chess_grading.get_session_and_token')
+    def test_misses_fall_back_and_are_stored(self, mock_init, synced):
+        mock_session = MagicMock()
+        mock_response = MagicMock()
+        mock_response.json.return_value = {'html': '<table>' + _row_html('44444', 'Newman, Jo', 'CW') + '</table>'}
+        mock_session.post.return_value = mock_response
+        mock_init.return_value = (mock_session, 'fake_token')
+        # Too old to trust "no match" for a new player
+        synced.live_ttl = 0
+        time.sleep(0.01)
+
+        queries = [{'raw': 'Newman', 'name': 'Newman', 'club': '', 'is_single': True}]
+        result = get_player_grading(queries, mirror=synced)
+
+        assert mock_session.post.call_count == 2
+        assert result['Newman'][0].pnum == '44444'
+        assert synced.get(search_key("", "", "", "44444"), need_live=False)[0].name == "Newman, Jo"
+
+    @patch('chess_grading.get_session_and_token')
+    def test_not_found_gets_fuzzy_suggestions(self, mock_init, synced):
+        stats = {}
+        queries = [{'raw': 'Nathaneal Loch', 'name': 'Nathaneal Loch', 'club': '', 'is_single': False}]
+        result = get_player_grading(queries, mirror=synced, stats=stats)
+
+        mock_init.assert_not_called()
+        assert [(p.pnum, p.match_type) for p in result['Nathaneal Loch']] == [('12345', 'fuzzy')]
+        assert stats['suggested'] == 1
+
+    @patch('chess_grading.get_session_and_token')
+    def test_fresh_bypasses_mirror(self, mock_init, synced):
+        mock_session = MagicMock()
+        mock_response = MagicMock()
+        mock_response.json.return_value = {'html': ROSTERS['ST']}
+        mock_session.post.return_value = mock_response
+        mock_init.return_value = (mock_session, 'fake_token')
+
+        queries = [{'raw': '[12345]', 'pnum': '12345', 'name': '', 'club': '', 'is_single': False}]
+        get_player_grading(queries, mirror=synced, fresh=True)
+
+        assert mock_session.post.call_count == 1
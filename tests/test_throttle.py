@@ -0,0 +1,173 @@
+"""
+Tests for throttle.py and the retrying handle-form client
+
+Run with: pytest tests/
+"""
+
+from unittest.mock import patch, MagicMock
+
+import threading
+import time
+
+import requests
+
+import chess_grading
+from chess_grading import search_player
+from throttle import AdaptiveLimiter, RetryPolicy, TokenBucket
+
+
+def _http_response(status, headers=None, html='<table></table>'):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response._content = ('{"html": "%s"}' % html).encode()
+    return response
+
+
+# ---------------------------------------------------------------------------
+# TokenBucket
+# ---------------------------------------------------------------------------
+
+class TestTokenBucket:
+    def test_allows_burst_then_waits(self):
+        bucket = TokenBucket(rate=10, burst=3)
+        assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert 0 < bucket.try_acquire() <= 0.1
+
+    def test_acquire_paces_to_rate(self):
+        bucket = TokenBucket(rate=50, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        assert time.monotonic() - start >= 0.09
+
+
+# ---------------------------------------------------------------------------
+# AdaptiveLimiter
+# ---------------------------------------------------------------------------
+
+class TestAdaptiveLimiter:
+    def _limiter(self, **kwargs):
+        return AdaptiveLimiter(rate=1000, burst=1000, **kwargs)
+
+    def test_additive_increase_on_success(self):
+        limiter = self._limiter(initial=2, maximum=4)
+        for _ in range(4):
+            with limiter.slot():
+                pass
+        assert limiter.limit == 3
+
+    def test_multiplicative_decrease_on_failure(self):
+        limiter = self._limiter(initial=8, maximum=8, cooldown=0)
+        with limiter.slot() as outcome:
+            outcome.ok = False
+        assert limiter.limit == 4
+
+    def test_slow_requests_count_as_congestion(self):
+        limiter = self._limiter(initial=4, latency_target=0.01)
+        with limiter.slot():
+            time.sleep(0.02)
+        assert limiter.limit == 2
+
+    def test_one_decrease_per_cooldown(self):
+        limiter = self._limiter(initial=8, maximum=8, cooldown=60)
+        for _ in range(3):
+            with limiter.slot() as outcome:
+                outcome.ok = False
+        assert limiter.limit == 4
+
+    def test_never_below_minimum(self):
+        limiter = self._limiter(initial=2, minimum=1, cooldown=0)
+        for _ in range(5):
+            with limiter.slot() as outcome:
+                outcome.ok = False
+        assert limiter.limit == 1
+
+    def test_caps_concurrency(self):
+        limiter = self._limiter(initial=2, maximum=2)
+        state = {'active': 0, 'peak': 0}
+        lock = threading.Lock()
+
+        def work():
+            with limiter.slot():
+                with lock:
+                    state['active'] += 1
+                    state['peak'] = max(state['peak'], state['active'])
+                time.sleep(0.02)
+                with lock:
+                    state['active'] -= 1
+
+        threads = [threading.Thread(target=work) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert state['peak'] == 2
+
+    def test_pause_holds_back_new_requests(self):
+        limiter = self._limiter()
+        limiter.pause(0.05)
+        start = time.monotonic()
+        with limiter.slot():
+            pass
+        assert time.monotonic() - start >= 0.04
+
+
+# ---------------------------------------------------------------------------
+# RetryPolicy
+# ---------------------------------------------------------------------------
+
+class TestRetryPolicy:
+    def test_full_jitter_within_exponential_bound(self):
+        policy = RetryPolicy(base=0.5, cap=10)
+        delays = [policy.delay(2) for _ in range(200)]
+        assert all(0 <= d <= 2.0 for d in delays)
+        assert len(set(delays)) > 1
+
+    def test_capped(self):
+        assert RetryPolicy(base=1, cap=3).delay(10) <= 3
+
+    def test_retry_after_is_honoured(self):
+        policy = RetryPolicy(cap=10)
+        assert policy.delay(0, '4') == 4.0
+        assert policy.delay(0, '120') == 10
+        assert 0 <= policy.delay(0, 'Wed, 21 Oct 2015 07:28:00 GMT') <= 0.5
+
+
+# ---------------------------------------------------------------------------
+# search_player retries
+# ---------------------------------------------------------------------------
+
+@patch('chess_grading.time.sleep')
+class TestSearchRetries:
+    def test_retries_transient_status_then_succeeds(self, mock_sleep):
+        session = MagicMock()
+        session.post.side_effect = [_http_response(503), _http_response(200, html='ok')]
+        assert search_player(session, 'tok', '', 'loch') == 'ok'
+        assert session.post.call_count == 2
+        assert mock_sleep.called
+
+    def test_retries_connection_errors(self, mock_sleep):
+        session = MagicMock()
+        session.post.side_effect = [requests.ConnectionError("reset"), _http_response(200, html='ok')]
+        assert search_player(session, 'tok', '', 'loch') == 'ok'
+
+    def test_gives_up_after_attempts(self, mock_sleep):
+        session = MagicMock()
+        session.post.return_value = _http_response(502)
+        assert search_player(session, 'tok', '', 'loch') is None
+        assert session.post.call_count == chess_grading.RETRY_POLICY.attempts
+
+    def test_client_errors_are_not_retried(self, mock_sleep):
+        session = MagicMock()
+        session.post.return_value = _http_response(404)
+        assert search_player(session, 'tok', '', 'loch') is None
+        assert session.post.call_count == 1
+
+    def test_429_retry_after_pauses_every_caller(self, mock_sleep):
+        session = MagicMock()
+        session.post.side_effect = [_http_response(429, {'Retry-After': '2'}), _http_response(200, html='ok')]
+        with patch.object(chess_grading.RATE_LIMITER, 'pause') as mock_pause:
+            assert search_player(session, 'tok', '', 'loch') == 'ok'
+        mock_pause.assert_called_once_with(2.0)
+        mock_sleep.assert_any_call(2.0)
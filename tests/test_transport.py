@@ -0,0 +1,148 @@
+"""
+Tests for transport.py
+
+Run with: pytest tests/
+"""
+
+from unittest.mock import patch, MagicMock
+
+import json
+import time
+
+import pytest
+import requests
+
+import chess_grading
+from chess_grading import API_URL, BASE_URL, get_player_grading
+from transport import (
+    LiveTransport, RecordTransport, RecordingSession, ReplayMissError, ReplayTransport,
+    fixture_key, save_fixture, transport_from_env,
+)
+
+SEARCH_HTML = (
+    '<table><tr><td data-column="pnum">12345</td><td data-column="name">Loch, Nathanael</td>'
+    '<td>ST</td><td data-column="status">A</td>'
+    '<td data-column="standard_published">1650</td><td data-column="standard_live">1680</td></tr></table>'
+)
+
+
+def _search_fields(forename, surname, club="", pnum=""):
+    return {name: value for name, value in chess_grading._search_fields('', forename, surname, club, pnum)
+            if name != '_csrf_token'}
+
+
+def _record_search(directory, forename, surname, html):
+    save_fixture(str(directory), 'POST', API_URL, _search_fields(forename, surname),
+                 200, json.dumps({'html': html}), 'application/json')
+
+
+@pytest.fixture
+def replay(tmp_path):
+    """Points chess_grading at a ReplayTransport over tmp_path for one test."""
+    transport = ReplayTransport(str(tmp_path))
+    with patch.object(chess_grading, 'TRANSPORT', transport):
+        yield transport
+
+
+# ---------------------------------------------------------------------------
+# Fixture keys
+# ---------------------------------------------------------------------------
+
+class TestFixtureKey:
+    def test_ignores_field_order(self):
+        assert fixture_key('POST', API_URL, {'a': '1', 'b': '2'}) == fixture_key('post', API_URL, {'b': '2', 'a': '1'})
+
+    def test_distinguishes_payloads(self):
+        assert fixture_key('POST', API_URL, {'surname': 'loch'}) != fixture_key('POST', API_URL, {'surname': 'lock'})
+
+
+# ---------------------------------------------------------------------------
+# Recording
+# ---------------------------------------------------------------------------
+
+class TestRecording:
+    def test_saves_responses_without_csrf_token(self, tmp_path):
+        inner = MagicMock()
+        inner.headers = {}
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['Content-Type'] = 'application/json'
+        response._content = b'{"html": "<table></table>"}'
+        inner.request.return_value = response
+
+        session = RecordingSession(str(tmp_path), inner=inner)
+        files = {'_csrf_token': (None, 'abc'), 'action': (None, 'search_players'), 'surname': (None, 'loch')}
+        assert session.post(API_URL, files=files) is response
+
+        # Replayed under a different token, the same search finds the recording
+        replayed = ReplayTransport(str(tmp_path)).session().post(
+            API_URL, files=dict(files, _csrf_token=(None, 'xyz')))
+        assert replayed.json() == {'html': '<table></table>'}
+        assert replayed.headers['Content-Type'] == 'application/json'
+
+    def test_record_transport_wraps_requests_session(self, tmp_path):
+        session = RecordTransport(str(tmp_path)).session()
+        assert isinstance(session, RecordingSession)
+        session.close()
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+class TestReplay:
+    def test_full_lookup_offline(self, replay, tmp_path):
+        _record_search(tmp_path, "", "Loch", SEARCH_HTML)
+        _record_search(tmp_path, "Loch", "", "<table></table>")
+
+        queries = [{'raw': 'Loch', 'name': 'Loch', 'club': '', 'is_single': True}]
+        result = get_player_grading(queries)
+        assert [p.pnum for p in result['Loch']] == ['12345']
+
+    def test_unrecorded_search_is_a_failed_request(self, replay):
+        session = replay.session()
+        with pytest.raises(ReplayMissError):
+            session.post(API_URL, files={'action': (None, 'search_players'), 'surname': (None, 'x')})
+        assert chess_grading.search_player(session, 'tok', '', 'nobody') is None
+
+    def test_synthesises_grading_page_when_not_recorded(self, replay):
+        session, token = chess_grading.get_session_and_token()
+        assert token == 'replay-token'
+
+    def test_recorded_grading_page_is_used(self, replay, tmp_path):
+        save_fixture(str(tmp_path), 'GET', BASE_URL, {}, 200,
+                     '<input type="hidden" name="_csrf_token" value="recorded">')
+        assert chess_grading.get_session_and_token()[1] == 'recorded'
+
+    def test_synthetic_latency(self, tmp_path):
+        session = ReplayTransport(str(tmp_path), latency=(0.02, 0.03)).session()
+        start = time.monotonic()
+        session.get(BASE_URL)
+        assert time.monotonic() - start >= 0.02
+
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+class TestTransportFromEnv:
+    def test_default_is_live(self):
+        assert isinstance(transport_from_env({}), LiveTransport)
+
+    def test_replay_with_latency_range(self):
+        transport = transport_from_env({
+            'CHESS_GRADING_TRANSPORT': 'replay:fixtures',
+            'CHESS_GRADING_REPLAY_LATENCY': '0.05-0.2',
+        })
+        assert isinstance(transport, ReplayTransport)
+        assert transport.directory == 'fixtures'
+        assert transport.latency == (0.05, 0.2)
+
+    def test_record(self):
+        assert isinstance(transport_from_env({'CHESS_GRADING_TRANSPORT': 'record:out'}), RecordTransport)
+
+    def test_rejects_missing_directory_and_unknown_mode(self):
+        with pytest.raises(ValueError):
+            transport_from_env({'CHESS_GRADING_TRANSPORT': 'replay'})
+        with pytest.raises(ValueError):
+            transport_from_env({'CHESS_GRADING_TRANSPORT': 'teleport:x'})
@@ -0,0 +1,222 @@
+"""
+Client-side flow control for the Chess Scotland handle-form endpoint.
+
+AdaptiveLimiter combines a token bucket (sustained request rate), an AIMD
+concurrency limit (how many requests may be in flight) and a shared pause
+that a 429 Retry-After imposes on every caller. RetryPolicy decides which
+failures are worth retrying and how long to wait. chess_grading keeps one
+limiter for the whole process, so every session and thread draws on the same
+budget.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+# Statuses that mean "try again later" rather than "your request is wrong"
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# How often slot_async() checks for a free slot; slots are also freed by threads
+ASYNC_POLL = 0.01
+
+
+class TokenBucket:
+    """
+    Classic token bucket: tokens accrue at rate per second up to burst, and
+    each request takes one. acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Takes a token if one is available. Returns 0 on success, else the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def reset(self):
+        with self._lock:
+            self._tokens = float(self.burst)
+            self._updated = time.monotonic()
+
+
+class AdaptiveLimiter:
+    """
+    Shared rate and concurrency limiter with AIMD adjustment.
+
+    Every request waits for a token (rate per second, bursts of up to burst)
+    and for a concurrency slot. The concurrency limit starts at initial and
+    grows by roughly one per limit's worth of fast successes (additive
+    increase). It halves, down to minimum, when a request fails with a
+    retryable error or takes longer than latency_target seconds
+    (multiplicative decrease). Decreases are at most one per cooldown seconds,
+    so one burst of failures is not counted many times.
+
+    Use as:
+        with limiter.slot() as outcome:
+            ...send the request...
+            outcome.ok = False   # if it failed in a retryable way
+
+    Coroutines use `async with limiter.slot_async()` instead, drawing on the
+    same budget as the threads.
+
+    Only requests marked not ok count as failures; other exceptions (e.g. a
+    rejected CSRF token) say nothing about load on the server.
+    """
+
+    def __init__(self, rate=10.0, burst=10, initial=4, minimum=1, maximum=8,
+                 latency_target=3.0, cooldown=1.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self._cond = threading.Condition()
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+    @property
+    def limit(self):
+        """Current concurrency limit (whole requests)."""
+        return max(self.minimum, int(self._limit))
+
+    def pause(self, seconds):
+        """Holds back every new request for seconds (e.g. a 429's Retry-After)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _wait_for_pause(self):
+        while True:
+            with self._cond:
+                wait = self._paused_until - time.monotonic()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    @contextmanager
+    def slot(self):
+        self._wait_for_pause()
+        self.bucket.acquire()
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+        outcome = _Outcome()
+        start = time.monotonic()
+        try:
+            yield outcome
+        finally:
+            self._release(outcome.ok, time.monotonic() - start)
+
+    @asynccontextmanager
+    async def slot_async(self):
+        """slot() for coroutines: waits by sleeping on the event loop instead of blocking it."""
+        while True:
+            with self._cond:
+                wait = self._paused_until - time.monotonic()
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        while True:
+            wait = self.bucket.try_acquire()
+            if not wait:
+                break
+            await asyncio.sleep(wait)
+        while True:
+            with self._cond:
+                if self._in_flight < self.limit:
+                    self._in_flight += 1
+                    break
+            await asyncio.sleep(ASYNC_POLL)
+
+        outcome = _Outcome()
+        start = time.monotonic()
+        try:
+            yield outcome
+        finally:
+            self._release(outcome.ok, time.monotonic() - start)
+
+    def _release(self, ok, latency):
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if ok and latency <= self.latency_target:
+                self._limit = min(self.maximum, self._limit + 1 / self._limit)
+            elif now - self._last_decrease >= self.cooldown:
+                self._limit = max(self.minimum, self._limit / 2)
+                self._last_decrease = now
+            self._cond.notify_all()
+
+    def reset(self):
+        """Restores the initial limit and a full bucket, and lifts any pause."""
+        with self._cond:
+            self._limit = float(self.initial)
+            self._paused_until = 0.0
+            self._last_decrease = 0.0
+            self._cond.notify_all()
+        self.bucket.reset()
+
+
+class _Outcome:
+    __slots__ = ('ok',)
+
+    def __init__(self):
+        self.ok = True
+
+
+class RetryPolicy:
+    """
+    How many times to try a request, and how long to wait in between.
+
+    Waits use "full jitter" exponential backoff: a random delay between 0 and
+    min(cap, base * 2**retry), so retries from many callers spread out. A
+    Retry-After header, when given, is honoured instead (up to cap).
+    """
+
+    def __init__(self, attempts=3, base=0.5, cap=10.0, statuses=RETRY_STATUSES):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+        self.statuses = statuses
+
+    def delay(self, retry, retry_after=None):
+        """Seconds to wait before retry number retry (0-based)."""
+        seconds = _parse_retry_after(retry_after)
+        if seconds is not None:
+            return min(self.cap, seconds)
+        return random.uniform(0, min(self.cap, self.base * 2 ** retry))
+
+
+def _parse_retry_after(value):
+    """Retry-After in seconds, or None. HTTP-date values are not used by this site."""
+    if not isinstance(value, str):
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
@@ -0,0 +1,217 @@
+"""
+Pluggable HTTP transport for chess_grading.
+
+get_session_and_token opens its session through chess_grading.TRANSPORT, which
+is one of:
+
+    LiveTransport()                 — plain requests.Session (the default)
+    RecordTransport(directory)      — live, but every response is also saved
+                                      to directory as a JSON fixture
+    ReplayTransport(directory, latency=0.0)
+                                    — never touches the network; serves the
+                                      saved fixtures, optionally after a
+                                      synthetic delay
+
+Fixtures are keyed by method, URL and the submitted form fields (minus the
+CSRF token, which changes every session), so a replayed search gets exactly
+the response recorded for the same search.
+
+The transport can also be chosen without code changes:
+    CHESS_GRADING_TRANSPORT=record:/path/to/fixtures
+    CHESS_GRADING_TRANSPORT=replay:/path/to/fixtures
+    CHESS_GRADING_REPLAY_LATENCY=0.15        (seconds, or a range: 0.05-0.3)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# Form fields that differ between otherwise identical requests
+_VOLATILE_FIELDS = {'_csrf_token'}
+
+# Served by ReplayTransport for the grading page when none was recorded, so
+# hand-written search fixtures are enough to replay a lookup
+_SYNTHETIC_PAGE = '<form><input type="hidden" name="_csrf_token" value="replay-token"></form>'
+
+
+class ReplayMissError(requests.RequestException):
+    """ReplayTransport has no recorded response for this request."""
+
+
+def _form_fields(files=None, data=None):
+    """Flattens a multipart 'files' dict ({name: (None, value)}) or form 'data' into {name: value}."""
+    fields = {}
+    for name, value in (files or {}).items():
+        fields[name] = value[1] if isinstance(value, tuple) else value
+    fields.update(data or {})
+    return {name: str(value) for name, value in fields.items() if name not in _VOLATILE_FIELDS}
+
+
+def fixture_key(method, url, fields=None):
+    """Stable identity of a request: method, URL and its non-volatile form fields."""
+    identity = json.dumps([method.upper(), url, sorted((fields or {}).items())], separators=(',', ':'))
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()[:24]
+
+
+def _fixture_path(directory, method, url, fields):
+    action = (fields or {}).get('action') or method.lower()
+    return os.path.join(directory, f"{action}-{fixture_key(method, url, fields)}.json")
+
+
+def save_fixture(directory, method, url, fields, status, body, content_type='text/html; charset=UTF-8'):
+    """Writes one request/response pair as a fixture file and returns its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = _fixture_path(directory, method, url, fields)
+    record = {
+        'method': method.upper(),
+        'url': url,
+        'fields': fields or {},
+        'status': status,
+        'content_type': content_type,
+        'body': body,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=1, ensure_ascii=False)
+    return path
+
+
+def _build_response(url, status, body, content_type):
+    response = requests.Response()
+    response.status_code = status
+    response.url = url
+    response.headers['Content-Type'] = content_type
+    response._content = body.encode('utf-8')
+    response.encoding = 'utf-8'
+    return response
+
+
+class RecordingSession:
+    """A requests.Session stand-in that saves every response it receives as a fixture."""
+
+    def __init__(self, directory, inner=None):
+        self.directory = directory
+        self._inner = inner if inner is not None else requests.Session()
+        self.headers = self._inner.headers
+
+    def request(self, method, url, files=None, data=None, **kwargs):
+        response = self._inner.request(method, url, files=files, data=data, **kwargs)
+        save_fixture(
+            self.directory, method, url, _form_fields(files, data), response.status_code,
+            response.text, response.headers.get('Content-Type', 'text/html; charset=UTF-8'),
+        )
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self._inner.close()
+
+
+class ReplaySession:
+    """A requests.Session stand-in that answers from recorded fixtures only."""
+
+    def __init__(self, directory, latency=0.0):
+        self.directory = directory
+        self.latency = latency
+        self.headers = CaseInsensitiveDict()
+
+    def _delay(self):
+        if isinstance(self.latency, tuple):
+            seconds = random.uniform(*self.latency)
+        else:
+            seconds = self.latency
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def request(self, method, url, files=None, data=None, **kwargs):
+        self._delay()
+        fields = _form_fields(files, data)
+        path = _fixture_path(self.directory, method, url, fields)
+        try:
+            with open(path, encoding='utf-8') as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            if method.upper() == 'GET' and not fields:
+                return _build_response(url, 200, _SYNTHETIC_PAGE, 'text/html; charset=UTF-8')
+            raise ReplayMissError(f"No recorded response for {method.upper()} {url} {fields}")
+        return _build_response(url, record['status'], record['body'], record['content_type'])
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        pass
+
+
+class LiveTransport:
+    """Talks to chessscotland.com with a plain requests.Session."""
+
+    def session(self):
+        return requests.Session()
+
+
+class RecordTransport:
+    """Talks to chessscotland.com and saves every response to directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def session(self):
+        return RecordingSession(self.directory)
+
+
+class ReplayTransport:
+    """
+    Serves responses recorded in directory without any network access.
+    latency is a fixed delay in seconds, or a (low, high) range, applied to
+    every request so timings resemble the real site.
+    """
+
+    def __init__(self, directory, latency=0.0):
+        self.directory = directory
+        self.latency = latency
+
+    def session(self):
+        return ReplaySession(self.directory, self.latency)
+
+
+def _parse_latency(value):
+    if not value:
+        return 0.0
+    low, sep, high = value.partition('-')
+    return (float(low), float(high)) if sep else float(low)
+
+
+def transport_from_env(environ=None):
+    """Builds the transport named by CHESS_GRADING_TRANSPORT (default: live)."""
+    environ = os.environ if environ is None else environ
+    spec = environ.get('CHESS_GRADING_TRANSPORT', '').strip()
+    mode, _, directory = spec.partition(':')
+    mode = mode.lower()
+    if mode in ('', 'live'):
+        return LiveTransport()
+    if not directory:
+        raise ValueError(f"CHESS_GRADING_TRANSPORT={spec!r} needs a fixture directory, e.g. {mode}:fixtures")
+    if mode == 'record':
+        logger.info("Recording handle-form responses to %s", directory)
+        return RecordTransport(directory)
+    if mode == 'replay':
+        latency = _parse_latency(environ.get('CHESS_GRADING_REPLAY_LATENCY', ''))
+        logger.info("Replaying handle-form responses from %s", directory)
+        return ReplayTransport(directory, latency)
+    raise ValueError(f"Unknown CHESS_GRADING_TRANSPORT mode {mode!r} (expected live, record or replay)")